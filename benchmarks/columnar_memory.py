@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Compare the memory used by a HConfig object tree and a ColumnarHConfig
+
+    python benchmarks/columnar_memory.py [number_of_interfaces]
+
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hier_config import HConfig
+from hier_config.columnar import ColumnarHConfig
+
+OPTIONS = {
+    'full_text_sub': [],
+    'per_line_sub': [],
+    'indent_adjust': [],
+}
+
+
+def synthetic_config(interfaces):
+    lines = []
+    for i in range(interfaces):
+        lines.extend([
+            'interface GigabitEthernet0/{}'.format(i),
+            ' description port {}'.format(i),
+            ' switchport mode access',
+            ' switchport access vlan {}'.format(i % 4000 + 1),
+            ' spanning-tree portfast',
+            ' no shutdown',
+        ])
+    return '\n'.join(lines)
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main(interfaces):
+    config_text = synthetic_config(interfaces)
+
+    def build_hconfig():
+        hconfig = HConfig('example.rtr', 'nxos', OPTIONS)
+        hconfig.load_from_string(config_text)
+        return hconfig
+
+    hconfig, hconfig_size = measure(build_hconfig)
+    columnar, columnar_size = measure(
+        lambda: ColumnarHConfig.from_hconfig(hconfig))
+
+    lines = len(columnar)
+    print('lines:              {}'.format(lines))
+    print('HConfig:            {:.0f} bytes/line'.format(hconfig_size / lines))
+    print('ColumnarHConfig:    {:.0f} bytes/line'.format(columnar_size / lines))
+    print('ratio:              {:.1f}x'.format(hconfig_size / columnar_size))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,127 @@
+"""
+Deterministic generator of large IOS and IOS-XR style configurations
+
+    from generator import generate_config
+
+    running = generate_config(100000, 'ios')
+    intended = generate_config(100000, 'ios', drift=0.05)
+
+The same lines, os and seed always give the same text. drift is the
+fraction of interfaces, ACL entries and BGP neighbors that are changed, so
+a configuration generated with drift shares its structure with the one
+generated without it. The configuration holds a banner, VRFs, interfaces,
+ACLs with up to 5000 entries and a BGP process with a neighbor per VRF
+address-family, in roughly these shares of the lines:
+
+    vrf        10%
+    interface  35%
+    acl        30%
+    bgp        25%
+
+"""
+
+import random
+
+SHARES = {
+    'vrf': 0.10,
+    'interface': 0.35,
+    'acl': 0.30,
+    'bgp': 0.25,
+}
+ACL_ENTRIES = 5000
+BANNER_LINES = 20
+
+
+def _ip(n, last=1):
+    return '10.{}.{}.{}'.format(n >> 14 & 255, n >> 6 & 255, (n & 63) * 4 + last)
+
+
+def generate_config(lines, os='ios', seed=0, drift=0.0):
+    """
+    Return a configuration text of about lines lines
+
+    :param lines: int, the approximate number of lines
+    :param os: 'ios' or 'iosxr'
+    :param seed: int
+    :param drift: float, the fraction of items that differ from drift=0.0
+
+    """
+
+    iosxr = os == 'iosxr'
+    rng = random.Random(seed)
+    drift_rng = random.Random(seed + 1)
+
+    def drifted():
+        return drift and drift_rng.random() < drift
+
+    vrfs = max(1, int(lines * SHARES['vrf'] / 5))
+    interfaces = max(1, int(lines * SHARES['interface'] / 6))
+    acl_entries = max(1, int(lines * SHARES['acl']))
+    neighbors = max(1, int(lines * SHARES['bgp'] / (4 if iosxr else 2)))
+
+    config = ['hostname example{}.rtr'.format(seed)]
+
+    config.append('banner motd ^C')
+    config.extend('Authorized access only, line {}'.format(n) for n in range(BANNER_LINES))
+    config.append('^C')
+
+    for v in range(vrfs):
+        config.extend([
+            'vrf {}VRF{}'.format('' if iosxr else 'definition ', v),
+            ' rd 65000:{}'.format(v),
+            ' address-family ipv4 unicast',
+            '  route-target export 65000:{}'.format(v),
+            '  route-target import 65000:{}'.format(v),
+        ])
+
+    acls = -(-acl_entries // ACL_ENTRIES)
+    for i in range(interfaces):
+        description = 'link {} to {}'.format(i, rng.randrange(10000))
+        if drifted():
+            description += ' (moved)'
+        config.extend([
+            'interface {}0/0/{}/{}'.format(
+                'TenGigE' if iosxr else 'GigabitEthernet', i // 48, i % 48),
+            ' description {}'.format(description),
+            ' vrf {}VRF{}'.format('' if iosxr else 'forwarding ', i % vrfs),
+            ' {} address {} 255.255.255.252'.format('ipv4' if iosxr else 'ip', _ip(i)),
+            ' {} access-group ACL{} ingress'.format('ipv4', i % acls) if iosxr
+            else ' ip access-group ACL{} in'.format(i % acls),
+            ' no shutdown',
+        ])
+
+    for a in range(acls):
+        config.append('{} access-list {}ACL{}'.format(
+            'ipv4' if iosxr else 'ip', '' if iosxr else 'extended ', a))
+        for e in range(min(ACL_ENTRIES, acl_entries - a * ACL_ENTRIES)):
+            host = _ip(rng.randrange(1 << 22), 2)
+            if drifted():
+                host = _ip(drift_rng.randrange(1 << 22), 3)
+            entry = 'permit tcp host {} any eq {}'.format(host, rng.choice((22, 443, 179)))
+            if iosxr:
+                config.append(' {} {}'.format((e + 1) * 10, entry))
+            else:
+                config.append(' ' + entry)
+
+    config.append('router bgp 65000')
+    config.append(' bgp router-id 10.255.255.1')
+    for vrf in range(vrfs):
+        config.append(' {} VRF{}'.format('vrf' if iosxr else 'address-family ipv4 vrf', vrf))
+        for n in range(vrf, neighbors, vrfs):
+            remote_as = 64512 + n % 1000
+            if drifted():
+                remote_as += 1000
+            if iosxr:
+                config.extend([
+                    '  neighbor {}'.format(_ip(n, 2)),
+                    '   remote-as {}'.format(remote_as),
+                    '   address-family ipv4 unicast',
+                    '    route-policy PASS in',
+                ])
+            else:
+                config.extend([
+                    '  neighbor {} remote-as {}'.format(_ip(n, 2), remote_as),
+                    '  neighbor {} activate'.format(_ip(n, 2)),
+                ])
+
+    return '\n'.join(config) + '\n'
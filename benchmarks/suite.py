@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Time the main HConfig operations on generated configurations
+
+    python benchmarks/suite.py [--sizes 1000 10000 100000] [--os ios]
+                               [--output results.json] [--compare baseline.json]
+                               [--no-memory]
+
+For each size, a running and an intended configuration are generated with
+generator.generate_config() and every operation is timed. Each result
+records the lines processed, wall time, throughput in lines per second and,
+unless --no-memory is given, the peak memory allocated by the operation as
+measured by tracemalloc in a second run. Results are written as JSON.
+--compare prints the time ratio of each operation against an earlier run.
+
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hier_config import HConfig, __version__  # noqa: E402
+from generator import generate_config  # noqa: E402
+
+OPTIONS = {
+    'style': 'ios',
+    'sectional_overwrite': [],
+    'sectional_overwrite_no_negate': [],
+    'ordering': [
+        {'lineage': [{'startswith': 'interface'}, {'startswith': 'no shutdown'}], 'order': 700},
+        {'lineage': [{'startswith': 'no ip access-list'}], 'order': 900},
+        {'lineage': [{'startswith': 'no ipv4 access-list'}], 'order': 900},
+    ],
+    'indent_adjust': [],
+    'parent_allows_duplicate_child': [],
+    'sectional_exiting': [
+        {'lineage': [{'startswith': 'router bgp'}, {'startswith': 'address-family'}],
+         'exit_text': 'exit-address-family'},
+        {'lineage': [{'startswith': 'router bgp'}, {'startswith': 'vrf'},
+                     {'startswith': 'neighbor'}, {'startswith': 'address-family'}],
+         'exit_text': 'exit'},
+    ],
+    'full_text_sub': [],
+    'per_line_sub': [
+        {'search': '^Building configuration.*', 'replace': ''},
+        {'search': '^end$', 'replace': ''},
+        {'search': '^\\s*[#!].*', 'replace': ''},
+        {'search': '^ exit-address-family', 'replace': ''},
+    ],
+    'idempotent_commands_blacklist': [],
+    'idempotent_commands': [
+        {'lineage': [{'startswith': 'interface'},
+                     {'startswith': ['description', 'ip address', 'ipv4 address', 'vrf']}]},
+        {'lineage': [{'startswith': 'router bgp'}, {'startswith': 'vrf'},
+                     {'startswith': 'neighbor'}, {'startswith': 'remote-as'}]},
+    ],
+    'negation_default_when': [],
+    'negation_negate_with': [],
+}
+
+TAG_RULES = [
+    {'lineage': [{'startswith': 'interface'}, {'startswith': 'description'}],
+     'add_tags': 'safe'},
+    {'lineage': [{'startswith': ['ip access-list', 'ipv4 access-list',
+                                 'no ip access-list', 'no ipv4 access-list']}],
+     'add_tags': 'manual'},
+    {'lineage': [{'startswith': 'router bgp'}], 'add_tags': 'bgp'},
+    {'lineage': [{'re_search': '^interface \\S+0/0/1'}], 'add_tags': 'slot1'},
+]
+
+
+def count_lines(hconfig):
+    return sum(1 for _ in hconfig.all_children())
+
+
+def load(text, os_name):
+    hconfig = HConfig('example.rtr', os_name, OPTIONS)
+    hconfig.load_from_string(text)
+    return hconfig
+
+
+def operations(size, os_name):
+    """
+    Yield (name, setup, run, lines) for each operation
+
+    setup() returns the argument of run(), so only run() is measured.
+
+    """
+
+    running_text = generate_config(size, os_name)
+    intended_text = generate_config(size, os_name, drift=0.02)
+    running = load(running_text, os_name)
+    intended = load(intended_text, os_name)
+    running_lines = count_lines(running)
+
+    def remediation():
+        return running.config_to_get_to(intended)
+
+    remediation_lines = count_lines(remediation())
+
+    yield ('load_from_string', lambda: running_text,
+           lambda text: load(text, os_name), running_lines)
+    yield ('config_to_get_to', lambda: None,
+           lambda _: running.config_to_get_to(intended),
+           running_lines + count_lines(intended))
+    yield ('add_tags', remediation,
+           lambda r: r.add_tags(TAG_RULES), remediation_lines)
+    yield ('add_sectional_exiting', remediation,
+           lambda r: r.add_sectional_exiting(), remediation_lines)
+    yield ('set_order_weight', remediation,
+           lambda r: r.set_order_weight(), remediation_lines)
+    yield ('dump', lambda: None,
+           lambda _: running.dump(), running_lines)
+    dump = running.dump()
+    yield ('load_from_dump', lambda: dump,
+           lambda d: HConfig('example.rtr', os_name, OPTIONS).load_from_dump(d),
+           running_lines)
+
+    def merge(_):
+        merged = HConfig('example.rtr', os_name, OPTIONS)
+        merged.merge(running)
+        merged.merge(intended)
+        return merged
+    yield ('merge', lambda: None, merge, running_lines + count_lines(intended))
+
+
+def measure(setup, run, memory):
+    argument = setup()
+    gc.collect()
+    start = time.perf_counter()
+    run(argument)
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        argument = setup()
+        gc.collect()
+        tracemalloc.start()
+        run(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def run_suite(sizes, os_name, memory=True):
+    results = []
+    for size in sizes:
+        for name, setup, run, lines in operations(size, os_name):
+            seconds, peak = measure(setup, run, memory)
+            result = {
+                'size': size,
+                'operation': name,
+                'lines': lines,
+                'seconds': seconds,
+                'lines_per_second': lines / seconds if seconds else None,
+                'peak_bytes': peak,
+            }
+            results.append(result)
+            print('{size:>8} {operation:<22} {seconds:>9.3f}s {lines_per_second:>12.0f} lines/s'.format(
+                **result), file=sys.stderr)
+    return {
+        'hier_config_version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'os': os_name,
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    previous = {(r['size'], r['operation']): r for r in baseline['results']}
+    for result in report['results']:
+        before = previous.get((result['size'], result['operation']))
+        if before is None or not before['seconds']:
+            continue
+        print('{:>8} {:<22} {:>6.2f}x time'.format(
+            result['size'], result['operation'], result['seconds'] / before['seconds']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1].strip())
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--os', default='ios', choices=['ios', 'iosxr'])
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--compare', help='a JSON report to compare with')
+    parser.add_argument('--no-memory', action='store_true')
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.sizes, args.os, memory=not args.no_memory)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,18 @@
 from hier_config.hc_child import HConfigChild
+from hier_config import acl_diff
+from hier_config import binary
+from hier_config.instrumentation import stage
+from hier_config.options import Options, Rule
+from hier_config.frozen import FrozenHConfig
+from hier_config.source import Source, buffer_lines, str_lines
+from hier_config.blocks import BANNER_START, Block, banner_end
+
+import asyncio
+import hashlib
+import mmap
+import os
+import sys
 
-import re
 
 __version__ = '1.1.2'
 
@@ -55,11 +67,14 @@ class HConfig(HConfigChild):
     def __init__(self, hostname, os, options):
         self._hostname = hostname
         self.os = os
-        self.options = dict(options)
+        self.options = Options.coerce(options)
         self._text = str()
         self._logs = list()
         self.children = []
         self.children_dict = {}
+        # tag name to bit position, see hier_config.tag_set.TagSet
+        self._tag_bits = {}
+        self._tag_names = []
 
     @property
     def hostname(self):
@@ -99,81 +114,225 @@ class HConfig(HConfigChild):
         for child in other.children:
             self.add_deep_copy_of(child, merged=True)
 
-    def load_from_file(self, file_path):
-        """ Load configuration text from a file """
+    def load_from_file(self, file_path, cache=None, spans=False, mapped=False):
+        """
+        Load configuration text from a file
+
+        With mapped, the file is memory-mapped and parsed with
+        load_from_buffer(), so its text is not read into a string. The
+        mapping stays open while spans reference it. A cache can not be
+        used with mapped, as its key is computed from the whole text.
+
+        :param file_path: str
+        :param cache: hier_config.parse_cache.ParseCache or None
+        :param spans: bool, record a SourceSpan on every line, see hier_config.source
+        :param mapped: bool
+
+        """
+
+        if mapped:
+            if cache is not None:
+                raise ValueError('a cache can not be used with mapped')
+            with open(file_path, 'rb') as f:
+                if not os.fstat(f.fileno()).st_size:
+                    return
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if spans:
+                self.load_from_buffer(buffer, spans=True)
+            else:
+                with buffer:
+                    self.load_from_buffer(buffer)
+            return
 
         with open(file_path) as f:
             config_text = f.read()
-        self.load_from_string(config_text)
+        self.load_from_string(config_text, cache=cache, spans=spans)
+
+    @stage('parse')
+    def load_from_buffer(self, buffer, encoding='utf-8', spans=False):
+        """
+        Create Hierarchical Configuration nested objects from a bytes-like
+        buffer, such as bytes, a memoryview or an mmap, decoding one line at
+        a time
+
+        Lines are split on newlines. Identical line texts share one interned
+        string. With spans, each line references the buffer, see
+        hier_config.source.
+
+        :param buffer: bytes-like object
+        :param encoding: str
+        :param spans: bool
+
+        """
+
+        source = Source(buffer, encoding)
+        if self.options.full_text_sub_patterns:
+            config_text = source.text(0, len(buffer))
+            return self.load_from_string(config_text, spans=spans)
+
+        parser = self._line_parser(intern=True)
+        next(parser)
+        for line, span in buffer_lines(source):
+            parser.send((line, span if spans else None))
+        return self._close_parser(parser)
+
+    @stage('parse')
+    def load_from_string(self, config_text, cache=None, spans=False):
+        """
+        Create Hierarchical Configuration nested objects from text
+
+        When a ParseCache is provided and self is still empty, the parsed
+        tree is loaded from, or stored in, the cache. The cache is not used
+        when spans are recorded.
 
-    def load_from_string(self, config_text):
-        """ Create Hierarchical Configuration nested objects from text """
+        :param config_text: str
+        :param cache: hier_config.parse_cache.ParseCache or None
+        :param spans: bool, record a SourceSpan on every line, see hier_config.source
+
+        """
+
+        if cache is not None and not spans and not self.children:
+            key = cache.key(config_text, self.os, self.options)
+            data = cache.get(key)
+            if data is not None:
+                self.load_from_binary(data)
+            else:
+                self.load_from_string(config_text)
+                cache.put(key, self.dump_binary())
+            return self
+
+        for search, replace in self.options.full_text_sub_patterns:
+            config_text = search.sub(replace, config_text)
+
+        parser = self._line_parser()
+        next(parser)
+        if spans:
+            for item in str_lines(Source(config_text), config_text):
+                parser.send(item)
+        else:
+            for line in config_text.splitlines():
+                parser.send((line, None))
+        return self._close_parser(parser)
+
+    async def aload(self, lines):
+        """
+        Create Hierarchical Configuration nested objects from an asynchronous
+        iterable of lines, such as a stream of device output, adding each
+        line as it arrives
+
+        Each item holds one or more whole lines, with or without line
+        endings. With full_text_sub options, which may match across lines,
+        the lines are collected and loaded with load_from_string().
+
+        .. code:: python
+
+            running_config_hier = await HConfig(hostname, os, options).aload(stream)
+
+        :param lines: asynchronous iterable of str
+        :returns: self
+
+        """
+
+        if self.options.full_text_sub_patterns:
+            collected = []
+            async for item in lines:
+                collected.extend(item.splitlines())
+            return self.load_from_string('\n'.join(collected))
+
+        parser = self._line_parser()
+        next(parser)
+        async for item in lines:
+            for line in item.splitlines():
+                parser.send((line, None))
+        return self._close_parser(parser)
+
+    @staticmethod
+    async def aload_many(loads, concurrency=8):
+        """
+        Run aload() for many HConfig objects, at most concurrency at a time
+
+        .. code:: python
 
-        for sub in self.options['full_text_sub']:
-            config_text = re.sub(
-                sub['search'],
-                sub['replace'],
-                config_text)
+            hconfigs = await HConfig.aload_many(
+                [(HConfig(host, os, options), stream(host)) for host in hosts],
+                concurrency=16)
+
+        :param loads: iterable of (HConfig, asynchronous iterable of lines)
+        :param concurrency: int
+        :returns: list of HConfig, in the order of loads
+
+        """
+
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def load(hconfig, lines):
+            async with semaphore:
+                return await hconfig.aload(lines)
+
+        return list(await asyncio.gather(*(load(h, lines) for h, lines in loads)))
+
+    def _close_parser(self, parser):
+        """ Finish a _line_parser() and return self """
+
+        try:
+            parser.send(None)
+        except StopIteration:
+            return self
+        raise RuntimeError('the line parser did not stop')
+
+    def _line_parser(self, intern=False):
+        """
+        A generator that adds each (line, span) sent to it to self, as
+        load_from_string() does, and post-processes self when None is sent
+
+        :param intern: bool, intern the text of each line
+
+        """
 
         current_section = self
         current_section.real_indent_level = -1
         most_recent_item = current_section
         indent_adjust = 0
         end_indent_adjust = []
-        temp_banner = []
-        in_banner = False
-        banner_end_lines = ['EOF', '%', '!']
-        banner_end_contains = []
-
-        def end_of_banner_test(config_line):
-            """
-
-            :type config_line: str
-            """
-            if config_line.startswith('^'):
-                return True
-            elif config_line in banner_end_lines:
-                return True
-            elif any([c in config_line for c in banner_end_contains]):
-                return True
-            return False
-
-        for line in config_text.splitlines():
-            # Process banners in configuration into one line
-            if in_banner:
-                if line != '!':
-                    temp_banner.append(line)
-
-                # Test if this line is the end of a banner
-                if end_of_banner_test(str(line)):
-                    in_banner = False
-                    most_recent_item = self.add_child(
-                        "\n".join(temp_banner), True)
+        # parent -> whether it allows duplicate children, see _add_bulk_child()
+        duplicates_allowed = {}
+        # the multi-line block being scanned, see hier_config.blocks
+        block = None
+        block_patterns = self.options.multi_line_block_patterns
+
+        while True:
+            item = yield
+            if item is None:
+                break
+            line, span = item
+
+            if block is not None:
+                if not block.feed(line):
+                    continue
+                if block.is_banner:
+                    # banners are held as one top-level line
+                    most_recent_item = self.add_child("\n".join(block.lines), True)
                     most_recent_item.real_indent_level = 0
                     current_section = self
-                    temp_banner = []
+                    node = most_recent_item
+                else:
+                    node = block.node
+                    node.text = "\n".join([node.text] + block.lines)
+                if block.span is not None and node.source_span in (None, block.span):
+                    node.source_span = block.span.extend(span)
+                block = None
+                continue
+
+            if line.startswith(BANNER_START):
+                block = Block(banner_end(line), lines=[line], span=span)
                 continue
-            else:
-                # Test if this line is the start of a banner
-                if line.startswith('banner '):
-                    in_banner = True
-                    temp_banner.append(line)
-                    banner_words = line.split()
-                    try:
-                        banner_end_contains.append(banner_words[2])
-                        banner_end_lines.append(banner_words[2][:1])
-                        banner_end_lines.append(banner_words[2][:2])
-                    except IndexError:
-                        pass
-                    continue
 
             actual_indent = len(line) - len(line.lstrip())
             line = ' ' * actual_indent + ' '.join(line.split())
-            for sub in self.options['per_line_sub']:
-                line = re.sub(
-                    sub['search'],
-                    sub['replace'],
-                    line)
+            for search, replace in self.options.per_line_sub_patterns:
+                line = search.sub(replace, line)
             line = line.rstrip()
 
             # If line is now empty, move to the next
@@ -184,6 +343,8 @@ class HConfig(HConfigChild):
             this_indent = len(line) - len(line.lstrip()) + indent_adjust
 
             line = line.lstrip()
+            if intern:
+                line = sys.intern(line)
 
             # Walks back up the tree
             while this_indent <= current_section.real_indent_level:
@@ -193,28 +354,37 @@ class HConfig(HConfigChild):
             if this_indent > most_recent_item.real_indent_level:
                 current_section = most_recent_item
 
-            most_recent_item = current_section.add_child(line, True)
+            most_recent_item = current_section._add_bulk_child(
+                line, duplicates_allowed, alert_on_duplicate=True)
             most_recent_item.real_indent_level = this_indent
+            if span is not None and most_recent_item.source_span is None:
+                most_recent_item.source_span = span
 
-            for expression in self.options['indent_adjust']:
-                if re.search(expression['start_expression'], line):
+            for start_pattern, end_pattern in block_patterns:
+                if start_pattern.search(line):
+                    block = Block(end_pattern, node=most_recent_item, span=span)
+                    break
+
+            for start_expression, end_expression in self.options.indent_adjust_patterns:
+                if start_expression.search(line):
                     indent_adjust += 1
-                    end_indent_adjust.append(expression['end_expression'])
+                    end_indent_adjust.append(end_expression)
                     break
-            if end_indent_adjust and re.search(end_indent_adjust[0], line):
+            if end_indent_adjust and end_indent_adjust[0].search(line):
                 indent_adjust -= 1
                 del (end_indent_adjust[0])
 
         # Assert that we are not in a banner still for some reason
-        assert not in_banner
+        assert block is None or not block.is_banner
+        if block is not None:
+            # a block left open by the end of the text keeps its lines
+            block.node.text = "\n".join([block.node.text] + block.lines)
 
         if self.os in ['ios']:
             self._remove_acl_remarks()
             self._add_acl_sequence_numbers()
             self._rm_ipv6_acl_sequence_numbers()
 
-        return self
-
     def load_from_dump(self, dump):
         """
         Load a HConfig dump
@@ -224,7 +394,7 @@ class HConfig(HConfigChild):
             dump = [{
                 'depth': child.depth(),
                 'text': child.text,
-                'tags': list(child.tags),
+                'tags': sorted(child.tags),
                 'comments': list(child.comments),
                 'new_in_config': child.new_in_config
             },]
@@ -253,7 +423,7 @@ class HConfig(HConfigChild):
                               'depth'] - 2, item['depth'] - 1))
             # also accept 'line'
             # obj = parent.add_child(item.get('text', item['line']), force_duplicate=True)
-            obj = parent.add_child(item['text'], force_duplicate=True)
+            obj = parent._append_child(item['text'])
             obj.tags = set(item['tags'])
             obj.comments = set(item['comments'])
             obj.new_in_config = item['new_in_config']
@@ -268,7 +438,7 @@ class HConfig(HConfigChild):
             dump = [{
                 'depth': child.depth(),
                 'text': child.text,
-                'tags': list(child.tags),
+                'tags': sorted(child.tags),
                 'comments': list(child.comments),
                 'new_in_config': child.new_in_config
             },]
@@ -284,18 +454,230 @@ class HConfig(HConfigChild):
         else:
             children = self.all_children_sorted()
 
-        output = []
-        for child in children:
-            output.append({
-                'depth': child.depth(),
-                'text': child.text,
-                'tags': list(child.tags),
-                'comments': list(child.comments),
-                'new_in_config': child.new_in_config,
+        return [self._dump_item(child, child.depth()) for child in children]
+
+    @staticmethod
+    def _dump_item(child, depth):
+        return {
+            'depth': depth,
+            'text': child.text,
+            'tags': sorted(child.tags),
+            'comments': list(child.comments),
+            'new_in_config': child.new_in_config,
+        }
+
+    def export_by_tags(self, buckets, output='text', style='without_comments', tag=None):
+        """
+        Split the configuration into tag buckets in a single sorted traversal
+
+        buckets maps a bucket name to either an (include_tags, exclude_tags)
+        pair, or to None for the untagged lines. A line is routed to every
+        bucket it matches.
+
+        .. code:: python
+
+            windows = remediation.export_by_tags({
+                'safe': (['safe'], ['outage']),
+                'outage': (['outage'], []),
+                'untagged': None,
             })
 
-        return output
+        With output='text' each bucket holds the same text as joining
+        cisco_style_text(style, tag) of all_children_sorted_by_tags() or
+        all_children_sorted_untagged() with newlines. With output='dump' each
+        bucket holds the dump() items of those children.
+
+        :param buckets: dict
+        :param output: 'text' or 'dump'
+        :param style: str
+        :param tag: str
+        :returns: dict
+
+        """
+
+        if output not in ('text', 'dump'):
+            raise ValueError('unknown output {}'.format(output))
+
+        results = {}
+        untagged = []
+        tagged = []
+        any_include_mask = 0
+        for name, spec in buckets.items():
+            results[name] = []
+            if spec is None:
+                untagged.append(results[name])
+            else:
+                include_tags, exclude_tags = spec
+                include_mask = self._tags_mask(include_tags or ())
+                if include_mask:
+                    tagged.append((
+                        include_mask,
+                        self._tags_mask(exclude_tags or ()),
+                        results[name]))
+                    any_include_mask |= include_mask
+
+        # without an untagged bucket, subtrees carrying none of the included
+        # tags can be skipped entirely
+        subtree_masks = None if untagged else self._subtree_tag_masks()
+        with_comments = style != 'without_comments'
+
+        stack = [(iter(sorted(self.children)), 1)]
+        while stack:
+            children, depth = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                continue
+            if subtree_masks is not None and not subtree_masks[id(child)] & any_include_mask:
+                continue
+
+            mask = child._tag_mask
+            if not mask:
+                matched = untagged
+            else:
+                matched = [
+                    result for include_mask, exclude_mask, result in tagged
+                    if mask & include_mask and not mask & exclude_mask]
+
+            if matched and output == 'dump':
+                for result in matched:
+                    result.append(self._dump_item(child, depth))
+            elif matched:
+                line = "  " * (depth - 1) + child.text
+                if with_comments:
+                    line += child._cisco_style_comments(style, tag)
+                for result in matched:
+                    result.append(line)
+
+            if child.children:
+                stack.append((iter(sorted(child.children)), depth + 1))
+
+        if output == 'text':
+            for name, lines in results.items():
+                results[name] = '\n'.join(lines)
+        return results
+
+    def load_from_binary(self, data):
+        """
+        Load a binary HConfig dump created by dump_binary()
+
+        :param data: bytes-like object
+        :return: None
 
+        """
+
+        binary.loads(self, data)
+
+    def dump_binary(self, lineage_rules=None):
+        """
+        Dump the loaded HConfig data in a compact binary format
+
+        It holds the same data as dump(), with texts, tags and comments
+        stored once in a shared string table. See hier_config.binary.
+
+        :param lineage_rules: list
+        :returns: bytes
+
+        """
+
+        return binary.dumps(self, lineage_rules)
+
+    @stage('apply')
+    def apply(self, delta):
+        """
+        Apply a remediation created by config_to_get_to() to self, in place
+
+        Negations and 'default' lines remove the lines they negate, including
+        sections dropped by sectional_overwrite. Sections matching
+        sectional_overwrite_no_negate are replaced. New lines remove the
+        idempotent commands they overwrite, negations marked new_in_config are
+        kept as lines, and sectional exiting lines are skipped. ACLs matching
+        acl_sequence_diff rules apply 'no <seq>' and resequence commands by
+        sequence number.
+
+        Only the parts of self touched by delta are visited.
+
+        .. code:: python
+
+            remediation = running_config_hier.config_to_get_to(compiled_config_hier)
+            future_config_hier = running_config_hier.future(remediation)
+            assert future_config_hier.config_equals(compiled_config_hier)
+
+        :param delta: HConfig
+        :return: self
+
+        """
+
+        self._apply_delta(delta)
+        return self
+
+    def future(self, delta):
+        """
+        Return a copy of self with the remediation delta applied, see apply()
+
+        :param delta: HConfig
+        :return: HConfig
+
+        """
+
+        future = HConfig(self.hostname, self.os, self.options)
+        for child in self.children:
+            future.add_deep_copy_of(child)
+        return future.apply(delta)
+
+    def _apply_acl_resequence(self, text):
+        """ Resequence an ACL if text is a command from a resequence template """
+
+        for rule in self.options.get('acl_sequence_diff', ()):
+            if 'resequence' not in rule:
+                continue
+            match = acl_diff.resequence_pattern(rule['resequence']).match(text)
+            if match is None:
+                continue
+            for acl in self.children:
+                if acl.text.split()[-1] == match.group('name') and acl.lineage_test(rule):
+                    acl_diff.resequence(
+                        acl, int(match.group('start')), int(match.group('step')))
+            return True
+        return False
+
+    def config_fingerprint(self):
+        """
+        Return a digest of the configuration lines of self
+
+        The digest covers the text of every line and its position in the
+        hierarchy, but not the order of siblings, tags, comments or
+        order_weight, so equivalent configurations share a fingerprint.
+
+        :returns: bytes
+
+        """
+
+        def fingerprint(node):
+            digest = hashlib.blake2b(node.text.encode(), digest_size=16)
+            for child_digest in sorted(fingerprint(c) for c in node.children):
+                digest.update(child_digest)
+            return digest.digest()
+
+        return fingerprint(self)
+
+    def config_equals(self, other):
+        """ Compare the configuration lines of self and other by fingerprint """
+
+        return self.config_fingerprint() == other.config_fingerprint()
+
+    def freeze(self):
+        """
+        Return an immutable, hashable copy of self that many threads can
+        read without a lock, see hier_config.frozen
+
+        :returns: hier_config.frozen.FrozenHConfig
+
+        """
+
+        return FrozenHConfig(self)
+
+    @stage('add_tags', rules_arg='tag_rules')
     def add_tags(self, tag_rules, strip_negation=False):
         """
         Handler for tagging sections of Hierarchical Configuration data structure
@@ -303,6 +685,8 @@ class HConfig(HConfigChild):
 
         """
 
+        # compiled once, rather than interpreted for every line
+        tag_rules = [rule if isinstance(rule, Rule) else Rule(rule) for rule in tag_rules]
         for rule in tag_rules:
             for child in self.all_children():
                 if child.lineage_test(rule, strip_negation):
@@ -323,9 +707,64 @@ class HConfig(HConfigChild):
 
         return False
 
+    def _negation_rule(self, child):
+        """
+        Return (option, rule) for the first negation_negate_with, then
+        negation_default_when, rule matching child, or None
+
+        The rules whose lineage above the leaf matches the parents of child
+        are cached by parent path in the options, see
+        Options.negation_candidates(), so for most lines only the leaf text
+        rules are evaluated.
+
+        """
+
+        parent = child.parent
+        path = () if parent is self else tuple(parent.path())
+        for option, rule, full in self.options.negation_candidates(path):
+            if full:
+                if child.lineage_test(rule):
+                    return option, rule
+            elif child._leaf_test(rule):
+                return option, rule
+        return None
+
     def depth(self):
         return 0
 
+    def _tags_mask(self, tags, intern=False):
+        """
+        Return the bitset of an iterable of tag names. Unknown tags are
+        given a bit when intern is True and are ignored otherwise.
+
+        """
+
+        if isinstance(tags, str):
+            tags = (tags,)
+        mask = 0
+        for tag in tags:
+            bit = self._tag_bits.get(tag)
+            if bit is None:
+                if not intern:
+                    continue
+                bit = self._tag_bits[tag] = len(self._tag_names)
+                self._tag_names.append(tag)
+            mask |= 1 << bit
+        return mask
+
+    def _mask_tags(self, mask):
+        """ Return the tag names of a bitset """
+
+        tags = []
+        bit = 0
+        while mask:
+            if mask & 1:
+                tags.append(self._tag_names[bit])
+            mask >>= 1
+            bit += 1
+        return tags
+
+    @stage('acl_post_processing')
     def _add_acl_sequence_numbers(self):
         """
         Add ACL sequence numbers for use on configurations with a style of 'ios'
@@ -343,11 +782,15 @@ class HConfig(HConfigChild):
                 sn = 10
                 for sub_child in child.children:
                     if sub_child.text.startswith(acl_line_sw):
-                        sub_child.text = "{} {}".format(sn, sub_child.text)
+                        # the children dict is rebuilt once per ACL below
+                        sub_child._text = "{} {}".format(sn, sub_child.text)
                         sn += 10
+                if sn > 10:
+                    child.rebuild_children_dict()
 
         return self
 
+    @stage('acl_post_processing')
     def _rm_ipv6_acl_sequence_numbers(self):
         """
         If there are sequence numbers in the IPv6 ACL, remove them
@@ -355,16 +798,22 @@ class HConfig(HConfigChild):
         """
 
         for acl in self.get_children('startswith', 'ipv6 access-list '):
+            changed = False
             for entry in acl.children:
                 if entry.text.startswith('sequence'):
-                    entry.text = ' '.join(entry.text.split()[2:])
+                    entry._text = ' '.join(entry.text.split()[2:])
+                    changed = True
+            if changed:
+                acl.rebuild_children_dict()
         return self
 
+    @stage('acl_post_processing')
     def _remove_acl_remarks(self):
         for acl in self.get_children('startswith', 'ip access-list '):
-            for entry in acl.children:
-                if entry.text.startswith('remark'):
-                    acl.children.remove(entry)
+            entries = [e for e in acl.children if not e.text.startswith('remark')]
+            if len(entries) != len(acl.children):
+                acl.children = entries
+                acl.rebuild_children_dict()
         return self
 
     def all_children_sorted_with_lineage_rules(self, rules):
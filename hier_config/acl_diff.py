@@ -0,0 +1,330 @@
+"""
+Sequence number aware remediation of access lists
+
+Enabled per ACL with lineage rules in the 'acl_sequence_diff' option:
+
+.. code:: yaml
+
+    acl_sequence_diff:
+    - lineage:
+      - startswith:
+        - ip access-list
+        - ipv4 access-list
+        - ipv6 access-list
+      # optional, used when there is no room left between sequence numbers
+      resequence: ip access-list resequence {name} {start} {step}
+
+When an ACL is present in both configs, its entries are keyed on their
+sequence numbers. The entries kept in place are the longest common
+subsequence of entry bodies. It is found in O(n log n) by a longest
+increasing subsequence over matched positions. Every other running entry is
+removed with 'no <seq>'. Every other target entry is inserted with a sequence
+number that places it between its kept neighbours, so kept entries are never
+rewritten. If the gaps between sequence numbers are too small and a
+resequence template is configured, the ACL is resequenced first. Otherwise
+the ACL falls back to the regular text based remediation.
+
+Kept entries keep their running sequence numbers. With a resequence template,
+an ACL that is changed is resequenced again after the changes when the target
+numbers are evenly spaced, so the result, see HConfig.future(), equals the
+target. Otherwise the result has the target's entries in the target's order,
+but it may be numbered differently, and HConfig.config_equals() tells them
+apart. ACLs that only differ in their numbering are not changed.
+
+On 'ios', the sequence numbers of 'ip access-list' entries are not in the
+configuration text. load_from_string() numbers them 10, 20, ... by position,
+so they need not match the numbers on the device. These ACLs are resequenced
+to start=10, increment=10 before any change, which requires a resequence
+template. Without one they use the regular remediation.
+
+"""
+
+import re
+from bisect import bisect_left
+from functools import lru_cache
+
+DEFAULT_STEP = 10
+
+
+def parse_entry(text):
+    """
+    Split an ACL entry into (sequence number, prefix, body)
+
+    Entries look like '10 permit ip any any' or, on IOS IPv6 ACLs,
+    'sequence 10 permit ipv6 any any'. Returns None without a sequence number.
+
+    """
+
+    words = text.split(' ', 2)
+    if words[0].isdigit() and len(words) > 1:
+        return int(words[0]), '', text[len(words[0]) + 1:]
+    if words[0] == 'sequence' and len(words) == 3 and words[1].isdigit():
+        return int(words[1]), 'sequence ', words[2]
+    return None
+
+
+def sequence_key(child):
+    """ Sort key ordering ACL entries by sequence number """
+
+    entry = parse_entry(child.text)
+    return 0 if entry is None else entry[0]
+
+
+def synthesized_sequences(acl):
+    """
+    Return True if the sequence numbers of acl were made up from the entry
+    positions when it was parsed, see HConfig._add_acl_sequence_numbers()
+
+    """
+
+    return acl.root.os == 'ios' and acl.text.startswith('ip access-list')
+
+
+def _parse_entries(acl):
+    entries = []
+    for child in acl.children:
+        entry = parse_entry(child.text)
+        if entry is None:
+            return None
+        entries.append(entry)
+    entries.sort(key=lambda e: e[0])
+    return entries
+
+
+def kept_pairs(running_bodies, target_bodies):
+    """
+    Return the (running index, target index) pairs of a longest common
+    subsequence of two lists of entry bodies
+
+    Only the first occurrence of a body in target_bodies can be matched,
+    which makes the search a longest increasing subsequence over target
+    indexes in O(n log n).
+
+    """
+
+    target_index = {}
+    for j, body in enumerate(target_bodies):
+        target_index.setdefault(body, j)
+
+    candidates = []
+    claimed = set()
+    for i, body in enumerate(running_bodies):
+        j = target_index.get(body)
+        if j is not None and j not in claimed:
+            claimed.add(j)
+            candidates.append((i, j))
+
+    # patience sorting, tails[k] is the candidate index ending the best
+    # increasing run of length k + 1
+    tail_values = []
+    tails = []
+    previous = [None] * len(candidates)
+    for position, (_, j) in enumerate(candidates):
+        k = bisect_left(tail_values, j)
+        if k:
+            previous[position] = tails[k - 1]
+        if k == len(tail_values):
+            tail_values.append(j)
+            tails.append(position)
+        else:
+            tail_values[k] = j
+            tails[k] = position
+
+    pairs = []
+    position = tails[-1] if tails else None
+    while position is not None:
+        pairs.append(candidates[position])
+        position = previous[position]
+    pairs.reverse()
+    return pairs
+
+
+def _fit(own_seqs, lower, upper):
+    """
+    Return sequence numbers for a run of inserts between lower and upper,
+    preferring the target's own numbers, or None if there is no room
+
+    """
+
+    bounds = own_seqs if upper is None else own_seqs + [upper]
+    if own_seqs[0] > lower and all(a < b for a, b in zip(bounds, bounds[1:])):
+        return own_seqs
+    count = len(own_seqs)
+    if upper is None:
+        step = DEFAULT_STEP
+    else:
+        step = (upper - lower) // (count + 1)
+        if step < 1:
+            return None
+    return [lower + step * (n + 1) for n in range(count)]
+
+
+def _assign_sequences(target_entries, kept_target, kept_seqs):
+    """
+    Pick sequence numbers for the target entries that are not kept
+
+    Returns (inserts, largest run of consecutive inserts), with inserts
+    being None if a gap between kept entries is too small.
+
+    """
+
+    inserts = []
+    largest_run = 0
+    fits = True
+    lower = 0
+    run = []
+    for j in range(len(target_entries) + 1):
+        if j < len(target_entries) and j not in kept_target:
+            run.append(j)
+            continue
+        upper = kept_seqs.get(j)
+        if run:
+            largest_run = max(largest_run, len(run))
+            seqs = _fit([target_entries[r][0] for r in run], lower, upper)
+            if seqs is None:
+                fits = False
+            else:
+                inserts.extend(zip(seqs, run))
+            run = []
+        if upper is not None:
+            lower = upper
+
+    return (inserts if fits else None), largest_run
+
+
+def acl_plan(running_entries, target_entries, resequence=False):
+    """
+    Compute the changes that turn running_entries into target_entries
+
+    Both are lists of (sequence number, prefix, body) sorted by sequence
+    number. Returns (resequence_step, deletes, inserts) where deletes are
+    running sequence numbers and inserts are (sequence number, prefix, body),
+    or None if the entries can not be fitted without resequencing and
+    resequence is False. resequence_step is None unless the running ACL must
+    first be resequenced to start=step, increment=step.
+
+    """
+
+    pairs = kept_pairs([e[2] for e in running_entries],
+                       [e[2] for e in target_entries])
+    kept_running = {i for i, _ in pairs}
+    kept_target = {j for _, j in pairs}
+
+    def plan(running_seqs):
+        kept_seqs = {j: running_seqs[i] for i, j in pairs}
+        return _assign_sequences(target_entries, kept_target, kept_seqs)
+
+    resequence_step = None
+    running_seqs = [e[0] for e in running_entries]
+    inserts, largest_run = plan(running_seqs)
+    if inserts is None:
+        if not resequence:
+            return None
+        resequence_step = max(
+            DEFAULT_STEP, -(-(largest_run + 1) // DEFAULT_STEP) * DEFAULT_STEP)
+        running_seqs = [resequence_step * (i + 1)
+                        for i in range(len(running_entries))]
+        inserts, _ = plan(running_seqs)
+
+    deletes = [running_seqs[i] for i in range(len(running_entries))
+               if i not in kept_running]
+    inserts = [(seq, target_entries[j][1], target_entries[j][2])
+               for seq, j in sorted(inserts)]
+    return resequence_step, deletes, inserts
+
+
+def spacing(seqs):
+    """ Return (start, step) if seqs are evenly spaced, otherwise None """
+
+    if not seqs:
+        return None
+    if len(seqs) == 1:
+        return seqs[0], DEFAULT_STEP
+    step = seqs[1] - seqs[0]
+    if step < 1 or any(b - a != step for a, b in zip(seqs, seqs[1:])):
+        return None
+    return seqs[0], step
+
+
+def add_acl_delta(running_acl, target_acl, delta, rule):
+    """
+    Add the sequence based remediation of running_acl into target_acl to delta
+
+    Returns False, leaving delta untouched, when the ACLs can not be handled
+    by sequence number and the regular remediation should be used instead.
+
+    """
+
+    running_entries = _parse_entries(running_acl)
+    target_entries = _parse_entries(target_acl)
+    if running_entries is None or target_entries is None:
+        return False
+
+    template = rule.get('resequence')
+    synthesized = synthesized_sequences(running_acl)
+    if synthesized and not template:
+        return False
+    result = acl_plan(running_entries, target_entries, bool(template))
+    if result is None:
+        return False
+    resequence_step, deletes, inserts = result
+    if synthesized and resequence_step is None and (deletes or inserts):
+        # match the device's numbers to the ones assigned by the parser
+        resequence_step = DEFAULT_STEP
+
+    if resequence_step is not None:
+        delta.add_child(template.format(
+            name=target_acl.text.split()[-1],
+            start=resequence_step,
+            step=resequence_step))
+
+    if deletes or inserts:
+        subtree = delta.add_child(target_acl.text)
+        for seq in deletes:
+            subtree.add_child('no {}'.format(seq))
+        for seq, prefix, body in inserts:
+            new_item = subtree.add_child('{}{} {}'.format(prefix, seq, body))
+            new_item.new_in_config = True
+
+        # renumber the result to the target's numbers
+        if template:
+            if resequence_step is None:
+                seqs = [e[0] for e in running_entries]
+            else:
+                seqs = [resequence_step * (i + 1) for i in range(len(running_entries))]
+            result_seqs = sorted(
+                set(seqs).difference(deletes).union(seq for seq, _, _ in inserts))
+            target_seqs = [e[0] for e in target_entries]
+            target_spacing = spacing(target_seqs)
+            if result_seqs != target_seqs and target_spacing is not None:
+                delta.add_child(template.format(
+                    name=target_acl.text.split()[-1],
+                    start=target_spacing[0],
+                    step=target_spacing[1]), force_duplicate=True)
+    return True
+
+
+@lru_cache(maxsize=None)
+def resequence_pattern(template):
+    """ Compile a regex matching the commands rendered from a resequence template """
+
+    pattern = re.escape(template)
+    for field in ('name', 'start', 'step'):
+        group = r'(?P<name>\S+)' if field == 'name' else r'(?P<{}>\d+)'.format(field)
+        pattern = pattern.replace(re.escape('{' + field + '}'), group)
+    return re.compile(pattern + '$')
+
+
+def resequence(acl, start, step):
+    """ Renumber the entries of acl to start, start + step, ... """
+
+    entries = []
+    for child in acl.children:
+        entry = parse_entry(child.text)
+        if entry is not None:
+            entries.append((entry, child))
+    entries.sort(key=lambda e: e[0][0])
+    for n, ((_, prefix, body), child) in enumerate(entries):
+        # the children dict is rebuilt once below
+        child._text = '{}{} {}'.format(prefix, start + step * n, body)
+    acl.rebuild_children_dict()
@@ -0,0 +1,225 @@
+"""
+Bulk loading of configurations from archives and concatenated streams
+
+.. code:: python
+
+    from hier_config.archive import load_archive
+
+    for name, hconfig in load_archive('backups.tar.gz', 'ios', options, workers=4):
+        print(name, len(hconfig))
+
+Archive members are read one at a time straight from the archive, without
+extracting it to disk:
+
+    tar            any compression tarfile supports, read as a stream
+    zip
+    gzip           a single gzipped configuration
+    concatenated   a plain or gzipped text file holding many
+                   configurations, each starting with a line matching the
+                   delimiter regex, whose first group names it
+
+The format is detected from a file path, and is required for a file object.
+With workers, members are parsed in that many processes and returned as
+binary dumps, see hier_config.binary. At most two members per worker are
+read ahead, so only a few configuration texts are held in memory at once.
+Results are yielded in archive order.
+
+"""
+
+import gzip
+import io
+import os
+import re
+import sys
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from hier_config import HConfig
+from hier_config.options import Options
+
+FORMATS = ('tar', 'zip', 'gzip', 'concatenated')
+GZIP_MAGIC = b'\x1f\x8b'
+
+# the Options of a worker process, set once by _init_worker()
+_worker_options = None
+
+
+def default_hostname(name):
+    """ Return the file name of an archive member without its extension """
+
+    base = os.path.basename(name)
+    if base.endswith('.gz'):
+        base = base[:-3]
+    return os.path.splitext(base)[0] or base
+
+
+def detect_format(file_path, delimiter=None):
+    """ Return the format of the archive at file_path, see hier_config.archive """
+
+    if delimiter is not None:
+        return 'concatenated'
+    if zipfile.is_zipfile(file_path):
+        return 'zip'
+    if tarfile.is_tarfile(file_path):
+        return 'tar'
+    with open(file_path, 'rb') as f:
+        if f.read(2) == GZIP_MAGIC:
+            return 'gzip'
+    raise ValueError('unrecognized archive format: {}'.format(file_path))
+
+
+def iter_archive(source, format=None, delimiter=None, encoding='utf-8', chunk_size=1 << 20):
+    """
+    Yield (name, text) for each configuration of an archive, one at a time
+
+    :param source: file path or binary file object
+    :param format: one of FORMATS, or None to detect it from a file path
+    :param delimiter: regex of the line starting each configuration of a
+        concatenated stream, its first group being the name
+    :param encoding: str
+    :param chunk_size: int, the read buffer size of streams
+
+    """
+
+    if format is None:
+        if not isinstance(source, (str, os.PathLike)):
+            raise ValueError('the format of a file object must be given')
+        format = detect_format(source, delimiter)
+    if format not in FORMATS:
+        raise ValueError('unknown archive format {!r}'.format(format))
+    if format == 'concatenated' and delimiter is None:
+        raise ValueError('a concatenated stream requires a delimiter')
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from _iter_archive(f, format, delimiter, encoding, chunk_size)
+    else:
+        yield from _iter_archive(source, format, delimiter, encoding, chunk_size)
+
+
+def _iter_archive(f, format, delimiter, encoding, chunk_size):
+    if format == 'tar':
+        # 'r|*' reads the members sequentially, so the source need not seek
+        with tarfile.open(fileobj=f, mode='r|*', bufsize=chunk_size) as tar:
+            for member in tar:
+                if member.isfile():
+                    data = tar.extractfile(member).read()
+                    yield member.name, data.decode(encoding, 'replace')
+    elif format == 'zip':
+        with zipfile.ZipFile(f) as archive:
+            for info in archive.infolist():
+                if not info.filename.endswith('/'):
+                    data = archive.read(info)
+                    yield info.filename, data.decode(encoding, 'replace')
+    elif format == 'gzip':
+        with gzip.GzipFile(fileobj=f) as stream:
+            data = stream.read()
+        name = os.path.basename(getattr(f, 'name', ''))
+        if name.endswith('.gz'):
+            name = name[:-3]
+        yield name, data.decode(encoding, 'replace')
+    else:
+        buffered = io.BufferedReader(f, buffer_size=chunk_size) if not hasattr(f, 'peek') else f
+        if buffered.peek(2)[:2] == GZIP_MAGIC:
+            buffered = gzip.GzipFile(fileobj=buffered)
+        text = io.TextIOWrapper(buffered, encoding=encoding, errors='replace')
+        try:
+            yield from _split_concatenated(text, re.compile(delimiter))
+        finally:
+            # leave the source open for the caller
+            text.detach()
+
+
+def _split_concatenated(lines, delimiter):
+    """ Yield (name, text) for each delimited section of lines, ignoring lines before the first """
+
+    name = None
+    section = []
+    for line in lines:
+        match = delimiter.search(line)
+        if match:
+            if name is not None:
+                yield name, ''.join(section)
+            name = match.group(1) if delimiter.groups else match.group(0).strip()
+            section = []
+        elif name is not None:
+            section.append(line)
+    if name is not None:
+        yield name, ''.join(section)
+
+
+def _parse(hostname, os_name, options, text):
+    hconfig = HConfig(hostname, os_name, options)
+    hconfig.load_from_string(text)
+    return hconfig
+
+
+def _init_worker(options):
+    global _worker_options
+    _worker_options = Options(options)
+
+
+def _parse_to_binary(hostname, os_name, text, options=None):
+    if _worker_options is None:
+        # without a pool initializer, before Python 3.7, the first task of
+        # each worker carries the options
+        _init_worker(options)
+    return _parse(hostname, os_name, _worker_options, text).dump_binary()
+
+
+def load_archive(source, os, options, format=None, delimiter=None, hostname=None,
+                 workers=None, encoding='utf-8', chunk_size=1 << 20):
+    """
+    Yield (name, HConfig) for each configuration of an archive, in archive order
+
+    :param source: file path or binary file object
+    :param os: str
+    :param options: dict or Options
+    :param format: see iter_archive()
+    :param delimiter: see iter_archive()
+    :param hostname: function of the member name returning the hostname,
+        default_hostname() by default
+    :param workers: int, the number of parsing processes, or None to parse
+        in this process
+    :param encoding: str
+    :param chunk_size: int
+
+    """
+
+    options = Options.coerce(options)
+    hostname = hostname or default_hostname
+    configs = iter_archive(source, format, delimiter, encoding, chunk_size)
+
+    if not workers:
+        for name, text in configs:
+            yield name, _parse(hostname(name), os, options, text)
+        return
+
+    # from Python 3.7 the options are sent to each worker once, when it starts
+    plain_options = options.to_dict()
+    if sys.version_info >= (3, 7):
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(plain_options,))
+        task_options = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        task_options = plain_options
+    with executor:
+        pending = []
+        for name, text in configs:
+            host = hostname(name)
+            pending.append((name, host, executor.submit(
+                _parse_to_binary, host, os, text, task_options)))
+            # bound the texts held by queued tasks
+            if len(pending) >= workers * 2:
+                yield _loaded(pending.pop(0), os, options)
+        while pending:
+            yield _loaded(pending.pop(0), os, options)
+
+
+def _loaded(pending, os_name, options):
+    name, host, future = pending
+    hconfig = HConfig(host, os_name, options)
+    hconfig.load_from_binary(future.result())
+    return name, hconfig
@@ -0,0 +1,253 @@
+"""
+Compact binary serialization of HConfig trees
+
+The format stores the same data as HConfig.dump(), plus order_weight, as a
+set of flat little-endian arrays so it can be written and read without any
+per-node dictionaries.
+
+.. code::
+
+    header        magic, version, reserved, n_strings, n_sets, n_set_items, n_nodes
+    str_offsets   uint32 * (n_strings + 1)  byte offsets into the string blob
+    set_offsets   uint32 * (n_sets + 1)     offsets into set_items
+    set_items     uint32 * n_set_items      string ids of each tag/comment set
+    parent        int32 * n_nodes           node index of the parent, -1 for the root
+    end           uint32 * n_nodes          index following the node's subtree
+    depth         uint32 * n_nodes
+    text          uint32 * n_nodes          string id
+    tags          uint32 * n_nodes          set id
+    comments      uint32 * n_nodes          set id
+    order_weight  int32 * n_nodes
+    flags         uint8 * n_nodes           bit 0: new_in_config
+    string blob   utf-8
+
+Texts, tags and comments share one string table, and identical tag and comment
+sets share one set id. Set id 0 is always the empty set. Nodes are stored in
+the order of HConfig.dump(), so the children of a node are the nodes between
+its own index and its end index whose parent is the node.
+
+"""
+
+import struct
+import sys
+from array import array
+
+from hier_config.hc_child import HConfigChild
+
+MAGIC = b'HCFG'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHHIIII')
+
+_U32 = 'I' if array('I').itemsize == 4 else 'L'
+_I32 = 'i' if array('i').itemsize == 4 else 'l'
+_NEW_IN_CONFIG = 0x1
+
+
+class Layout(object):
+    """
+    Byte offsets of each section of a binary dump, computed from its header
+
+    """
+
+    def __init__(self, data):
+        if len(data) < HEADER.size:
+            raise ValueError('binary HConfig dump is truncated')
+        (magic, version, _, self.n_strings, self.n_sets,
+         self.n_set_items, self.n_nodes) = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError('not a binary HConfig dump')
+        if version != VERSION:
+            raise ValueError(
+                'unsupported binary HConfig dump version {}'.format(version))
+
+        offset = HEADER.size
+        sections = (
+            ('str_offsets', self.n_strings + 1, _U32),
+            ('set_offsets', self.n_sets + 1, _U32),
+            ('set_items', self.n_set_items, _U32),
+            ('parent', self.n_nodes, _I32),
+            ('end', self.n_nodes, _U32),
+            ('depth', self.n_nodes, _U32),
+            ('text', self.n_nodes, _U32),
+            ('tags', self.n_nodes, _U32),
+            ('comments', self.n_nodes, _U32),
+            ('order_weight', self.n_nodes, _I32),
+            ('flags', self.n_nodes, 'B'),
+        )
+        self.sections = {}
+        for name, count, typecode in sections:
+            size = count * array(typecode).itemsize
+            self.sections[name] = (offset, offset + size, typecode)
+            offset += size
+        self.blob_start = offset
+        if len(data) < self.blob_start:
+            raise ValueError('binary HConfig dump is truncated')
+
+    def read_array(self, data, name):
+        """ Copy one section of data into an array """
+
+        start, end, typecode = self.sections[name]
+        result = array(typecode)
+        result.frombytes(data[start:end])
+        if sys.byteorder == 'big':
+            result.byteswap()
+        return result
+
+
+def _iter_children_with_depth(hconfig, lineage_rules):
+    """ Yield (child, depth) in HConfig.dump() order """
+
+    if lineage_rules:
+        for child in hconfig.all_children_sorted_with_lineage_rules(
+                lineage_rules):
+            yield child, child.depth()
+        return
+
+    stack = [(iter(sorted(hconfig.children)), hconfig.depth() + 1)]
+    while stack:
+        children, depth = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            continue
+        yield child, depth
+        if child.children:
+            stack.append((iter(sorted(child.children)), depth + 1))
+
+
+def dumps(hconfig, lineage_rules=None):
+    """
+    Serialize hconfig to bytes
+
+    :param hconfig: HConfig
+    :param lineage_rules: list
+    :return: bytes
+
+    """
+
+    strings = {}
+    sets = {(): 0}
+    set_offsets = array(_U32, [0, 0])
+    set_items = array(_U32)
+
+    def intern_string(text):
+        string_id = strings.get(text)
+        if string_id is None:
+            string_id = strings[text] = len(strings)
+        return string_id
+
+    def intern_set(values):
+        if not values:
+            return 0
+        key = tuple(sorted(values))
+        set_id = sets.get(key)
+        if set_id is None:
+            set_id = sets[key] = len(sets)
+            set_items.extend(intern_string(v) for v in key)
+            set_offsets.append(len(set_items))
+        return set_id
+
+    parents = array(_I32)
+    ends = array(_U32)
+    depths = array(_U32)
+    texts = array(_U32)
+    tags = array(_U32)
+    comments = array(_U32)
+    order_weights = array(_I32)
+    flags = bytearray()
+
+    # indexes of the current lineage, used to find parents and subtree ends
+    lineage = []
+    for index, (child, depth) in enumerate(
+            _iter_children_with_depth(hconfig, lineage_rules)):
+        while len(lineage) >= depth:
+            ends[lineage.pop()] = index
+        parents.append(lineage[-1] if lineage else -1)
+        lineage.append(index)
+
+        ends.append(0)
+        depths.append(depth)
+        texts.append(intern_string(child.text))
+        tags.append(intern_set(child.tags))
+        comments.append(intern_set(child.comments))
+        order_weights.append(child.order_weight)
+        flags.append(_NEW_IN_CONFIG if child.new_in_config else 0)
+    for index in lineage:
+        ends[index] = len(parents)
+
+    encoded = [s.encode() for s in strings]
+    str_offsets = array(_U32, [0])
+    position = 0
+    for item in encoded:
+        position += len(item)
+        str_offsets.append(position)
+
+    arrays = (str_offsets, set_offsets, set_items, parents, ends, depths,
+              texts, tags, comments, order_weights)
+    if sys.byteorder == 'big':
+        for item in arrays:
+            item.byteswap()
+
+    chunks = [HEADER.pack(MAGIC, VERSION, 0, len(strings), len(sets),
+                          len(set_items), len(parents))]
+    chunks.extend(item.tobytes() for item in arrays)
+    chunks.append(bytes(flags))
+    chunks.extend(encoded)
+    return b''.join(chunks)
+
+
+def decode_strings(layout, data):
+    """ Decode the whole string table of a binary dump """
+
+    str_offsets = layout.read_array(data, 'str_offsets')
+    blob = bytes(data[layout.blob_start:layout.blob_start + str_offsets[-1]])
+    return [blob[str_offsets[i]:str_offsets[i + 1]].decode()
+            for i in range(layout.n_strings)]
+
+
+def decode_sets(layout, data, strings):
+    """ Decode the tag and comment sets of a binary dump as tuples """
+
+    set_offsets = layout.read_array(data, 'set_offsets')
+    set_items = layout.read_array(data, 'set_items')
+    return [tuple(strings[s] for s in set_items[set_offsets[i]:set_offsets[i + 1]])
+            for i in range(layout.n_sets)]
+
+
+def loads(hconfig, data):
+    """
+    Load the children serialized in data into hconfig
+
+    :param hconfig: HConfig
+    :param data: bytes-like object
+    :return: None
+
+    """
+
+    data = memoryview(data)
+    layout = Layout(data)
+    strings = decode_strings(layout, data)
+    sets = decode_sets(layout, data, strings)
+
+    parents = layout.read_array(data, 'parent')
+    texts = layout.read_array(data, 'text')
+    tags = layout.read_array(data, 'tags')
+    comments = layout.read_array(data, 'comments')
+    order_weights = layout.read_array(data, 'order_weight')
+    flags = layout.read_array(data, 'flags')
+
+    nodes = []
+    for index in range(layout.n_nodes):
+        parent_index = parents[index]
+        parent = hconfig if parent_index < 0 else nodes[parent_index]
+        text = strings[texts[index]]
+        node = HConfigChild(parent, text)
+        parent.children.append(node)
+        parent.children_dict.setdefault(node.text, node)
+
+        node.tags = set(sets[tags[index]])
+        node.comments = set(sets[comments[index]])
+        node.order_weight = order_weights[index]
+        node.new_in_config = bool(flags[index] & _NEW_IN_CONFIG)
+        nodes.append(node)
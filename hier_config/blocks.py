@@ -0,0 +1,78 @@
+"""
+Multi-line blocks of a configuration, such as banners and certificates
+
+HConfig.load_from_string() holds each block as one line whose text is the
+block's lines joined by newlines. A block starts on a line matching its
+start regex and ends on the first following line matching its end regex.
+Its terminator is compiled once, when the block starts, so each line of a
+long block costs one regex search.
+
+Banners are built in. A banner starts with a top-level 'banner ' line and
+ends on a line starting with '^', a line that is 'EOF', '%', '!' or the
+first one or two characters of the banner's delimiter, or a line holding
+the delimiter. Other blocks are set with the multi_line_blocks option:
+
+.. code:: yaml
+
+    multi_line_blocks:
+    - start: ^certificate
+      end: ^\\s*quit$
+    - start: ^macro name
+      end: ^@$
+
+Their start line is placed by its indentation like any other line, and the
+following lines, up to and including the end line, are appended to it.
+
+"""
+
+import functools
+import re
+
+BANNER_START = 'banner '
+
+
+@functools.lru_cache(maxsize=None)
+def _banner_end(delimiter):
+    alternatives = [r'^\^', r'^(?:EOF|%|!)$']
+    if delimiter:
+        alternatives.append('^(?:{}|{})$'.format(
+            re.escape(delimiter[:1]), re.escape(delimiter[:2])))
+        alternatives.append(re.escape(delimiter))
+    return re.compile('|'.join(alternatives))
+
+
+def banner_end(line):
+    """ Return the compiled terminator of the banner started by line """
+
+    words = line.split()
+    return _banner_end(words[2] if len(words) > 2 else None)
+
+
+class Block(object):
+    """
+    A multi-line block being scanned
+
+    :param end: compiled regex of the terminating line
+    :param node: the HConfigChild the lines are appended to, or None for a
+        banner, which is added when it ends
+    :param lines: list of the lines so far
+    :param span: SourceSpan of the start line, or None
+
+    """
+
+    __slots__ = ('end', 'node', 'lines', 'span', 'is_banner')
+
+    def __init__(self, end, node=None, lines=None, span=None):
+        self.end = end
+        self.node = node
+        self.lines = lines if lines is not None else []
+        self.span = span
+        self.is_banner = node is None
+
+    def feed(self, line):
+        """ Add line to the block and return True if it ends the block """
+
+        # banners leave out '!' lines, which may still end them
+        if not (self.is_banner and line == '!'):
+            self.lines.append(line)
+        return self.end.search(line) is not None
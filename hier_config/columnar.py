@@ -0,0 +1,365 @@
+"""
+Array-backed, read-only representation of a HConfig tree
+
+ColumnarHConfig stores a tree as flat arrays rather than one HConfigChild
+object per line, which is much smaller for trees that are only queried.
+
+.. code:: python
+
+    from hier_config.columnar import ColumnarHConfig
+
+    columnar = ColumnarHConfig.from_hconfig(running_config_hier)
+    for interface in columnar.get_children('startswith', 'interface'):
+        print(interface.text, [c.text for c in interface.children])
+
+    running_config_hier = columnar.to_hconfig()
+
+Nodes are stored in the order of HConfig.all_children(). For node i:
+
+    parent[i]        index of the parent, -1 for the root
+    end[i]           index following the subtree of i
+    depth[i]
+    order_weight[i]
+    text             text_buffer[text_offsets[i]:text_offsets[i + 1]]
+    tags             bits of tag_words[i * tag_width:(i + 1) * tag_width]
+                     indexing tag_names
+
+Queries return lightweight ColumnarNode views that support the same read
+methods as HConfigChild, including lineage_test.
+
+"""
+
+from array import array
+
+from hier_config.hc_child import HConfigChild
+from hier_config.text_match import TextMatch
+
+_WORD_BITS = 64
+
+
+class ColumnarHConfig(object):
+
+    __slots__ = (
+        'hostname', 'os', 'options', 'tag_names', 'parent', 'end', 'depths',
+        'order_weight', 'new_in_config', 'text_buffer', 'text_offsets',
+        'tag_width', 'tag_words', 'comments', '_tag_bits',
+    )
+
+    def __init__(self, hostname, os, options):
+        self.hostname = hostname
+        self.os = os
+        self.options = options
+        self.tag_names = []
+        self.parent = array('i')
+        self.end = array('I')
+        self.depths = array('H')
+        self.order_weight = array('i')
+        self.new_in_config = bytearray()
+        self.text_buffer = ''
+        self.text_offsets = array('I', [0])
+        self.tag_width = 0
+        self.tag_words = array('Q')
+        # comments are rare, so they are held sparsely by node index
+        self.comments = {}
+        self._tag_bits = {}
+
+    @classmethod
+    def from_hconfig(cls, hconfig):
+        """ Build a ColumnarHConfig from a HConfig """
+
+        columnar = cls(hconfig.hostname, hconfig.os, hconfig.options)
+        tag_bits = columnar._tag_bits
+        texts = []
+        masks = []
+        text_offset = 0
+
+        stack = [(iter(hconfig.children), -1)]
+        while stack:
+            children, parent_index = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                if parent_index >= 0:
+                    columnar.end[parent_index] = len(columnar.parent)
+                continue
+
+            index = len(columnar.parent)
+            columnar.parent.append(parent_index)
+            columnar.end.append(index + 1)
+            columnar.depths.append(len(stack))
+            columnar.order_weight.append(child.order_weight)
+            columnar.new_in_config.append(1 if child.new_in_config else 0)
+            texts.append(child.text)
+            text_offset += len(child.text)
+            columnar.text_offsets.append(text_offset)
+
+            mask = 0
+            for tag in child.tags:
+                bit = tag_bits.get(tag)
+                if bit is None:
+                    bit = tag_bits[tag] = len(columnar.tag_names)
+                    columnar.tag_names.append(tag)
+                mask |= 1 << bit
+            masks.append(mask)
+            if child.comments:
+                columnar.comments[index] = frozenset(child.comments)
+
+            if child.children:
+                stack.append((iter(child.children), index))
+
+        columnar.text_buffer = ''.join(texts)
+        columnar.tag_width = -(-len(columnar.tag_names) // _WORD_BITS)
+        word_mask = (1 << _WORD_BITS) - 1
+        for mask in masks:
+            for _ in range(columnar.tag_width):
+                columnar.tag_words.append(mask & word_mask)
+                mask >>= _WORD_BITS
+
+        return columnar
+
+    def to_hconfig(self):
+        """ Build a mutable HConfig equal to the one this was created from """
+
+        from hier_config import HConfig
+        hconfig = HConfig(self.hostname, self.os, self.options)
+        nodes = []
+        for index in range(len(self)):
+            parent_index = self.parent[index]
+            parent = hconfig if parent_index < 0 else nodes[parent_index]
+            text = self.text(index)
+            child = HConfigChild(parent, text)
+            parent.children.append(child)
+            parent.children_dict.setdefault(child.text, child)
+            child.order_weight = self.order_weight[index]
+            child.new_in_config = bool(self.new_in_config[index])
+            child.tags = set(self.tags(index))
+            child.comments = set(self.comments.get(index, ()))
+            nodes.append(child)
+        return hconfig
+
+    def __len__(self):
+        return len(self.parent)
+
+    def nbytes(self):
+        """ Approximate size in bytes of the arrays holding the tree """
+
+        arrays = (self.parent, self.end, self.depths, self.order_weight,
+                  self.text_offsets, self.tag_words)
+        size = sum(a.itemsize * len(a) for a in arrays)
+        return size + len(self.new_in_config) + len(self.text_buffer.encode())
+
+    # Column accessors by node index
+
+    def text(self, index):
+        return self.text_buffer[
+            self.text_offsets[index]:self.text_offsets[index + 1]]
+
+    def tag_mask(self, index):
+        """ Return the tags of node index as an integer bitset """
+
+        width = self.tag_width
+        if width == 1:
+            return self.tag_words[index]
+        mask = 0
+        for word in reversed(self.tag_words[index * width:(index + 1) * width]):
+            mask = (mask << _WORD_BITS) | word
+        return mask
+
+    def tags(self, index):
+        mask = self.tag_mask(index)
+        return frozenset(name for bit, name in enumerate(self.tag_names)
+                         if mask >> bit & 1)
+
+    def mask_of(self, tags):
+        """ Return the bitset of tags, ignoring tags that are not used in the tree """
+
+        mask = 0
+        for tag in tags:
+            bit = self._tag_bits.get(tag)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def child_indexes(self, index=-1):
+        """ Yield the indexes of the children of index, -1 being the root """
+
+        if index < 0:
+            child_index, stop = 0, len(self)
+        else:
+            child_index, stop = index + 1, self.end[index]
+        end = self.end
+        while child_index < stop:
+            yield child_index
+            child_index = end[child_index]
+
+    def node(self, index):
+        return ColumnarNode(self, index)
+
+    # HConfig style queries
+
+    @property
+    def root(self):
+        return self
+
+    @property
+    def children(self):
+        return [ColumnarNode(self, i) for i in self.child_indexes(-1)]
+
+    def depth(self):
+        return 0
+
+    def all_children(self):
+        """ Yield all nodes in tree order """
+
+        for index in range(len(self)):
+            yield ColumnarNode(self, index)
+
+    def all_children_sorted(self):
+        """ Yield all nodes, sorted by order_weight at each hierarchy """
+
+        return _all_children_sorted(self, -1)
+
+    def all_children_sorted_by_tags(self, include_tags, exclude_tags):
+        """ Yield all sorted nodes that match include/exclude tags """
+
+        include = self.mask_of(include_tags or ())
+        exclude = self.mask_of(exclude_tags or ())
+        for child in self.all_children_sorted():
+            mask = self.tag_mask(child.index)
+            if mask & include and not mask & exclude:
+                yield child
+
+    def get_children(self, test, expression):
+        return _get_children(self, -1, test, expression)
+
+    def get_child(self, test, expression):
+        return next(self.get_children(test, expression), None)
+
+    def get_child_deep(self, test_expression_pairs):
+        """ Find a node by a list of test/expression pairs, or return None """
+
+        node = self
+        for test, expression in test_expression_pairs:
+            node = node.get_child(test, expression)
+            if node is None:
+                return None
+        return node
+
+
+def _all_children_sorted(columnar, index):
+    order_weight = columnar.order_weight
+    children = sorted(columnar.child_indexes(index),
+                      key=lambda i: order_weight[i])
+    for child_index in children:
+        yield ColumnarNode(columnar, child_index)
+        if columnar.end[child_index] > child_index + 1:
+            yield from _all_children_sorted(columnar, child_index)
+
+
+def _get_children(columnar, index, test, expression):
+    for child_index in columnar.child_indexes(index):
+        if TextMatch.dict_call(test, columnar.text(child_index), expression):
+            yield ColumnarNode(columnar, child_index)
+
+
+class ColumnarNode(object):
+    """
+    A read-only view of one node of a ColumnarHConfig
+
+    """
+
+    __slots__ = ('columnar', 'index')
+
+    def __init__(self, columnar, index):
+        self.columnar = columnar
+        self.index = index
+
+    def __repr__(self):
+        return 'ColumnarNode({}, {})'.format(self.index, self.text)
+
+    def __str__(self):
+        return self.text
+
+    def __eq__(self, other):
+        if not isinstance(other, ColumnarNode):
+            return False
+        return self.columnar is other.columnar and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.columnar), self.index))
+
+    @property
+    def text(self):
+        return self.columnar.text(self.index)
+
+    @property
+    def tags(self):
+        return self.columnar.tags(self.index)
+
+    @property
+    def comments(self):
+        return self.columnar.comments.get(self.index, frozenset())
+
+    @property
+    def order_weight(self):
+        return self.columnar.order_weight[self.index]
+
+    @property
+    def new_in_config(self):
+        return bool(self.columnar.new_in_config[self.index])
+
+    @property
+    def root(self):
+        return self.columnar
+
+    @property
+    def parent(self):
+        parent_index = self.columnar.parent[self.index]
+        if parent_index < 0:
+            return self.columnar
+        return ColumnarNode(self.columnar, parent_index)
+
+    @property
+    def children(self):
+        return [ColumnarNode(self.columnar, i)
+                for i in self.columnar.child_indexes(self.index)]
+
+    def has_children(self):
+        return self.columnar.end[self.index] > self.index + 1
+
+    def depth(self):
+        return self.columnar.depths[self.index]
+
+    def lineage(self):
+        """ Yield the nodes from the top-level section down to self """
+
+        columnar = self.columnar
+        indexes = [self.index]
+        while columnar.parent[indexes[-1]] >= 0:
+            indexes.append(columnar.parent[indexes[-1]])
+        for index in reversed(indexes):
+            yield ColumnarNode(columnar, index)
+
+    def path(self):
+        for node in self.lineage():
+            yield node.text
+
+    def all_children(self):
+        for index in range(self.index + 1, self.columnar.end[self.index]):
+            yield ColumnarNode(self.columnar, index)
+
+    def all_children_sorted(self):
+        return _all_children_sorted(self.columnar, self.index)
+
+    def get_children(self, test, expression):
+        return _get_children(self.columnar, self.index, test, expression)
+
+    def get_child(self, test, expression):
+        return next(self.get_children(test, expression), None)
+
+    def cisco_style_text(self):
+        return "  " * (self.depth() - 1) + self.text
+
+    # lineage_test only reads text, tags, new_in_config, depth() and lineage()
+    lineage_test = HConfigChild.lineage_test
+    _lineage_test = HConfigChild._lineage_test
@@ -0,0 +1,388 @@
+"""
+Immutable, hashable HConfig trees for concurrent read-only use
+
+.. code:: python
+
+    frozen = running_config_hier.freeze()
+
+    vlan2 = frozen.get_child('equals', 'interface Vlan2')
+    address = frozen.get_path(['interface Vlan2', 'ip address 10.0.2.1 255.255.255.0'])
+
+HConfig.freeze() copies a tree into FrozenHConfig and FrozenHConfigChild
+objects. Their attributes can not be set, children are tuples and
+children_dict is a read-only mapping. The indexes are built by freeze(), so
+reading never writes and any number of threads can query a frozen tree
+without a lock:
+
+    children_dict      first child by text, as in HConfigChild
+    get_path()         line by the texts of its lineage
+    all_children()     lines in tree order
+    fingerprint        digest of a subtree
+
+Frozen objects compare and hash by fingerprint, which covers the text, tags,
+comments, new_in_config and order_weight of every line and the order of the
+children, and for FrozenHConfig the hostname, os and options. They can be
+used as dict keys and memoization keys. thaw() returns a mutable HConfig.
+
+"""
+
+import hashlib
+from collections.abc import Set
+from types import MappingProxyType
+
+from hier_config.hc_child import HConfigChild
+from hier_config.options import FrozenDict
+from hier_config.text_match import TextMatch
+
+
+_NO_COMMENTS = frozenset()
+_NO_CHILDREN = {
+    'children': (),
+    'children_dict': MappingProxyType({}),
+    '_sorted_children': (),
+}
+
+
+def _set(obj, **attributes):
+    for name, value in attributes.items():
+        object.__setattr__(obj, name, value)
+
+
+class _FrozenNode(object):
+    """ Read methods shared by FrozenHConfig and FrozenHConfigChild """
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.fingerprint == other.fingerprint
+
+    def __ne__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.fingerprint != other.fingerprint
+
+    def __bool__(self):
+        return True
+
+    def __len__(self):
+        return self._end - self._index - 1
+
+    def __contains__(self, item):
+        return str(item) in self.children_dict
+
+    def has_children(self):
+        return bool(self.children)
+
+    def get_child(self, test, expression):
+        """ Find a child by TextMatch rule. If it is not found, return None """
+
+        if test == 'equals':
+            return self.children_dict.get(expression)
+        return next(self.get_children(test, expression), None)
+
+    def get_children(self, test, expression):
+        """ Find all children matching a TextMatch rule and return them. """
+
+        for child in self.children:
+            if TextMatch.dict_call(test, child.text, expression):
+                yield child
+
+    def get_child_deep(self, test_expression_pairs):
+        """ Find a child recursively with a list of test/expression pairs, or return None """
+
+        node = self
+        for test, expression in test_expression_pairs:
+            node = node.get_child(test, expression)
+            if node is None:
+                return None
+        return node
+
+    def all_children(self):
+        """ Yield all children recursively, in tree order """
+
+        nodes = self.root._nodes
+        for index in range(self._index + 1, self._end):
+            yield nodes[index]
+
+    def all_children_sorted(self):
+        """ Yield all children recursively, sorted at each hierarchy """
+
+        stack = [iter(self._sorted_children)]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                continue
+            yield child
+            if child.children:
+                stack.append(iter(child._sorted_children))
+
+    def all_children_sorted_untagged(self):
+        """ Yield all children recursively that are untagged """
+
+        for child in self.all_children_sorted():
+            if not child.tags:
+                yield child
+
+    def all_children_sorted_by_tags(self, include_tags, exclude_tags):
+        """ Yield all children recursively that match include/exlcude tags """
+
+        include_tags = frozenset(include_tags or ())
+        exclude_tags = frozenset(exclude_tags or ())
+        for child in self.all_children_sorted():
+            if include_tags & child.tags and not exclude_tags & child.tags:
+                yield child
+
+
+class FrozenHConfigChild(_FrozenNode):
+    """
+    An immutable line of a FrozenHConfig, see hier_config.frozen
+
+    """
+
+    __slots__ = (
+        'parent', 'text', 'tags', 'comments', 'order_weight', 'new_in_config',
+        'instances', 'children', 'children_dict', 'fingerprint',
+        '_sorted_children', '_depth', '_index', '_end',
+    )
+
+    def __repr__(self):
+        if self.parent is self.root:
+            return 'FrozenHConfigChild(FrozenHConfig, {})'.format(self.text)
+        return 'FrozenHConfigChild(FrozenHConfigChild, {})'.format(self.text)
+
+    def __str__(self):
+        return self.text
+
+    def __lt__(self, other):
+        return self.order_weight < other.order_weight
+
+    @property
+    def root(self):
+        return self.parent.root
+
+    @property
+    def hostname(self):
+        return self.root.hostname
+
+    @property
+    def os(self):
+        return self.root.os
+
+    @property
+    def options(self):
+        return self.root.options
+
+    def depth(self):
+        return self._depth
+
+    def lineage(self):
+        """ Return the lineage of parent objects, up to but excluding the root """
+
+        lineage = []
+        node = self
+        while node._depth:
+            lineage.append(node)
+            node = node.parent
+        return reversed(lineage)
+
+    def path(self):
+        """ Return the text of each object of self.lineage """
+
+        for obj in self.lineage():
+            yield obj.text
+
+    def get_path(self, path):
+        """ Return the descendant at the texts of path below self, or None """
+
+        return self.root._paths.get(tuple(self.path()) + tuple(path))
+
+    def cisco_style_text(self, style='without_comments', tag=None):
+        """ Return a Cisco style formated line i.e. indentation_level + text ! comments """
+
+        return "{}{}{}".format(
+            "  " * (self._depth - 1),
+            self.text,
+            self._cisco_style_comments(style, tag))
+
+    # these only read text, tags, comments, instances, new_in_config,
+    # depth() and lineage()
+    _cisco_style_comments = HConfigChild._cisco_style_comments
+    lineage_test = HConfigChild.lineage_test
+    _lineage_test = HConfigChild._lineage_test
+
+
+class FrozenHConfig(_FrozenNode):
+    """
+    An immutable, hashable copy of a HConfig, see hier_config.frozen
+
+    :param hconfig: HConfig
+
+    """
+
+    __slots__ = (
+        'hostname', 'os', 'options', 'children', 'children_dict', 'fingerprint',
+        '_sorted_children', '_nodes', '_paths',
+    )
+
+    _index = -1
+    _depth = 0
+    text = ''
+
+    def __init__(self, hconfig):
+        nodes = []
+        paths = {}
+        children = _freeze_children(hconfig, self, (), nodes, paths, {})
+        digest = hashlib.blake2b(repr((
+            hconfig.hostname, hconfig.os, hconfig.options.fingerprint)).encode(),
+            digest_size=16)
+        for child in children:
+            digest.update(child.fingerprint)
+        _set(self,
+             hostname=hconfig.hostname,
+             os=hconfig.os,
+             options=hconfig.options,
+             _nodes=tuple(nodes),
+             _paths=paths,
+             fingerprint=digest.digest(),
+             **_children_attributes(children))
+
+    def __repr__(self):
+        return 'FrozenHConfig({}, {})'.format(self.hostname, self.os)
+
+    def __str__(self):
+        return self.text
+
+    @property
+    def _end(self):
+        return len(self._nodes)
+
+    @property
+    def root(self):
+        return self
+
+    def depth(self):
+        return 0
+
+    def get_path(self, path):
+        """
+        Return the line at the texts of its lineage, or None. With duplicate
+        lines, the first one is returned, as by children_dict.
+
+        :param path: iterable of str
+        :returns: FrozenHConfigChild or None
+
+        """
+
+        return self._paths.get(tuple(path))
+
+    def thaw(self):
+        """ Return a mutable HConfig copy of self """
+
+        from hier_config import HConfig
+        hconfig = HConfig(self.hostname, self.os, self.options)
+        stack = [(hconfig, iter(self.children))]
+        while stack:
+            parent, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                continue
+            new_child = HConfigChild(parent, child.text)
+            parent.children.append(new_child)
+            parent.children_dict.setdefault(new_child.text, new_child)
+            new_child.order_weight = child.order_weight
+            new_child.new_in_config = child.new_in_config
+            new_child.tags = child.tags
+            new_child.comments = set(child.comments)
+            new_child.instances = [
+                {k: set(v) if isinstance(v, Set) else v for k, v in instance.items()}
+                for instance in child.instances]
+            if child.children:
+                stack.append((new_child, iter(child.children)))
+        return hconfig
+
+
+def _freeze_instance(instance):
+    return FrozenDict({k: frozenset(v) if isinstance(v, Set) else v
+                       for k, v in instance.items()})
+
+
+def _children_attributes(children):
+    if not children:
+        return _NO_CHILDREN
+    children_dict = {}
+    for child in children:
+        children_dict.setdefault(child.text, child)
+    sorted_children = tuple(sorted(children, key=lambda c: c.order_weight))
+    if sorted_children == children:
+        sorted_children = children
+    return {
+        'children': children,
+        'children_dict': MappingProxyType(children_dict),
+        '_sorted_children': sorted_children,
+    }
+
+
+def _freeze_children(source, parent, path, nodes, paths, tag_sets):
+    """
+    Return the frozen children of source, appending them to nodes and paths
+
+    tag_sets caches the frozenset and sorted tuple of each tag bitset.
+
+    """
+
+    children = []
+    for child in source.children:
+        node = object.__new__(FrozenHConfigChild)
+        text = child.text
+        child_path = path + (text,)
+        index = len(nodes)
+        nodes.append(node)
+        paths.setdefault(child_path, node)
+        grandchildren = _freeze_children(child, node, child_path, nodes, paths, tag_sets)
+
+        mask = child._tag_mask
+        tags = tag_sets.get(mask)
+        if tags is None:
+            names = child.root._mask_tags(mask)
+            tags = tag_sets[mask] = (frozenset(names), tuple(sorted(names)))
+        comments = frozenset(child.comments) if child.comments else _NO_COMMENTS
+        digest = hashlib.blake2b(repr((
+            text, tags[1], sorted(comments), child.new_in_config,
+            child.order_weight)).encode(), digest_size=16)
+        for grandchild in grandchildren:
+            digest.update(grandchild.fingerprint)
+
+        _set(node,
+             parent=parent,
+             text=text,
+             tags=tags[0],
+             comments=comments,
+             order_weight=child.order_weight,
+             new_in_config=child.new_in_config,
+             instances=tuple(_freeze_instance(i) for i in child.instances),
+             fingerprint=digest.digest(),
+             _depth=len(child_path),
+             _index=index,
+             _end=len(nodes),
+             **_children_attributes(grandchildren))
+        children.append(node)
+    return tuple(children)
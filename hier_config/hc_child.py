@@ -1,23 +1,38 @@
 from hier_config.text_match import TextMatch
+from hier_config.tag_set import TagSet
+from hier_config import acl_diff
+from hier_config import instrumentation
+from hier_config.instrumentation import stage
+from hier_config.options import Rule, ORDER_WEIGHT_CACHE_SIZE
 
 import hier_config.helpers as H
 
+# an order weight missing from Options.order_weights
+_UNRESOLVED = object()
+
 
 class HConfigChild:
 
+    # Bitset of tags, see TagSet
+    _tag_mask = 0
+    # Position in the parsed text, see hier_config.source
+    source_span = None
+
     def __init__(self, parent, text):
         self.parent = parent
         self._text = text.strip()
-        self.hostname = self.root.hostname
-        self.os = self.root.os
-        self.options = self.root.options
+        if instrumentation.enabled:
+            instrumentation.count('allocations')
+        root = parent.root
+        self.hostname = root.hostname
+        self.os = root.os
+        self.options = root.options
         self.real_indent_level = None
         self.children = []
         self.children_dict = {}
         # The intent is for self.order_weight values to range from 1 to 999
         # with the default weight being 500
         self.order_weight = 500
-        self.tags = set()
         self.comments = set()
         self.new_in_config = False
         self.instances = []
@@ -30,12 +45,30 @@ class HConfigChild:
     def text(self, value):
         """
         Used for when self.text is changed after the object
-        is instantiated to rebuild the children dictionary
+        is instantiated to update the children dictionary
 
         """
 
+        old_text = self._text
         self._text = value.strip()
-        self.parent.rebuild_children_dict()
+        parent = self.parent
+        children_dict = parent.children_dict
+        # without duplicate children the dictionary can be updated in place
+        in_place = len(children_dict) == len(parent.children)
+        in_place = in_place and children_dict.get(old_text) is self
+        if in_place and self._text not in children_dict:
+            del children_dict[old_text]
+            children_dict[self._text] = self
+        else:
+            parent.rebuild_children_dict()
+
+    @property
+    def tags(self):
+        return TagSet(self)
+
+    @tags.setter
+    def tags(self, value):
+        self._tag_mask = self.root._tags_mask(value, intern=True)
 
     def __repr__(self):
         if self.parent is self.root:
@@ -119,8 +152,7 @@ class HConfigChild:
                 if rule['expression'] == section.new_in_config:
                     matches += 1
             elif rule['test'] == 'negative_intersection_tags':
-                rule['expression'] = H.to_list(rule['expression'])
-                if not set(rule['expression']).intersection(section.tags):
+                if not set(H.to_list(rule['expression'])).intersection(section.tags):
                     matches += 1
         if matches == len(rules):
             return True
@@ -148,7 +180,7 @@ class HConfigChild:
         for k, v in rule.items():
             if k in ['new_in_config', 'negative_intersection_tags']:
                 object_rules.append({'test': k, 'expression': v})
-            elif isinstance(v, list):
+            elif isinstance(v, (list, tuple)):
                 text_match_rules += [{'test': k, 'expression': e} for e in v]
             else:
                 text_match_rules += [{'test': k, 'expression': v}]
@@ -231,9 +263,18 @@ class HConfigChild:
 
         """
 
+        old_root = self.root
+        self.delete()
+        self.parent = new_parent
         new_parent.children.append(self)
         new_parent.rebuild_children_dict()
-        self.delete()
+
+        # tag bit positions are interned per root
+        new_root = self.root
+        if new_root is not old_root:
+            for child in (self, *self.all_children()):
+                child._tag_mask = new_root._tags_mask(
+                    old_root._mask_tags(child._tag_mask), intern=True)
 
     def del_child_by_text(self, text):
         """ Delete all children with the provided text """
@@ -257,6 +298,13 @@ class HConfigChild:
 
         """
 
+        if self.children and self.children[-1] is child:
+            # the last child has no later duplicates to take its place
+            self.children.pop()
+            if self.children_dict.get(child.text) is child:
+                del self.children_dict[child.text]
+            return
+
         try:
             self.children.remove(child)
         except ValueError:
@@ -281,40 +329,92 @@ class HConfigChild:
     def add_child(self, text, alert_on_duplicate=False, idx=None, force_duplicate=False):
         """ Add a child instance of HConfigChild """
 
-        if idx is None:
-            idx = len(self.children)
         # if child does not exist
-        if text not in self:
+        if text not in self.children_dict:
             new_item = HConfigChild(self, text)
-            self.children.insert(idx, new_item)
+            if idx is None:
+                self.children.append(new_item)
+            else:
+                self.children.insert(idx, new_item)
             self.children_dict[text] = new_item
             return new_item
         # if child does exist and is allowed to be installed as a duplicate
-        elif self._duplicate_child_allowed_check() or force_duplicate:
+        elif force_duplicate or self._duplicate_child_allowed_check():
             new_item = HConfigChild(self, text)
-            self.children.insert(idx, new_item)
-            self.rebuild_children_dict()
+            if idx is None:
+                self.children.append(new_item)
+            else:
+                self.children.insert(idx, new_item)
+                # children_dict holds the first child with a text, which only
+                # changes when the duplicate is inserted before the end
+                if idx < len(self.children) - 1:
+                    self.rebuild_children_dict()
             return new_item
         else:
             # If the child is already present and the parent does not allow
             # duplicate children, return the existing child
-            # Ignore duplicate remarks in ACLs
-            if alert_on_duplicate and not text.startswith('remark '):
-                if self is self.root:
-                    path = [text]
-                else:
-                    path = list(self.path()) + [text]
-                self.logs.append("Found a duplicate section: {}".format(path))
-            return self.get_child('equals', text)
+            if alert_on_duplicate:
+                self._log_duplicate(text)
+            return self.children_dict[text]
+
+    def _log_duplicate(self, text):
+        # Ignore duplicate remarks in ACLs
+        if not text.startswith('remark '):
+            if self is self.root:
+                path = [text]
+            else:
+                path = list(self.path()) + [text]
+            self.logs.append("Found a duplicate section: {}".format(path))
+
+    def _append_child(self, text):
+        """
+        Append a child without the checks of add_child(), for bulk
+        construction. The caller has checked that text is not a child of
+        self yet, or that self allows duplicate children.
+
+        """
+
+        new_item = HConfigChild(self, text)
+        self.children.append(new_item)
+        self.children_dict.setdefault(text, new_item)
+        return new_item
+
+    def _add_bulk_child(self, text, duplicates_allowed, alert_on_duplicate=False):
+        """
+        add_child() for bulk construction, with the duplicate policy of
+        each parent resolved at most once into duplicates_allowed, a dict
+        of parent to _duplicate_child_allowed_check()
+
+        """
+
+        existing = self.children_dict.get(text)
+        if existing is None:
+            return self._append_child(text)
+        allowed = duplicates_allowed.get(self)
+        if allowed is None:
+            allowed = duplicates_allowed[self] = self._duplicate_child_allowed_check()
+        if allowed:
+            return self._append_child(text)
+        if alert_on_duplicate:
+            self._log_duplicate(text)
+        return existing
 
     def add_deep_copy_of(self, child_to_add, merged=False):
         """ Add a nested copy of a child to self"""
 
         new_child = self.add_shallow_copy_of(child_to_add, merged=merged)
-        for child in child_to_add.children:
-            new_child.add_deep_copy_of(child, merged=merged)
+        new_child._add_copies_of_children(child_to_add, merged, {})
         return new_child
 
+    def _add_copies_of_children(self, source, merged, duplicates_allowed):
+        """ Add nested copies of the children of source to self """
+
+        for child in source.children:
+            new_child = self._add_bulk_child(child.text, duplicates_allowed)
+            new_child._copy_attributes_of(child, merged)
+            if child.children:
+                new_child._add_copies_of_children(child, merged, duplicates_allowed)
+
     def lineage(self):
         """
         Return the lineage of parent objects, up to but excluding the root
@@ -339,6 +439,14 @@ class HConfigChild:
     def cisco_style_text(self, style='without_comments', tag=None):
         """ Return a Cisco style formated line i.e. indentation_level + text ! comments """
 
+        return "{}{}{}".format(
+            "  " * (self.depth() - 1),  # render the indentation
+            self.text,
+            self._cisco_style_comments(style, tag))
+
+    def _cisco_style_comments(self, style, tag):
+        """ Return the rendered ' !comments' suffix of a Cisco style line """
+
         comments = []
         if style == 'without_comments':
             pass
@@ -361,24 +469,127 @@ class HConfigChild:
         elif style == 'with_comments':
             comments.extend(self.comments)
 
-        return "{}{}{}".format(
-            "  " * (self.depth() - 1),  # render the indentation
-            self.text,
-            ' !{}'.format(', '.join(sorted(comments))) if comments else '')
+        return ' !{}'.format(', '.join(sorted(comments))) if comments else ''
+
+    def write_cisco_style_text(self, file_obj, style='without_comments', tag=None,
+                               include_tags=None, exclude_tags=(), buffer_lines=4096):
+        """
+        Write the Cisco style text of all children, sorted at each hierarchy,
+        to a file-like object in a single traversal.
+
+        The output is identical to calling cisco_style_text() on every child
+        yielded by all_children_sorted(), or by all_children_sorted_by_tags()
+        when include_tags is provided. The indentation prefix is carried down
+        the traversal rather than recomputed from depth() for every line, and
+        lines are written in batches of buffer_lines.
+
+        .. code:: python
+
+            with open('remediation.conf', 'w') as f:
+                remediation.write_cisco_style_text(f, include_tags=['safe'])
+
+        :param file_obj: object with a write() method
+        :param style: str
+        :param tag: str
+        :param include_tags: list or None
+        :param exclude_tags: list
+        :param buffer_lines: int
+        :return: int -- the number of lines written
+
+        """
+
+        if include_tags is not None:
+            include_mask = self.root._tags_mask(include_tags)
+            exclude_mask = self.root._tags_mask(exclude_tags)
+        with_comments = style != 'without_comments'
+
+        written = 0
+        buffer = []
+        stack = [(iter(sorted(self.children)), "  " * self.depth())]
+        while stack:
+            children, indent = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                continue
+
+            if include_tags is None:
+                include_line = True
+            elif child._tag_mask & include_mask:
+                include_line = not child._tag_mask & exclude_mask
+            else:
+                include_line = False
+
+            if include_line:
+                if with_comments:
+                    comments = child._cisco_style_comments(style, tag)
+                    buffer.append(indent + child.text + comments)
+                else:
+                    buffer.append(indent + child.text)
+                if len(buffer) >= buffer_lines:
+                    file_obj.write('\n'.join(buffer))
+                    file_obj.write('\n')
+                    written += len(buffer)
+                    buffer.clear()
+
+            if child.children:
+                stack.append((iter(sorted(child.children)), indent + "  "))
+
+        if buffer:
+            file_obj.write('\n'.join(buffer))
+            file_obj.write('\n')
+            written += len(buffer)
+
+        return written
 
     def all_children_sorted_untagged(self):
         """ Yield all children recursively that are untagged """
 
         for child in self.all_children_sorted():
-            if not child.tags:
+            if not child._tag_mask:
                 yield child
 
     def all_children_sorted_by_tags(self, include_tags, exclude_tags):
         """ Yield all children recursively that match include/exlcude tags """
 
-        for child in self.all_children_sorted():
-            if child.line_inclusion_test(include_tags, exclude_tags):
+        root = self.root
+        include_mask = root._tags_mask(include_tags or ())
+        if not include_mask:
+            return
+        exclude_mask = root._tags_mask(exclude_tags or ())
+        subtree_masks = self._subtree_tag_masks()
+
+        stack = [iter(sorted(self.children))]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                continue
+            # skip subtrees without any of the included tags
+            if not subtree_masks[id(child)] & include_mask:
+                continue
+            mask = child._tag_mask
+            if mask & include_mask and not mask & exclude_mask:
                 yield child
+            if child.children:
+                stack.append(iter(sorted(child.children)))
+
+    def _subtree_tag_masks(self):
+        """
+        Return a dict of id(child) to the union of the tag bitsets of the
+        child and all of its descendants
+
+        """
+
+        children = list(self.all_children())
+        masks = {id(child): child._tag_mask for child in children}
+        # all_children() yields parents before children, so walking it in
+        # reverse folds every subtree into its parent
+        for child in reversed(children):
+            parent = child.parent
+            if parent is not self:
+                masks[id(parent)] |= masks[id(child)]
+        return masks
 
     def all_children_sorted(self):
         """ Recursively find and yield all children sorted at each hierarchy """
@@ -400,17 +611,71 @@ class HConfigChild:
         # TODO find a way to remove this when sub-classing in HCRoot
         self.parent.del_child(self)
 
+    @stage('set_order_weight')
     def set_order_weight(self):
         """
         Sets self.order integer on all children
 
+        The ordering rules that may match the children of each section are
+        looked up once by its path, see Options.ordering_candidates(), and
+        are tried latest first, so the first match is the rule that takes
+        precedence. Weights that only depend on the path of a line are
+        cached in options.order_weights, so trees sharing an Options object
+        reuse them.
+
+        While this thread is measured by a Stats or RuleProfiler object,
+        every rule is evaluated on every line instead, so the measurements
+        do not depend on what earlier calls cached.
+
         """
 
-        for child in self.all_children():
-            for rule in self.options['ordering']:
-                if child.lineage_test(rule):
-                    child.order_weight = rule['order']
+        if instrumentation.measuring():
+            for child in self.all_children():
+                for rule in self.options['ordering']:
+                    if child.lineage_test(rule):
+                        child.order_weight = rule['order']
+            return
+
+        path = () if self is self.root else tuple(self.path())
+        self._set_order_weight(path, self.options, self.options.order_weights)
+
+    def _set_order_weight(self, path, options, cache):
+        candidates, cacheable = options.ordering_candidates(path)
+        for child in self.children:
+            child_path = path + (child.text,)
+            if candidates:
+                weight = cache.get(child_path, _UNRESOLVED) if cacheable else _UNRESOLVED
+                if weight is _UNRESOLVED:
+                    weight = None
+                    for rule, full in candidates:
+                        if full:
+                            matched = child.lineage_test(rule)
+                        else:
+                            matched = child._leaf_test(rule)
+                        if matched:
+                            weight = rule['order']
+                            break
+                    if cacheable:
+                        if len(cache) >= ORDER_WEIGHT_CACHE_SIZE:
+                            cache.clear()
+                        cache[child_path] = weight
+                if weight is not None:
+                    child.order_weight = weight
+            if child.children:
+                child._set_order_weight(child_path, options, cache)
+
+    def _leaf_test(self, rule):
+        """
+        Test the text of self against the leaf text rules of a Rule, when its
+        other levels are known to match, see Options.negation_candidates()
+
+        """
+
+        if instrumentation.enabled:
+            return instrumentation.evaluate_rule(self, rule, rule.leaf_test, self.text)
+        return rule.leaf_test(self.text)
 
+    @stage('add_sectional_exiting')
     def add_sectional_exiting(self):
         """
         Adds the sectional exiting text as a child
@@ -468,9 +733,10 @@ class HConfigChild:
 
         """
 
-        self.append_tags(tags)
+        mask = self.root._tags_mask(H.to_list(tags), intern=True)
+        self._tag_mask |= mask
         for child in self.all_children():
-            child.append_tags(tags)
+            child._tag_mask |= mask
 
     def deep_remove_tags(self, tags):
         """
@@ -478,9 +744,10 @@ class HConfigChild:
 
         """
 
-        self.remove_tags(tags)
+        mask = ~self.root._tags_mask(H.to_list(tags))
+        self._tag_mask &= mask
         for child in self.all_children():
-            child.remove_tags(tags)
+            child._tag_mask &= mask
 
     def append_tags(self, tags):
         """
@@ -488,9 +755,7 @@ class HConfigChild:
 
         """
 
-        tags = H.to_list(tags)
-        # self._tags.update(tags)
-        self.tags.update(tags)
+        self._tag_mask |= self.root._tags_mask(H.to_list(tags), intern=True)
 
     def remove_tags(self, tags):
         """
@@ -498,15 +763,17 @@ class HConfigChild:
 
         """
 
-        tags = H.to_list(tags)
-        # self._tags.difference_update(tags)
-        self.tags.difference_update(tags)
+        self._tag_mask &= ~self.root._tags_mask(H.to_list(tags))
 
     def with_tags(self, tags, new_instance=None):
         """
         Returns a new instance containing only sub-objects
         with one of the tags in tags
 
+        A child is kept when it, or any of its descendants, carries one of
+        the tags, so tagged lines are always copied with their parents.
+        Subtrees without any of the tags are skipped without being walked.
+
         """
 
         from hier_config import HConfig
@@ -514,27 +781,79 @@ class HConfigChild:
             new_instance = HConfig(
                 self.hostname, self.os, self.options)
 
-        for child in self.children:
-            if tags.intersection(self.tags):
-                new_child = new_instance.add_shallow_copy_of(child)
-                child.with_tags(tags, new_instance=new_child)
+        root = self.root
+        include_mask = root._tags_mask(tags)
+        if not include_mask:
+            return new_instance
+        subtree_masks = self._subtree_tag_masks()
+
+        # copying into a populated instance must merge with existing children
+        merge = bool(new_instance.children)
+        new_root = new_instance.root
+        if not new_root._tag_names:
+            new_root._tag_bits = dict(root._tag_bits)
+            new_root._tag_names = list(root._tag_names)
+        same_bits = new_root._tag_names[:len(root._tag_names)] == root._tag_names
+        translated_masks = {}
+
+        stack = [(iter(self.children), new_instance)]
+        while stack:
+            children, new_parent = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                continue
+            if not subtree_masks[id(child)] & include_mask:
+                continue
+
+            if merge:
+                new_child = new_parent.add_shallow_copy_of(child)
+            else:
+                new_child = HConfigChild(new_parent, child.text)
+                new_parent.children.append(new_child)
+                new_parent.children_dict.setdefault(new_child.text, new_child)
+                mask = child._tag_mask
+                if not same_bits:
+                    translated = translated_masks.get(mask)
+                    if translated is None:
+                        translated = translated_masks[mask] = new_root._tags_mask(
+                            root._mask_tags(mask), intern=True)
+                    mask = translated
+                new_child._tag_mask = mask
+                new_child.comments.update(child.comments)
+                new_child.order_weight = child.order_weight
+
+            if child.children:
+                stack.append((iter(child.children), new_child))
 
         return new_instance
 
+    def tagged_view(self, tags):
+        """
+        Returns a read-only view of the sub-objects with one of the tags in tags
+
+        The view selects the same children as with_tags() without copying
+        them. It reflects the tags as they were when the view was created.
+
+        """
+
+        from hier_config.tag_view import TagView
+        return TagView.create(self, tags)
+
     def negate(self):
         """ Negate self.text """
 
-        for rule in self.options['negation_negate_with']:
-            if self.lineage_test(rule):
+        match = self.root._negation_rule(self)
+        if match is not None:
+            option, rule = match
+            if option == 'negation_negate_with':
                 self.text = rule['use']
                 return self
-
-        for rule in self.options['negation_default_when']:
-            if self.lineage_test(rule):
-                return self._default()
+            return self._default()
 
         return self._swap_negation()
 
+    @stage('config_to_get_to', nodes='result')
     def config_to_get_to(self, target, delta=None):
         """
         Figures out what commands need to be executed to transition from self to target.
@@ -557,19 +876,9 @@ class HConfigChild:
         # find self.children that are not in target.children - i.e. what needs to be negated or defaulted
         # Also, find out if another command in self.children will overwrite -
         # i.e. be idempotent
-        for self_child in self.children:
-            if self_child in target:
-                continue
-            elif self_child.is_idempotent_command(target.children):
-                continue
-            else:
-                # in other but not self
-                # add this node but not any children
-                deleted = delta.add_child(self_child.text)
-                deleted.negate()
-                if self_child.children:
-                    deleted.comments.add(
-                        f"removes {len(self_child.children_dict) + 1} lines")
+        self._negate_unmatched(
+            [c for c in self.children if c not in target],
+            target.children, delta, {})
 
     def _config_to_get_to_right(self, target, delta):
         # find what would need to be added to source_config to get to self
@@ -577,26 +886,210 @@ class HConfigChild:
             # if the child exist, recurse into its children
             self_child = self.get_child('equals', target_child.text)
             if self_child:
-                # This creates a new HConfigChild object just in case there are some delta children
-                # Not very efficient, think of a way to not do this
-                subtree = delta.add_child(target_child.text)
-                self_child.config_to_get_to(target_child, subtree)
-                if not subtree.children:
-                    subtree.delete()
-                # Do we need to rewrite the child and its children as well?
-                elif self_child.sectional_overwrite_check():
-                    target_child.overwrite_with(self_child, delta, True)
-                elif self_child.sectional_overwrite_no_negate_check():
-                    target_child.overwrite_with(self_child, delta, False)
+                self_child._config_to_get_to_matched(target_child, delta)
             # else the child is absent, add it
             else:
-                new_item = delta.add_deep_copy_of(target_child)
-                # mark the new item and all of its children as new_in_config
-                new_item.new_in_config = True
-                for child in new_item.all_children():
-                    child.new_in_config = True
-                if new_item.children:
-                    new_item.comments.add("new section")
+                delta._add_new_in_config(target_child)
+
+        return self
+
+    def _config_to_get_to_matched(self, target, delta):
+        """ Add the remediation of self into target, a child with the same text, to delta """
+
+        acl_rule = self.acl_sequence_diff_rule()
+        if acl_rule is not None and acl_diff.add_acl_delta(
+                self, target, delta, acl_rule):
+            return
+        if target.text in delta:
+            # add_child() returns the existing child
+            subtree = delta.add_child(target.text)
+            self.config_to_get_to(target, subtree)
+            if not subtree.children:
+                subtree.delete()
+                return
+        else:
+            # the subtree is only attached to delta if it has children
+            subtree = HConfigChild(delta, target.text)
+            self.config_to_get_to(target, subtree)
+            if not subtree.children:
+                return
+            delta._attach(subtree)
+        self._overwrite_matched(target, delta)
+
+    def _overwrite_matched(self, target, delta):
+        # Do we need to rewrite the child and its children as well?
+        if self.sectional_overwrite_check():
+            target.overwrite_with(self, delta, True)
+        elif self.sectional_overwrite_no_negate_check():
+            target.overwrite_with(self, delta, False)
+
+    def _add_new_in_config(self, child):
+        """ Add a deep copy of child, marked as new_in_config, to self """
+
+        new_item = self.add_deep_copy_of(child)
+        # mark the new item and all of its children as new_in_config
+        new_item.new_in_config = True
+        for new_child in new_item.all_children():
+            new_child.new_in_config = True
+        if new_item.children:
+            new_item.comments.add("new section")
+
+    def _apply_delta(self, delta_parent):
+        """
+        Apply the children of delta_parent, a node of a remediation created
+        by config_to_get_to(), to the children of self. See HConfig.apply().
+
+        """
+
+        root = self.root
+        children_dict = self.children_dict
+        removed = set()
+        # children added from delta_parent are never overwritten by it
+        added = set()
+        seq_index = None
+        idempotent_index = {}
+
+        def remove(child):
+            removed.add(id(child))
+            if children_dict.get(child.text) is child:
+                del children_dict[child.text]
+
+        def remove_prefixed(prefix):
+            for child in self.children:
+                if id(child) not in removed and child.text.startswith(prefix):
+                    remove(child)
+
+        exit_texts = set()
+        acl_rule = None
+        if delta_parent is not delta_parent.root:
+            for rule in self.options['sectional_exiting']:
+                if delta_parent.lineage_test(rule):
+                    exit_texts.add(rule['exit_text'])
+            acl_rule = delta_parent.acl_sequence_diff_rule()
+
+        for delta_child in delta_parent.children:
+            text = delta_child.text
+            if text in exit_texts:
+                continue
+
+            if self is root and root._apply_acl_resequence(text):
+                continue
+
+            if acl_rule is not None and text.startswith('no ') and text[3:].isdigit():
+                if seq_index is None:
+                    seq_index = {}
+                    for child in self.children:
+                        entry = acl_diff.parse_entry(child.text)
+                        if entry is not None:
+                            seq_index.setdefault(entry[0], child)
+                child = seq_index.pop(int(text[3:]), None)
+                if child is not None:
+                    remove(child)
+                continue
+
+            if text.startswith('no ') or text.startswith('default '):
+                positive = text.split(' ', 1)[1]
+                for negative in (positive, 'no ' + positive):
+                    child = children_dict.get(negative)
+                    if child is not None:
+                        remove(child)
+                        break
+                else:
+                    # e.g. negation_negate_with rules, 'no description'
+                    remove_prefixed(positive + ' ')
+                if text.startswith('no ') and delta_child.new_in_config:
+                    added.add(id(self.add_child(text)))
+                continue
+
+            negated = children_dict.get('no ' + text)
+            if negated is not None:
+                remove(negated)
+
+            child = children_dict.get(text)
+            if child is None:
+                self._remove_idempotent_siblings(
+                    delta_child, idempotent_index, removed, added, remove)
+                child = self.add_child(text)
+                added.add(id(child))
+            elif delta_child.children and child.sectional_overwrite_no_negate_check():
+                child.children = []
+                child.children_dict = {}
+            if delta_child.children:
+                child._apply_delta(delta_child)
+
+        if removed:
+            self.children = [c for c in self.children if id(c) not in removed]
+            self.rebuild_children_dict()
+        if acl_rule is not None and added:
+            # keep inserted entries in sequence number order
+            self.children.sort(key=acl_diff.sequence_key)
+
+    def _remove_idempotent_siblings(self, delta_child, index, removed, added, remove):
+        """
+        Remove the children of self, except those in removed or added, that
+        delta_child overwrites, see is_idempotent_command(). Only children
+        that match the same idempotent_commands rule with the same leaf
+        expression are overwritten, see _idempotent_leaf(). index is filled
+        on first use with the children of self by rule and leaf expression
+        and by ACL sequence number.
+
+        """
+
+        blacklisted, rules = delta_child._idempotency_signature()
+        acl = delta_child._idempotent_acl_check()
+        if blacklisted or not (rules or acl):
+            return
+
+        idempotent_commands = self.options['idempotent_commands']
+        if not index:
+            index['rules'] = {}
+            index['sequences'] = {}
+            for child in self.children:
+                child_blacklisted, child_rules = child._idempotency_signature()
+                if child_blacklisted:
+                    continue
+                bit = 0
+                while child_rules >> bit:
+                    if child_rules >> bit & 1:
+                        leaf = child._idempotent_leaf(idempotent_commands[bit])
+                        index['rules'].setdefault((bit, leaf), []).append(child)
+                    bit += 1
+                if acl:
+                    index['sequences'].setdefault(
+                        child.text.split(' ', 1)[0], []).append(child)
+
+        candidates = []
+        bit = 0
+        while rules >> bit:
+            if rules >> bit & 1:
+                leaf = delta_child._idempotent_leaf(idempotent_commands[bit])
+                candidates.extend(index['rules'].get((bit, leaf), ()))
+            bit += 1
+        if acl:
+            candidates.extend(index['sequences'].get(delta_child.text.split(' ', 1)[0], ()))
+        for child in candidates:
+            if id(child) not in removed and id(child) not in added:
+                remove(child)
+
+    def _idempotent_leaf(self, rule):
+        """
+        Return (test, expression) of the first text match rule in the last
+        lineage level of rule that matches self.text, without a negation.
+        e.g. with startswith: [description, ip address], 'ip address 10.0.0.1
+        255.255.255.0' overwrites other ip address lines but not a description.
+
+        """
+
+        text = self.text
+        if text.startswith('no '):
+            text = text[3:]
+        elif text.startswith('default '):
+            text = text[8:]
+        _, text_match_rules = HConfigChild._explode_lineage_rule(rule['lineage'][-1])
+        for text_match_rule in text_match_rules:
+            if TextMatch.dict_call(text_match_rule['test'], text, text_match_rule['expression']):
+                return text_match_rule['test'], text_match_rule['expression']
+        return None
 
     def _swap_negation(self):
         """ Swap negation of a self.text """
@@ -616,6 +1109,150 @@ class HConfigChild:
             self.text = 'default ' + self.text
         return self
 
+    @stage('config_to_get_to_and_from', nodes='results')
+    def config_to_get_to_and_from(self, target, forward=None, rollback=None):
+        """
+        Figures out the commands that transition from self to target and the
+        commands that roll back from target to self, in a single pass.
+
+        Returns (forward, rollback), the same remediations as
+        self.config_to_get_to(target) and target.config_to_get_to(self).
+        The children of self and target are matched once and every child is
+        evaluated against the idempotent command rules at most once.
+
+        .. code:: python
+
+            remediation, rollback = running_config_hier.config_to_get_to_and_from(
+                compiled_config_hier)
+
+        """
+
+        from hier_config import HConfig
+        if forward is None:
+            forward = HConfig(self.hostname, self.os, self.options)
+        if rollback is None:
+            rollback = HConfig(target.hostname, target.os, target.options)
+
+        self._config_to_get_to_and_from(target, forward, rollback)
+
+        return forward, rollback
+
+    def _config_to_get_to_and_from(self, target, forward, rollback):
+        if len(self.children) != len(self.children_dict) or len(target.children) != len(target.children_dict):
+            # duplicate children only match their first occurrence, so leave
+            # this level to the one way algorithm
+            self.config_to_get_to(target, forward)
+            target.config_to_get_to(self, rollback)
+            return
+
+        self_dict = self.children_dict
+        target_dict = target.children_dict
+        signatures = {}
+        self._negate_unmatched(
+            [c for c in self.children if c.text not in target_dict],
+            target.children, forward, signatures)
+        target._negate_unmatched(
+            [c for c in target.children if c.text not in self_dict],
+            self.children, rollback, signatures)
+
+        # forward, in the order of target
+        rollback_subtrees = {}
+        for target_child in target.children:
+            self_child = self_dict.get(target_child.text)
+            if self_child is None:
+                forward._add_new_in_config(target_child)
+            elif target_child.text in forward or self_child.acl_sequence_diff_rule() is not None:
+                self_child._config_to_get_to_matched(target_child, forward)
+            else:
+                # the subtrees are attached below only if they are not empty,
+                # which is where add_child() would have put them
+                subtree = HConfigChild(forward, target_child.text)
+                rollback_subtree = HConfigChild(rollback, target_child.text)
+                self_child._config_to_get_to_and_from(
+                    target_child, subtree, rollback_subtree)
+                rollback_subtrees[target_child.text] = rollback_subtree
+                if subtree.children:
+                    forward._attach(subtree)
+                    self_child._overwrite_matched(target_child, forward)
+
+        # rollback, in the order of self
+        for self_child in self.children:
+            target_child = target_dict.get(self_child.text)
+            rollback_subtree = rollback_subtrees.get(self_child.text)
+            if target_child is None:
+                rollback._add_new_in_config(self_child)
+            elif rollback_subtree is None or self_child.text in rollback:
+                target_child._config_to_get_to_matched(self_child, rollback)
+            elif rollback_subtree.children:
+                rollback._attach(rollback_subtree)
+                target_child._overwrite_matched(self_child, rollback)
+
+    def _attach(self, child):
+        """ Append child, created with self as its parent, to self.children """
+
+        self.children.append(child)
+        self.children_dict[child.text] = child
+
+    def _negate_unmatched(self, unmatched, others, delta, signatures):
+        """
+        Add the negation of each child in unmatched that is not overwritten
+        by an idempotent command in others to delta.
+        See is_idempotent_command().
+
+        :param unmatched: children of self missing from the other config
+        :param others: children of the other config at the same level
+        :param signatures: cache of _idempotency_signature() by child id
+
+        """
+
+        if not unmatched:
+            return
+
+        def signature(child):
+            child_signature = signatures.get(id(child))
+            if child_signature is None:
+                child_signature = signatures[id(child)] = child._idempotency_signature()
+            return child_signature
+
+        others_rules = None
+        sequences = None
+        for self_child in unmatched:
+            blacklisted, rules = signature(self_child)
+            if not blacklisted:
+                if self_child._idempotent_acl_check():
+                    if sequences is None:
+                        sequences = {c.text.split(' ', 1)[0] for c in others}
+                    if self_child.text.split(' ', 1)[0] in sequences:
+                        continue
+                if rules:
+                    if others_rules is None:
+                        others_rules = 0
+                        for other_child in others:
+                            others_rules |= signature(other_child)[1]
+                    if rules & others_rules:
+                        continue
+            deleted = delta.add_child(self_child.text)
+            deleted.negate()
+            if self_child.children:
+                deleted.comments.add(
+                    f"removes {len(self_child.children_dict) + 1} lines")
+
+    def _idempotency_signature(self):
+        """
+        Return (blacklisted, rules) where rules is a bitset of the
+        idempotent_commands rules matched by self
+
+        """
+
+        blacklisted = any(
+            self.lineage_test(rule, True)
+            for rule in self.options['idempotent_commands_blacklist'])
+        rules = 0
+        for bit, rule in enumerate(self.options['idempotent_commands']):
+            if self.lineage_test(rule, True):
+                rules |= 1 << bit
+        return blacklisted, rules
+
     def _idempotent_acl_check(self):
         """
         Handle conditional testing to determine if idempotent acl handling for iosxr should be used
@@ -672,6 +1309,18 @@ class HConfigChild:
                 return True
         return False
 
+    def acl_sequence_diff_rule(self):
+        """
+        Return the acl_sequence_diff rule matching self, or None.
+        See hier_config.acl_diff.
+
+        """
+
+        for rule in self.options.get('acl_sequence_diff', ()):
+            if self.lineage_test(rule):
+                return rule
+        return None
+
     def sectional_overwrite_check(self):
         """ Determines if self.text matches a sectional overwrite rule """
 
@@ -707,17 +1356,23 @@ class HConfigChild:
         """ Add a nested copy of a child_to_add to self.children """
 
         new_child = self.add_child(child_to_add.text)
-        if merged:
-            new_child.instances.append({
-                'hostname': child_to_add.hostname,
-                'comments': child_to_add.comments,
-                'tags': child_to_add.tags})
-        new_child.comments.update(child_to_add.comments)
-        new_child.tags.update(child_to_add.tags)
-        new_child.order_weight = child_to_add.order_weight
-
+        new_child._copy_attributes_of(child_to_add, merged)
         return new_child
 
+    def _copy_attributes_of(self, child, merged):
+        """ Copy the comments, tags and order_weight of child to self """
+
+        if merged:
+            self.instances.append({
+                'hostname': child.hostname,
+                'comments': child.comments,
+                'tags': child.tags})
+        if child.comments:
+            self.comments.update(child.comments)
+        if child._tag_mask:
+            self.tags.update(child.tags)
+        self.order_weight = child.order_weight
+
     def line_inclusion_test(self, include_tags, exclude_tags):
         """
         Given the line_tags, include_tags, and exclude_tags,
@@ -725,23 +1380,23 @@ class HConfigChild:
 
         """
 
-        include_line = False
-        if include_tags:
-            set_include_tags = set(include_tags)
-            include_line = bool(self.tags.intersection(set_include_tags))
-
-        if include_line:
-            set_exclude_tags = set(exclude_tags)
-            if self.tags.intersection(set_exclude_tags):
-                return False
-            else:
-                return True
-        else:
-            return False
+        root = self.root
+        if self._tag_mask & root._tags_mask(include_tags or ()):
+            return not self._tag_mask & root._tags_mask(exclude_tags or ())
+        return False
 
     def lineage_test(self, rule, strip_negation=False):
         """ A generic test against a lineage of HConfigChild objects """
 
+        if instrumentation.enabled:
+            return instrumentation.evaluate_rule(
+                self, rule, self._lineage_test, rule, strip_negation)
+        return self._lineage_test(rule, strip_negation)
+
+    def _lineage_test(self, rule, strip_negation):
+        if isinstance(rule, Rule):
+            return rule.lineage_test(self, strip_negation)
+
         if 'match_leaf' in rule and rule['match_leaf']:
             # stupid trick to make a generator with one item
             lineage_obj = (self for _ in [None])
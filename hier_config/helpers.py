@@ -6,5 +6,7 @@ Place any reusable functions for parsing HConfig object here
 def to_list(obj):
     if isinstance(obj, list):
         return obj
+    elif isinstance(obj, tuple):
+        return list(obj)
     else:
         return [obj]
@@ -0,0 +1,358 @@
+"""
+Opt-in instrumentation of the stages of HConfig
+
+.. code:: python
+
+    from hier_config.instrumentation import Stats
+
+    stats = Stats()
+    with stats:
+        running_config_hier.load_from_file('./running_config.conf')
+        remediation_config_hier = running_config_hier.config_to_get_to(
+            compiled_config_hier)
+    metrics = stats.as_dict()
+
+While a Stats object is active on a thread, every call of a stage records:
+
+    calls             number of calls
+    seconds           wall time, including nested stages
+    nodes             lines in the resulting tree
+    rule_evaluations  lineage_test() calls
+    regex_calls       're_search' text match rule calls
+    allocations       HConfigChild objects created
+    rules             rule_evaluations by options rule, e.g. 'ordering[3]'
+
+The counters are attributed to the innermost active stage only. Pass a
+callback to Stats to receive each call's measurements as callback(stage,
+measurements). Stages are:
+
+    parse, acl_post_processing, config_to_get_to,
+    config_to_get_to_and_from, apply, add_sectional_exiting,
+    set_order_weight, add_tags
+
+RuleProfiler attributes the evaluations, matches and cumulative time of
+lineage rule tests to each rule of the options and of a tag spec:
+
+.. code:: python
+
+    from hier_config.instrumentation import RuleProfiler
+
+    with RuleProfiler(options, tag_rules=tags) as profiler:
+        remediation_config_hier = running_config_hier.config_to_get_to(
+            compiled_config_hier)
+        remediation_config_hier.set_order_weight()
+        remediation_config_hier.add_tags(tags)
+    for row in profiler.ranked()[:10]:
+        print(row['rule'], row['evaluations'], row['matches'], row['seconds'])
+    print(profiler.dead_rules())
+
+Negation rules are resolved through a cache, see HConfig._negation_rule(),
+so they are profiled on their leaf text rules. set_order_weight() bypasses
+its caches while measured and evaluates every ordering rule on every line.
+
+Only the thread that enters a Stats or RuleProfiler object is measured.
+Rule tests, regex calls and allocations are counted at hook points in
+HConfigChild, the compiled rules of Options and TextMatch, which call
+count() and evaluate_rule() when enabled is set. When no Stats or
+RuleProfiler object is active in any thread, the hooks cost one check of
+enabled. While one is active, the other threads also look up their own,
+missing, objects.
+
+"""
+
+import functools
+import threading
+import time
+from collections.abc import Mapping
+
+_local = threading.local()
+_lock = threading.Lock()
+
+# the number of active Stats and RuleProfiler objects in all threads. The
+# hook points check it before looking for the active objects of their thread.
+enabled = 0
+
+COUNTERS = ('rule_evaluations', 'regex_calls', 'allocations')
+
+
+class Stats(object):
+    """
+    Collects per stage measurements while used as a context manager
+
+    :param callback: called with (stage, measurements) after each stage call
+
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.stages = {}
+        self._active = []
+        self._rule_labels = {}
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = getattr(_local, 'stats', None)
+        _local.stats = self
+        _enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _disable()
+        _local.stats = self._previous
+        self._previous = None
+        return False
+
+    def as_dict(self):
+        """ Return the aggregated measurements by stage """
+
+        return {stage: _export(record) for stage, record in self.stages.items()}
+
+    def _label_rules(self, rules, prefix):
+        for index, rule in enumerate(rules):
+            if isinstance(rule, Mapping):
+                # the rule is kept so its id can not be reused
+                self._rule_labels[_rule_id(rule)] = (
+                    rule, '{}[{}]'.format(prefix, index))
+
+    def _label_options(self, options):
+        for key, value in options.items():
+            if isinstance(value, (list, tuple)):
+                self._label_rules(value, key)
+
+    def _run(self, name, nodes, rules_arg, func, obj, args, kwargs):
+        # recursive calls are part of the outermost call
+        if any(record['stage'] == name for record in self._active):
+            return func(obj, *args, **kwargs)
+
+        self._label_options(obj.root.options)
+        if rules_arg is not None and args:
+            self._label_rules(args[0], rules_arg)
+
+        record = _new_record(name)
+        self._active.append(record)
+        start = time.perf_counter()
+        try:
+            result = func(obj, *args, **kwargs)
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            self._active.pop()
+
+        if nodes == 'result':
+            trees = (result,)
+        elif nodes == 'results':
+            trees = result
+        else:
+            trees = (obj,)
+        record['nodes'] = sum(1 for tree in trees for _ in tree.all_children())
+
+        total = self.stages.get(name)
+        if total is None:
+            total = self.stages[name] = _new_record(name)
+            total['calls'] = 0
+        for key in ('calls', 'seconds', 'nodes') + COUNTERS:
+            total[key] += record[key]
+        for label, count in record['rules'].items():
+            total['rules'][label] = total['rules'].get(label, 0) + count
+
+        if self.callback is not None:
+            self.callback(name, _export(record))
+        return result
+
+    def _count(self, counter, rule=None):
+        if not self._active:
+            return
+        record = self._active[-1]
+        record[counter] += 1
+        if rule is not None:
+            label = self._rule_labels.get(_rule_id(rule))
+            label = label[1] if label else 'other'
+            record['rules'][label] = record['rules'].get(label, 0) + 1
+
+
+class RuleProfiler(object):
+    """
+    Profiles the evaluations of each lineage rule while used as a context manager
+
+    Rules are labelled by their position, e.g. 'ordering[3]' or
+    'tag_rules[0]'. The rules of options and tag_rules are reported even
+    when they are never evaluated. The options of evaluated lines are
+    labelled as they are seen.
+
+    :param options: dict or Options to label and report, or None
+    :param tag_rules: list of tag rules to label and report, or None
+
+    """
+
+    def __init__(self, options=None, tag_rules=None):
+        # _rule_id(rule) -> [label, rule, evaluations, matches, seconds]
+        self.rules = {}
+        self._options = {}
+        self._previous = None
+        if options is not None:
+            self._index_options(options)
+        if tag_rules is not None:
+            self._add_rules(tag_rules, 'tag_rules')
+
+    def __enter__(self):
+        self._previous = getattr(_local, 'profiler', None)
+        _local.profiler = self
+        _enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _disable()
+        _local.profiler = self._previous
+        self._previous = None
+        return False
+
+    def _add_rules(self, rules, prefix):
+        for index, rule in enumerate(rules):
+            if isinstance(rule, Mapping) and 'lineage' in rule and _rule_id(rule) not in self.rules:
+                self.rules[_rule_id(rule)] = [
+                    '{}[{}]'.format(prefix, index), rule, 0, 0, 0.0]
+
+    def _index_options(self, options):
+        if id(options) in self._options:
+            return
+        # the options are kept so their id can not be reused
+        self._options[id(options)] = options
+        for key, value in options.items():
+            if isinstance(value, (list, tuple)):
+                self._add_rules(value, key)
+
+    def _record(self, node, rule, seconds, matched):
+        entry = self.rules.get(_rule_id(rule))
+        if entry is None:
+            self._index_options(node.options)
+            entry = self.rules.get(_rule_id(rule))
+            if entry is None:
+                entry = self.rules[_rule_id(rule)] = [
+                    'other[{}]'.format(len(self.rules)), rule, 0, 0, 0.0]
+        entry[2] += 1
+        if matched:
+            entry[3] += 1
+        entry[4] += seconds
+
+    def ranked(self, key='seconds'):
+        """
+        Return the profile of every rule, highest first
+
+        :param key: 'seconds', 'evaluations' or 'matches'
+        :returns: list of dicts with rule, lineage, evaluations, matches, seconds
+
+        """
+
+        rows = [{
+            'rule': label,
+            'lineage': rule.get('lineage'),
+            'evaluations': evaluations,
+            'matches': matches,
+            'seconds': seconds,
+        } for label, rule, evaluations, matches, seconds in self.rules.values()]
+        return sorted(rows, key=lambda row: row[key], reverse=True)
+
+    def dead_rules(self):
+        """ Return the labels of the rules that never matched a line """
+
+        return [entry[0] for entry in self.rules.values() if not entry[3]]
+
+    def as_dict(self):
+        """ Return evaluations, matches and seconds by rule label """
+
+        return {label: {'evaluations': evaluations, 'matches': matches, 'seconds': seconds}
+                for label, _, evaluations, matches, seconds in self.rules.values()}
+
+
+def _rule_id(rule):
+    # a compiled Rule is reported as the rule it was built from
+    return id(getattr(rule, 'source', rule))
+
+
+def _new_record(name):
+    return {
+        'stage': name,
+        'calls': 1,
+        'seconds': 0.0,
+        'nodes': 0,
+        'rule_evaluations': 0,
+        'regex_calls': 0,
+        'allocations': 0,
+        'rules': {},
+    }
+
+
+def _export(record):
+    exported = {k: v for k, v in record.items() if k != 'stage'}
+    exported['rules'] = dict(record['rules'])
+    return exported
+
+
+def stage(name, nodes='self', rules_arg=None):
+    """
+    Decorate a method of HConfigChild as an instrumented stage
+
+    :param name: str, the stage name
+    :param nodes: 'self', 'result' or 'results', the trees counted as nodes
+    :param rules_arg: label prefix of a list of rules passed as the first argument
+
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            stats = getattr(_local, 'stats', None) if enabled else None
+            if stats is None:
+                return func(self, *args, **kwargs)
+            return stats._run(name, nodes, rules_arg, func, self, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def measuring():
+    """ Return True if a Stats or RuleProfiler object is active in this thread """
+
+    if not enabled:
+        return False
+    return getattr(_local, 'stats', None) is not None or getattr(_local, 'profiler', None) is not None
+
+
+def count(counter, rule=None):
+    """
+    Count a regex call or allocation for the Stats active in this thread.
+    Call sites check enabled first.
+
+    """
+
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats._count(counter, rule)
+
+
+def evaluate_rule(node, rule, test, *args):
+    """
+    Return test(*args), the test of a lineage rule on node, counted and
+    timed for the Stats and RuleProfiler active in this thread. Call sites
+    check enabled first.
+
+    """
+
+    count('rule_evaluations', rule)
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None:
+        return test(*args)
+    start = time.perf_counter()
+    result = test(*args)
+    profiler._record(node, rule, time.perf_counter() - start, result)
+    return result
+
+
+def _enable():
+    global enabled
+    with _lock:
+        enabled += 1
+
+
+def _disable():
+    global enabled
+    with _lock:
+        enabled -= 1
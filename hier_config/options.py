@@ -0,0 +1,457 @@
+"""
+Validated, immutable HConfig options
+
+.. code:: python
+
+    from hier_config import HConfig
+    from hier_config.options import Options
+
+    options = Options.from_file('./tests/files/test_options_ios.yml')
+    running_config_hier = HConfig(hostname, 'ios', options)
+
+HConfig accepts a dict or an Options object. An Options object is shared by
+reference. A dict is validated and compiled once, and the result is reused
+for as long as the same dict is passed unchanged, see Options.coerce().
+
+Options is a read-only mapping with the same keys as the options dict. Its
+lists are tuples and its rules are Rule mappings, which hold precompiled text
+matchers for lineage_test(). Substitution, indent_adjust and
+multi_line_blocks regexes are compiled once. Missing rule lists default to
+empty tuples. fingerprint is a digest of the content, so equal options
+share a fingerprint and it can be used as a cache key.
+
+"""
+
+import copy
+import hashlib
+import json
+import re
+from collections.abc import Mapping
+
+from hier_config import instrumentation
+
+# lineage rule lists and the keys their rules require besides 'lineage'
+LINEAGE_RULES = {
+    'sectional_overwrite': (),
+    'sectional_overwrite_no_negate': (),
+    'ordering': ('order',),
+    'parent_allows_duplicate_child': (),
+    'sectional_exiting': ('exit_text',),
+    'idempotent_commands_blacklist': (),
+    'idempotent_commands': (),
+    'negation_default_when': (),
+    'negation_negate_with': ('use',),
+    'acl_sequence_diff': (),
+}
+
+# regex rule lists and their regex keys
+REGEX_RULES = {
+    'full_text_sub': ('search', 'replace'),
+    'per_line_sub': ('search', 'replace'),
+    'indent_adjust': ('start_expression', 'end_expression'),
+    'multi_line_blocks': ('start', 'end'),
+}
+
+OBJECT_TESTS = ('new_in_config', 'negative_intersection_tags')
+
+NEGATION_RULES = ('negation_negate_with', 'negation_default_when')
+
+# cached rule candidates by parent path before the cache is cleared, see
+# Options.negation_candidates()
+CANDIDATE_CACHE_SIZE = 1 << 16
+
+# options dicts whose Options are kept for reuse, see Options.coerce()
+COERCE_CACHE_SIZE = 64
+
+# cached order weights by line path before the cache is cleared, see
+# Options.order_weights
+ORDER_WEIGHT_CACHE_SIZE = 1 << 16
+
+
+# id of an options dict -> (copy of the dict, Options), see Options.coerce()
+_coerced = {}
+
+
+def _freeze(value):
+    if isinstance(value, FrozenDict):
+        return value
+    if isinstance(value, Mapping):
+        return FrozenDict(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class FrozenDict(Mapping):
+    """ A read-only mapping whose lists are frozen to tuples """
+
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = {k: _freeze(v) for k, v in data.items()}
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, _thaw(self))
+
+    def __hash__(self):
+        return hash(frozenset(self._data.items()))
+
+    def __reduce__(self):
+        return type(self), (_thaw(self),)
+
+
+def _text_test(test, expressions):
+    """ Compile one lineage text test of a list of expressions into a callable """
+
+    if test == 'equals':
+        values = frozenset(expressions)
+        return values.__contains__
+    if test == 'startswith':
+        return lambda text: text.startswith(expressions)
+    if test == 'endswith':
+        return lambda text: text.endswith(expressions)
+    if test in ('contains', 'contains_or_endswith'):
+        return lambda text: any(e in text for e in expressions)
+    if test == 're_search':
+        patterns = tuple(re.compile(e).search for e in expressions)
+
+        def re_search(text):
+            for search in patterns:
+                if instrumentation.enabled:
+                    instrumentation.count('regex_calls')
+                if search(text) is not None:
+                    return True
+            return False
+        return re_search
+    if test == 'anything':
+        return lambda text: True
+    if test == 'nothing':
+        return lambda text: False
+    raise ValueError('unknown lineage test {!r}'.format(test))
+
+
+def _compile_level(level):
+    """ Return (object_tests, text_test) for one level of a lineage rule """
+
+    object_tests = []
+    text_tests = []
+    for test, expression in level.items():
+        if test in OBJECT_TESTS:
+            if test == 'negative_intersection_tags':
+                expression = frozenset(
+                    expression if isinstance(expression, tuple) else (expression,))
+            object_tests.append((test, expression))
+            continue
+        expressions = expression if isinstance(expression, tuple) else (expression,)
+        if test in ('startswith', 'endswith') and not all(isinstance(e, str) for e in expressions):
+            raise ValueError('{} expressions must be strings'.format(test))
+        text_tests.append(_text_test(test, expressions))
+
+    if not text_tests:
+        # a level without text tests never matches, as in lineage_test()
+        def text_test(text):
+            return False
+    elif len(text_tests) == 1:
+        text_test = text_tests[0]
+    else:
+        def text_test(text):
+            return any(t(text) for t in text_tests)
+    return tuple(object_tests), text_test
+
+
+def _object_test(object_tests, section):
+    for test, expression in object_tests:
+        if test == 'new_in_config':
+            if expression != section.new_in_config:
+                return False
+        elif not expression.isdisjoint(section.tags):
+            return False
+    return True
+
+
+class Rule(FrozenDict):
+    """
+    A read-only lineage rule with precompiled matchers
+
+    HConfigChild.lineage_test() uses the compiled matchers of a Rule and
+    interprets plain dict rules. source is the mapping the rule was built
+    from, so instrumentation reports a rule under its original.
+
+    """
+
+    __slots__ = ('_levels', '_match_leaf', 'has_object_tests', 'source')
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.source = data.source if isinstance(data, Rule) else data
+        lineage = self._data.get('lineage')
+        if not isinstance(lineage, tuple) or not all(isinstance(level, Mapping) for level in lineage):
+            raise ValueError('lineage must be a list of mappings, not {!r}'.format(lineage))
+        self._levels = tuple(_compile_level(level) for level in lineage)
+        self._match_leaf = bool(self._data.get('match_leaf'))
+        self.has_object_tests = any(object_tests for object_tests, _ in self._levels)
+
+    def lineage_test(self, node, strip_negation=False):
+        """ See HConfigChild.lineage_test() """
+
+        if self._match_leaf:
+            sections = (node,)
+            depth = 1
+        else:
+            sections = node.lineage()
+            depth = node.depth()
+        if len(self._levels) != depth:
+            return False
+
+        for (object_tests, text_test), section in zip(self._levels, sections):
+            if object_tests and not _object_test(object_tests, section):
+                return False
+            text = section.text
+            if strip_negation:
+                if text.startswith('no '):
+                    text = text[3:]
+                elif text.startswith('default '):
+                    text = text[8:]
+            if not text_test(text):
+                return False
+        return True
+
+    def parents_test(self, path):
+        """ Test the texts of path against every level of self but the last """
+
+        return all(text_test(text) for (_, text_test), text in zip(self._levels, path))
+
+    def leaf_test(self, text):
+        """ Test text against the last level of self """
+
+        return self._levels[-1][1](text)
+
+    @property
+    def match_leaf(self):
+        return self._match_leaf
+
+    @property
+    def depth(self):
+        return len(self._levels)
+
+
+def _candidates(rules, path):
+    """
+    Yield (rule, full) for the lineage rules that may match a child of the
+    section at path, see Options.negation_candidates()
+
+    """
+
+    depth = len(path) + 1
+    for rule in rules:
+        if rule.match_leaf:
+            if rule.depth == 1:
+                yield rule, rule.has_object_tests
+        elif rule.depth == depth:
+            if rule.has_object_tests:
+                yield rule, True
+            elif rule.parents_test(path):
+                yield rule, False
+
+
+def _regex_rule(key, index, rule):
+    required = REGEX_RULES[key]
+    if not isinstance(rule, Mapping):
+        raise ValueError('{}[{}] must be a mapping'.format(key, index))
+    for name in required:
+        if name not in rule:
+            raise ValueError('{}[{}] is missing {!r}'.format(key, index, name))
+    try:
+        return tuple(re.compile(rule[name]) if name != 'replace' else rule[name]
+                     for name in required)
+    except re.error as e:
+        raise ValueError('{}[{}] has an invalid regex: {}'.format(key, index, e))
+
+
+def _lineage_rule(key, index, rule):
+    if isinstance(rule, Rule):
+        return rule
+    if not isinstance(rule, Mapping):
+        raise ValueError('{}[{}] must be a mapping'.format(key, index))
+    for name in ('lineage',) + LINEAGE_RULES[key]:
+        if name not in rule:
+            raise ValueError('{}[{}] is missing {!r}'.format(key, index, name))
+    try:
+        return Rule(rule)
+    except (ValueError, re.error) as e:
+        raise ValueError('{}[{}]: {}'.format(key, index, e))
+
+
+class Options(Mapping):
+    """
+    Validated, immutable and hashable options, see hier_config.options
+
+    :param options: dict or Options
+
+    """
+
+    def __init__(self, options):
+        if not isinstance(options, Mapping):
+            raise ValueError('options must be a mapping')
+
+        data = {}
+        compiled = {}
+        for key, value in options.items():
+            if key in LINEAGE_RULES or key in REGEX_RULES:
+                if value is None:
+                    value = ()
+                if not isinstance(value, (list, tuple)):
+                    raise ValueError('{} must be a list'.format(key))
+                if key in LINEAGE_RULES:
+                    data[key] = tuple(
+                        _lineage_rule(key, i, rule) for i, rule in enumerate(value))
+                else:
+                    compiled[key] = tuple(
+                        _regex_rule(key, i, rule) for i, rule in enumerate(value))
+                    data[key] = _freeze(value)
+            else:
+                data[key] = _freeze(value)
+        for key in list(LINEAGE_RULES) + list(REGEX_RULES):
+            data.setdefault(key, ())
+            compiled.setdefault(key, ())
+
+        self._data = data
+        self.full_text_sub_patterns = compiled['full_text_sub']
+        self.per_line_sub_patterns = compiled['per_line_sub']
+        self.indent_adjust_patterns = compiled['indent_adjust']
+        self.multi_line_block_patterns = compiled['multi_line_blocks']
+        self.fingerprint = hashlib.sha256(json.dumps(
+            self.to_dict(), sort_keys=True, default=str).encode()).hexdigest()
+        # parent path -> negation rule candidates, see negation_candidates().
+        # It is cleared when it reaches CANDIDATE_CACHE_SIZE. Threads filling
+        # it concurrently store equal lists, so it needs no lock.
+        self._negation_candidates = {}
+        # parent path -> ordering rule candidates, see ordering_candidates(),
+        # bounded and shared in the same way
+        self._ordering_candidates = {}
+        # line path -> order weight, or None when no rule matches, see
+        # HConfigChild.set_order_weight(). It is cleared when it reaches
+        # ORDER_WEIGHT_CACHE_SIZE and, like the candidates, needs no lock.
+        self.order_weights = {}
+
+    @classmethod
+    def from_file(cls, file_path):
+        """
+        Load options from a YAML file, which requires PyYAML
+
+        :param file_path: str
+        :returns: Options
+
+        """
+
+        import yaml
+        with open(file_path) as f:
+            return cls(yaml.safe_load(f))
+
+    @classmethod
+    def coerce(cls, options):
+        """
+        Return options as an Options object, without copying an Options object
+
+        The Options built from a dict are kept by the id of the dict, with a
+        copy of its content, and returned again for the same, unchanged
+        dict. HConfig objects created from one options dict then share one
+        compiled Options.
+
+        """
+
+        if isinstance(options, cls):
+            return options
+        entry = _coerced.get(id(options))
+        if entry is not None and type(entry[1]) is cls and entry[0] == options:
+            return entry[1]
+        compiled = cls(options)
+        if len(_coerced) >= COERCE_CACHE_SIZE:
+            _coerced.clear()
+        _coerced[id(options)] = (copy.deepcopy(options), compiled)
+        return compiled
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return 'Options({})'.format(self.fingerprint[:12])
+
+    def __eq__(self, other):
+        if isinstance(other, Options):
+            return self.fingerprint == other.fingerprint
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    def __reduce__(self):
+        return Options, (self.to_dict(),)
+
+    def to_dict(self):
+        """ Return the options as plain dicts and lists """
+
+        return _thaw(self)
+
+    def negation_candidates(self, path):
+        """
+        Return the (option, rule, full) negation rules that may match a child
+        of the section at path, a tuple of texts, in order of precedence.
+        Only the leaf text of a child remains to be tested, or the whole
+        lineage when full is True.
+
+        """
+
+        candidates = self._negation_candidates.get(path)
+        if candidates is None:
+            candidates = [
+                (option, rule, full)
+                for option in NEGATION_RULES
+                for rule, full in _candidates(self._data[option], path)]
+            if len(self._negation_candidates) >= CANDIDATE_CACHE_SIZE:
+                self._negation_candidates.clear()
+            self._negation_candidates[path] = candidates
+        return candidates
+
+    def ordering_candidates(self, path):
+        """
+        Return (candidates, cacheable) for the ordering rules that may match a
+        child of the section at path, a tuple of texts. candidates are (rule,
+        full) pairs as in negation_candidates(), latest rule first, as later
+        rules take precedence. cacheable is True when no candidate has object
+        tests, so the weight of a child only depends on its path and can be
+        stored in order_weights.
+
+        """
+
+        candidates = self._ordering_candidates.get(path)
+        if candidates is None:
+            rules = list(_candidates(reversed(self._data['ordering']), path))
+            if len(self._ordering_candidates) >= CANDIDATE_CACHE_SIZE:
+                self._ordering_candidates.clear()
+            candidates = self._ordering_candidates[path] = (
+                rules, not any(full for _, full in rules))
+        return candidates
@@ -0,0 +1,134 @@
+"""
+Content-addressed on-disk cache of parsed configurations
+
+.. code:: python
+
+    from hier_config.parse_cache import ParseCache
+
+    cache = ParseCache('/var/cache/hier_config', max_bytes=512 * 1024 ** 2)
+
+    running_config_hier = HConfig(hostname, os, options)
+    running_config_hier.load_from_file('./running_config.conf', cache=cache)
+
+Entries are keyed by a hash of the configuration text, the os and the options
+that affect parsing, and hold the parsed tree as a binary dump. A hit loads
+the dump directly, so text substitutions, banner handling and ACL
+post-processing are skipped. Duplicate section messages that the parser would
+have added to HConfig.logs are not replayed on a hit.
+
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from hier_config import binary
+from hier_config.options import Options
+
+# the options that change the tree load_from_string() builds
+PARSE_OPTIONS = (
+    'full_text_sub', 'per_line_sub', 'indent_adjust', 'multi_line_blocks',
+    'parent_allows_duplicate_child')
+SUFFIX = '.hcfg'
+
+
+class ParseCache(object):
+    """
+    A directory of binary dumps with size-bounded least recently used eviction
+
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 ** 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def options_fingerprint(os_name, options):
+        """ Return a fingerprint of the os and the options used by the parser """
+
+        from hier_config import __version__
+        options = Options.coerce(options).to_dict()
+        relevant = {k: options.get(k) for k in PARSE_OPTIONS}
+        relevant['os'] = os_name
+        relevant['binary_version'] = binary.VERSION
+        relevant['hier_config_version'] = __version__
+        return hashlib.sha256(
+            json.dumps(relevant, sort_keys=True).encode()).hexdigest()
+
+    def key(self, config_text, os_name, options):
+        """ Return the cache key of config_text parsed with os_name and options """
+
+        digest = hashlib.sha256(
+            self.options_fingerprint(os_name, options).encode())
+        digest.update(config_text.encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        """ Return the binary dump stored under key, or None """
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # bump the mtime, which orders entries for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """ Store a binary dump under key and evict entries over max_bytes """
+
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """ Remove the least recently used entries until under max_bytes """
+
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """ Remove every entry """
+
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                os.remove(entry.path)
@@ -0,0 +1,235 @@
+"""
+Lazily materialized HConfig trees backed by memory-mapped binary dumps
+
+.. code:: python
+
+    from hier_config.snapshot import open_snapshot, write_snapshot
+
+    write_snapshot(running_config_hier, 'example.rtr.hcfg')
+
+    with open_snapshot('example.rtr.hcfg', hostname, os, options) as hier:
+        print(hier.section_texts())
+        vlan2 = hier.get_child('equals', 'interface Vlan2')
+
+Only the subtrees that are reached through children, children_dict,
+get_child or get_child_deep are decoded into HConfigChild objects.
+
+"""
+
+import mmap
+import sys
+
+from hier_config import HConfig
+from hier_config import binary
+from hier_config.hc_child import HConfigChild
+
+
+def write_snapshot(hconfig, file_path):
+    """ Write hconfig to file_path in the binary dump format """
+
+    with open(file_path, 'wb') as f:
+        f.write(hconfig.dump_binary())
+
+
+def open_snapshot(file_path, hostname, os, options):
+    """
+    Open a snapshot written by write_snapshot() as a lazily materialized HConfig
+
+    :param file_path: str
+    :param hostname: str
+    :param os: str
+    :param options: dict
+    :return: LazyHConfig
+
+    """
+
+    return LazyHConfig(hostname, os, options, Snapshot(file_path))
+
+
+class Snapshot(object):
+    """
+    Random access reader of a binary dump held in a read-only mmap
+
+    """
+
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self.layout = binary.Layout(self._view)
+        self._arrays = {}
+        for name in ('str_offsets', 'set_offsets', 'set_items', 'end',
+                     'text', 'tags', 'comments', 'order_weight', 'flags'):
+            start, end, typecode = self.layout.sections[name]
+            if sys.byteorder == 'little':
+                self._arrays[name] = self._view[start:end].cast(typecode)
+            else:
+                self._arrays[name] = self.layout.read_array(self._view, name)
+        self._strings = {}
+        self._sets = {0: ()}
+
+    @property
+    def closed(self):
+        return self._mmap is None
+
+    def close(self):
+        """ Release the mmap, after which no more subtrees can be materialized """
+
+        if self._mmap is None:
+            return
+        for item in self._arrays.values():
+            if isinstance(item, memoryview):
+                item.release()
+        self._arrays = {}
+        self._view.release()
+        self._mmap.close()
+        self._mmap = None
+
+    def _array(self, name):
+        if self._mmap is None:
+            raise ValueError('snapshot is closed')
+        return self._arrays[name]
+
+    def string(self, string_id):
+        """ Decode one entry of the string table, caching the result """
+
+        text = self._strings.get(string_id)
+        if text is None:
+            offsets = self._array('str_offsets')
+            start = self.layout.blob_start + offsets[string_id]
+            end = self.layout.blob_start + offsets[string_id + 1]
+            text = self._strings[string_id] = bytes(self._view[start:end]).decode()
+        return text
+
+    def string_set(self, set_id):
+        """ Decode one tag or comment set as a tuple """
+
+        values = self._sets.get(set_id)
+        if values is None:
+            set_offsets = self._array('set_offsets')
+            set_items = self._array('set_items')
+            values = self._sets[set_id] = tuple(
+                self.string(set_items[i])
+                for i in range(set_offsets[set_id], set_offsets[set_id + 1]))
+        return values
+
+    def text(self, index):
+        return self.string(self._array('text')[index])
+
+    def child_indexes(self, index):
+        """
+        Yield the node indexes of the children of index, skipping over
+        their subtrees. An index of -1 yields the top-level sections.
+
+        """
+
+        ends = self._array('end')
+        if index < 0:
+            child_index, stop = 0, self.layout.n_nodes
+        else:
+            child_index, stop = index + 1, ends[index]
+        while child_index < stop:
+            yield child_index
+            child_index = ends[child_index]
+
+    def has_children(self, index):
+        return self._array('end')[index] > index + 1
+
+    def make_child(self, parent, index):
+        """ Create the LazyHConfigChild for node index under parent """
+
+        child = LazyHConfigChild(parent, self.text(index), self, index)
+        child.tags = set(self.string_set(self._array('tags')[index]))
+        child.comments = set(self.string_set(self._array('comments')[index]))
+        child.order_weight = self._array('order_weight')[index]
+        child.new_in_config = bool(
+            self._array('flags')[index] & binary._NEW_IN_CONFIG)
+        return child
+
+
+class _LazyChildrenMixin(object):
+    """
+    Materializes children and children_dict from a Snapshot on first access
+
+    """
+
+    _snapshot = None
+    _snapshot_index = None
+
+    @property
+    def children(self):
+        if self._snapshot is not None:
+            self._materialize()
+        return self._children
+
+    @children.setter
+    def children(self, value):
+        self._children = value
+
+    @property
+    def children_dict(self):
+        if self._snapshot is not None:
+            self._materialize()
+        return self._children_dict
+
+    @children_dict.setter
+    def children_dict(self, value):
+        self._children_dict = value
+
+    @property
+    def materialized(self):
+        """ True once the direct children have been created """
+
+        return self._snapshot is None
+
+    def _materialize(self):
+        if self._snapshot.closed:
+            raise ValueError('snapshot is closed')
+        snapshot, self._snapshot = self._snapshot, None
+        for index in snapshot.child_indexes(self._snapshot_index):
+            child = snapshot.make_child(self, index)
+            self._children.append(child)
+            self._children_dict.setdefault(child.text, child)
+
+
+class LazyHConfigChild(_LazyChildrenMixin, HConfigChild):
+
+    def __init__(self, parent, text, snapshot, index):
+        super(LazyHConfigChild, self).__init__(parent, text)
+        if snapshot.has_children(index):
+            self._snapshot = snapshot
+            self._snapshot_index = index
+
+
+class LazyHConfig(_LazyChildrenMixin, HConfig):
+    """
+    A HConfig whose children are decoded from a Snapshot as they are accessed
+
+    """
+
+    def __init__(self, hostname, os, options, snapshot):
+        super(LazyHConfig, self).__init__(hostname, os, options)
+        self._snapshot = snapshot
+        self._snapshot_index = -1
+        self.snapshot = snapshot
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def section_texts(self):
+        """
+        Return the text of the top-level sections without decoding
+        anything below them
+
+        """
+
+        snapshot = self.snapshot
+        return [snapshot.text(i) for i in snapshot.child_indexes(-1)]
+
+    def close(self):
+        """ Close the underlying snapshot """
+
+        self.snapshot.close()
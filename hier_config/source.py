@@ -0,0 +1,97 @@
+"""
+Source spans, mapping the lines of a HConfig back to the text they were parsed from
+
+.. code:: python
+
+    running_config_hier.load_from_file('./running_config.conf', spans=True)
+    for child in running_config_hier.all_children():
+        span = child.source_span
+        print(span.line, span.start, span.end, span.text())
+
+load_from_string(), load_from_file() and load_from_buffer() record a
+SourceSpan on every line when spans are requested. line is the 1-based
+number of the first source line and start:end the slice of the buffer it
+was parsed from, which spans all of the lines of a banner. Offsets count
+characters of a str and bytes of a bytes-like buffer. With full_text_sub
+options they refer to the text after substitution.
+
+Spans reference the buffer rather than copying the lines, and text() slices
+it when called. load_from_file(mapped=True) parses a memory-mapped file with
+load_from_buffer(), so the source stays in the page cache rather than in
+one string per line.
+
+"""
+
+import re
+from collections import namedtuple
+
+# a line with its terminator, or a last line without one
+LINE_PATTERN = re.compile(rb'[^\n]*\n|[^\n]+')
+
+
+class Source(object):
+    """
+    A buffer that lines were parsed from
+
+    :param buffer: str, bytes, bytearray, memoryview or mmap
+    :param encoding: str, the encoding of a bytes-like buffer
+
+    """
+
+    __slots__ = ('buffer', 'encoding')
+
+    def __init__(self, buffer, encoding='utf-8'):
+        self.buffer = buffer
+        self.encoding = encoding
+
+    def text(self, start, end):
+        data = self.buffer[start:end]
+        if isinstance(data, str):
+            return data
+        return bytes(data).decode(self.encoding, 'replace')
+
+
+class SourceSpan(namedtuple('SourceSpan', ('source', 'line', 'start', 'end'))):
+    """ The position of a line in its Source, see hier_config.source """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'SourceSpan(line={}, start={}, end={})'.format(self.line, self.start, self.end)
+
+    def text(self):
+        """ Return the source text of the span """
+
+        return self.source.text(self.start, self.end)
+
+    def extend(self, other):
+        """ Return a span from the start of self to the end of other """
+
+        return self._replace(end=other.end)
+
+
+def str_lines(source, text):
+    """ Yield (line, span) for each line of text, split as by str.splitlines() """
+
+    offset = 0
+    for number, raw in enumerate(text.splitlines(True), 1):
+        line = raw.splitlines()[0] if raw else raw
+        yield line, SourceSpan(source, number, offset, offset + len(line))
+        offset += len(raw)
+
+
+def buffer_lines(source):
+    """
+    Yield (line, span) for each line of a bytes-like buffer, split on newlines
+
+    Only one line is decoded at a time.
+
+    """
+
+    encoding = source.encoding
+    for number, match in enumerate(LINE_PATTERN.finditer(source.buffer), 1):
+        raw = match.group()
+        line = raw.rstrip(b'\r\n')
+        start = match.start()
+        yield line.decode(encoding, 'replace'), SourceSpan(
+            source, number, start, start + len(line))
@@ -0,0 +1,57 @@
+from collections.abc import MutableSet
+
+
+class TagSet(MutableSet):
+    """
+    The tags of a HConfigChild, viewed as a set of tag names
+
+    Tags are stored on the node as an integer bitset, HConfigChild._tag_mask,
+    with bit positions interned per HConfig root. TagSet translates between
+    tag names and that bitset so existing set style code keeps working.
+
+    """
+
+    __slots__ = ('_node',)
+
+    def __init__(self, node):
+        self._node = node
+
+    def __repr__(self):
+        return 'TagSet({})'.format(set(self))
+
+    def __contains__(self, tag):
+        bit = self._node.root._tag_bits.get(tag)
+        return bit is not None and bool(self._node._tag_mask >> bit & 1)
+
+    def __iter__(self):
+        return iter(self._node.root._mask_tags(self._node._tag_mask))
+
+    def __len__(self):
+        return bin(self._node._tag_mask).count('1')
+
+    def add(self, tag):
+        self.update((tag,))
+
+    def discard(self, tag):
+        self.difference_update((tag,))
+
+    def update(self, tags):
+        self._node._tag_mask |= self._node.root._tags_mask(tags, intern=True)
+
+    def difference_update(self, tags):
+        self._node._tag_mask &= ~self._node.root._tags_mask(tags)
+
+    def clear(self):
+        self._node._tag_mask = 0
+
+    def intersection(self, tags):
+        return set(self).intersection(tags)
+
+    def union(self, tags):
+        return set(self).union(tags)
+
+    def difference(self, tags):
+        return set(self).difference(tags)
+
+    def copy(self):
+        return set(self)
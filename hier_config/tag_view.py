@@ -0,0 +1,81 @@
+class TagView(object):
+    """
+    A read-only view of a HConfigChild limited to the sub-objects that
+    carry, or have descendants that carry, one of a set of tags
+
+    Created by HConfigChild.tagged_view(). Text, tags, comments and other
+    attributes are read from the underlying object, so nothing is copied.
+
+    """
+
+    __slots__ = ('node', '_include_mask', '_subtree_masks')
+
+    def __init__(self, node, include_mask, subtree_masks):
+        self.node = node
+        self._include_mask = include_mask
+        self._subtree_masks = subtree_masks
+
+    @classmethod
+    def create(cls, node, tags):
+        return cls(node, node.root._tags_mask(tags), node._subtree_tag_masks())
+
+    def __repr__(self):
+        return 'TagView({!r})'.format(self.node)
+
+    def __str__(self):
+        return str(self.node)
+
+    def __getattr__(self, name):
+        if name in ('text', 'tags', 'comments', 'order_weight',
+                    'new_in_config', 'hostname', 'os', 'options'):
+            return getattr(self.node, name)
+        raise AttributeError(name)
+
+    def __lt__(self, other):
+        return self.node.order_weight < other.node.order_weight
+
+    def __len__(self):
+        length = 0
+        for _ in self.all_children():
+            length += 1
+        return length
+
+    def __bool__(self):
+        return True
+
+    @property
+    def children(self):
+        masks = self._subtree_masks
+        return [TagView(c, self._include_mask, masks)
+                for c in self.node.children
+                if masks[id(c)] & self._include_mask]
+
+    def has_children(self):
+        return bool(self.children)
+
+    def depth(self):
+        return self.node.depth()
+
+    def path(self):
+        return self.node.path()
+
+    def get_child(self, test, expression):
+        return next(self.get_children(test, expression), None)
+
+    def get_children(self, test, expression):
+        for child in self.node.get_children(test, expression):
+            if self._subtree_masks[id(child)] & self._include_mask:
+                yield TagView(child, self._include_mask, self._subtree_masks)
+
+    def all_children(self):
+        for child in self.children:
+            yield child
+            yield from child.all_children()
+
+    def all_children_sorted(self):
+        for child in sorted(self.children):
+            yield child
+            yield from child.all_children_sorted()
+
+    def cisco_style_text(self, style='without_comments', tag=None):
+        return self.node.cisco_style_text(style, tag)
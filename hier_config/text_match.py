@@ -1,5 +1,7 @@
 import re
 
+from hier_config import instrumentation
+
 
 class TextMatch(object):
     """
@@ -76,4 +78,6 @@ class TextMatch(object):
         Test regex match. This method is comparatively
         very slow and should be avoided where possible.
         """
+        if instrumentation.enabled:
+            instrumentation.count('regex_calls')
         return re.search(expression, text) is not None
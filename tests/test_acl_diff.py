@@ -0,0 +1,238 @@
+import unittest
+import os
+import yaml
+
+from hier_config import HConfig
+from hier_config import acl_diff
+
+
+class TestAclDiff(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_a = 'example1.rtr'
+        cls.os = 'iosxr'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        with open(os.path.join(files, 'test_options_ios.yml')) as f:
+            cls.options = yaml.safe_load(f.read())
+        cls.options['acl_sequence_diff'] = [{
+            'lineage': [{'startswith': ['ipv4 access-list', 'ipv6 access-list']}],
+        }]
+
+    def _remediation(self, running, target, options=None):
+        options = options or self.options
+        running_hier = HConfig(self.host_a, self.os, options)
+        running_hier.load_from_string(running)
+        target_hier = HConfig(self.host_a, self.os, options)
+        target_hier.load_from_string(target)
+        remediation = running_hier.config_to_get_to(target_hier)
+        return [c.cisco_style_text() for c in remediation.all_children_sorted()]
+
+    def test_kept_pairs(self):
+        running = ['a', 'b', 'c', 'd', 'e']
+        target = ['a', 'x', 'c', 'b', 'd', 'e']
+        pairs = acl_diff.kept_pairs(running, target)
+        self.assertEqual(4, len(pairs))
+        self.assertEqual(sorted(pairs), pairs)
+        self.assertEqual(sorted(pairs, key=lambda p: p[1]), pairs)
+        for i, j in pairs:
+            self.assertEqual(running[i], target[j])
+        self.assertEqual([], acl_diff.kept_pairs([], ['a']))
+
+    def test_parse_entry(self):
+        self.assertEqual(
+            (10, '', 'permit ipv4 any any'),
+            acl_diff.parse_entry('10 permit ipv4 any any'))
+        self.assertEqual(
+            (20, 'sequence ', 'deny ipv6 any any'),
+            acl_diff.parse_entry('sequence 20 deny ipv6 any any'))
+        self.assertIsNone(acl_diff.parse_entry('permit ipv4 any any'))
+
+    def test_insert_without_renumbering(self):
+        running = '\n'.join([
+            'ipv4 access-list TEST',
+            ' 10 permit ipv4 host 10.0.0.1 any',
+            ' 20 permit ipv4 host 10.0.0.2 any',
+            ' 30 permit ipv4 host 10.0.0.3 any',
+        ])
+        # the target renumbered every entry after the new one
+        target = '\n'.join([
+            'ipv4 access-list TEST',
+            ' 10 permit ipv4 host 10.0.0.1 any',
+            ' 20 permit ipv4 host 10.0.0.9 any',
+            ' 30 permit ipv4 host 10.0.0.2 any',
+            ' 40 permit ipv4 host 10.0.0.3 any',
+        ])
+        self.assertEqual(
+            ['ipv4 access-list TEST', '  15 permit ipv4 host 10.0.0.9 any'],
+            self._remediation(running, target))
+
+    def test_move_and_delete(self):
+        running = '\n'.join([
+            'ipv4 access-list TEST',
+            ' 10 permit ipv4 host 10.0.0.1 any',
+            ' 20 permit ipv4 host 10.0.0.2 any',
+            ' 30 permit ipv4 host 10.0.0.3 any',
+            ' 40 deny ipv4 any any',
+        ])
+        target = '\n'.join([
+            'ipv4 access-list TEST',
+            ' 10 permit ipv4 host 10.0.0.3 any',
+            ' 20 permit ipv4 host 10.0.0.1 any',
+            ' 30 deny ipv4 any any',
+        ])
+        # two entries are kept in place, the others are removed or inserted
+        self.assertEqual(
+            ['ipv4 access-list TEST', '  no 10', '  no 20',
+             '  35 permit ipv4 host 10.0.0.1 any'],
+            self._remediation(running, target))
+
+    def test_unchanged(self):
+        acl = 'ipv6 access-list TEST6\n 10 permit ipv6 any any'
+        self.assertEqual([], self._remediation(acl, acl))
+
+    def test_resequence(self):
+        running = '\n'.join([
+            'ipv4 access-list TEST',
+            ' 1 permit ipv4 host 10.0.0.1 any',
+            ' 2 permit ipv4 host 10.0.0.2 any',
+        ])
+        target = '\n'.join([
+            'ipv4 access-list TEST',
+            ' 1 permit ipv4 host 10.0.0.1 any',
+            ' 2 permit ipv4 host 10.0.0.9 any',
+            ' 3 permit ipv4 host 10.0.0.2 any',
+        ])
+
+        # without a resequence template, the regular remediation is used
+        self.assertEqual(
+            ['ipv4 access-list TEST',
+             '  2 permit ipv4 host 10.0.0.9 any',
+             '  3 permit ipv4 host 10.0.0.2 any'],
+            self._remediation(running, target))
+
+        options = dict(self.options)
+        options['acl_sequence_diff'] = [{
+            'lineage': [{'startswith': 'ipv4 access-list'}],
+            'resequence': 'resequence access-list ipv4 {name} {start} {step}',
+        }]
+        self.assertEqual(
+            ['resequence access-list ipv4 TEST 10 10',
+             'ipv4 access-list TEST',
+             '  15 permit ipv4 host 10.0.0.9 any',
+             'resequence access-list ipv4 TEST 1 1'],
+            self._remediation(running, target, options))
+
+    def test_synthesized_sequences(self):
+        running = '\n'.join([
+            'ip access-list extended TEST',
+            ' permit ip host 10.0.0.1 any',
+            ' permit ip host 10.0.0.2 any',
+        ])
+        target = '\n'.join([
+            'ip access-list extended TEST',
+            ' permit ip host 10.0.0.1 any',
+            ' permit ip host 10.0.0.9 any',
+            ' permit ip host 10.0.0.2 any',
+        ])
+
+        def remediation(options):
+            running_hier = HConfig(self.host_a, 'ios', options)
+            running_hier.load_from_string(running)
+            target_hier = HConfig(self.host_a, 'ios', options)
+            target_hier.load_from_string(target)
+            remediation = running_hier.config_to_get_to(target_hier)
+            self.assertTrue(running_hier.future(remediation).config_equals(target_hier))
+            return [c.cisco_style_text() for c in remediation.all_children_sorted()]
+
+        # the numbers were made up by the parser, so without a resequence
+        # template the regular remediation is used
+        options = dict(self.options, acl_sequence_diff=[
+            {'lineage': [{'startswith': 'ip access-list'}]}])
+        self.assertEqual(
+            ['ip access-list extended TEST',
+             '  no 20 permit ip host 10.0.0.2 any',
+             '  20 permit ip host 10.0.0.9 any',
+             '  30 permit ip host 10.0.0.2 any'],
+            remediation(options))
+
+        options = dict(self.options, acl_sequence_diff=[{
+            'lineage': [{'startswith': 'ip access-list'}],
+            'resequence': 'ip access-list resequence {name} {start} {step}',
+        }])
+        self.assertEqual(
+            ['ip access-list resequence TEST 10 10',
+             'ip access-list extended TEST',
+             '  15 permit ip host 10.0.0.9 any',
+             'ip access-list resequence TEST 10 10'],
+            remediation(options))
+
+    def test_future(self):
+        running = '\n'.join([
+            'ipv4 access-list TEST',
+            ' 1 permit ipv4 host 10.0.0.1 any',
+            ' 2 permit ipv4 host 10.0.0.2 any',
+            ' 3 permit ipv4 host 10.0.0.3 any',
+        ])
+        target = '\n'.join([
+            'ipv4 access-list TEST',
+            ' 1 permit ipv4 host 10.0.0.1 any',
+            ' 2 permit ipv4 host 10.0.0.9 any',
+            ' 3 permit ipv4 host 10.0.0.8 any',
+            ' 4 permit ipv4 host 10.0.0.3 any',
+        ])
+        options = dict(self.options)
+        options['acl_sequence_diff'] = [{
+            'lineage': [{'startswith': 'ipv4 access-list'}],
+            'resequence': 'resequence access-list ipv4 {name} {start} {step}',
+        }]
+        running_hier = HConfig(self.host_a, self.os, options)
+        running_hier.load_from_string(running)
+        target_hier = HConfig(self.host_a, self.os, options)
+        target_hier.load_from_string(target)
+        remediation = running_hier.config_to_get_to(target_hier)
+        future = running_hier.future(remediation)
+
+        # resequenced to 10, 20, ..., changed, then resequenced to the target's numbers
+        self.assertEqual(
+            ['resequence access-list ipv4 TEST 10 10',
+             'ipv4 access-list TEST',
+             '  no 20',
+             '  16 permit ipv4 host 10.0.0.9 any',
+             '  22 permit ipv4 host 10.0.0.8 any',
+             'resequence access-list ipv4 TEST 1 1'],
+            [c.cisco_style_text() for c in remediation.all_children_sorted()])
+        self.assertEqual(
+            [c.cisco_style_text() for c in target_hier.all_children_sorted()],
+            [c.cisco_style_text() for c in future.all_children_sorted()])
+        self.assertTrue(future.config_equals(target_hier))
+
+        # without a template the entries are kept with their numbers
+        running_hier = HConfig(self.host_a, self.os, self.options)
+        running_hier.load_from_string(running.replace(' 3 ', ' 30 '))
+        target_hier = HConfig(self.host_a, self.os, self.options)
+        target_hier.load_from_string(target)
+        future = running_hier.future(running_hier.config_to_get_to(target_hier))
+        self.assertEqual(
+            ['ipv4 access-list TEST',
+             '  1 permit ipv4 host 10.0.0.1 any',
+             '  2 permit ipv4 host 10.0.0.9 any',
+             '  3 permit ipv4 host 10.0.0.8 any',
+             '  30 permit ipv4 host 10.0.0.3 any'],
+            [c.cisco_style_text() for c in future.all_children_sorted()])
+        self.assertFalse(future.config_equals(target_hier))
+
+    def test_large_acl(self):
+        entries = ['permit tcp any host 10.{}.{}.{} eq 443'.format(
+            i >> 16 & 255, i >> 8 & 255, i & 255) for i in range(20000)]
+        running = [(10 * (i + 1), '', e) for i, e in enumerate(entries)]
+        target_bodies = entries[:5000] + ['deny ip any any'] + entries[5001:]
+        target = [(10 * (i + 1), '', e) for i, e in enumerate(target_bodies)]
+        resequence_step, deletes, inserts = acl_diff.acl_plan(running, target)
+        self.assertIsNone(resequence_step)
+        self.assertEqual([50010], deletes)
+        self.assertEqual([(50010, '', 'deny ip any any')], inserts)
+
+
+if __name__ == "__main__":
+    unittest.main()
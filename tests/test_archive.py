@@ -0,0 +1,101 @@
+import unittest
+import gzip
+import io
+import os
+import tarfile
+import tempfile
+import yaml
+import zipfile
+
+from hier_config import HConfig
+from hier_config.archive import load_archive, iter_archive
+
+
+class TestArchive(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.os = 'ios'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        with open(os.path.join(files, 'test_options_ios.yml')) as f:
+            cls.options = yaml.safe_load(f.read())
+        with open(os.path.join(files, 'running_config.conf')) as f:
+            running = f.read()
+        with open(os.path.join(files, 'compiled_config.conf')) as f:
+            compiled = f.read()
+        cls.configs = [
+            ('backups/example1.rtr.conf', running),
+            ('backups/example2.rtr.conf', compiled),
+            ('backups/example3.rtr.conf', 'hostname example3.rtr\n'),
+        ]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def _assert_loaded(self, loaded, configs=None):
+        configs = configs or self.configs
+        self.assertEqual([name for name, _ in configs], [name for name, _ in loaded])
+        for (name, text), (_, hconfig) in zip(configs, loaded):
+            expected = HConfig(hconfig.hostname, self.os, self.options)
+            expected.load_from_string(text)
+            self.assertEqual(os.path.basename(name)[:-5], hconfig.hostname)
+            self.assertEqual(
+                [c.cisco_style_text() for c in expected.all_children()],
+                [c.cisco_style_text() for c in hconfig.all_children()])
+
+    def test_tar(self):
+        path = self._path('backups.tar.gz')
+        with tarfile.open(path, 'w:gz') as tar:
+            for name, text in self.configs:
+                data = text.encode()
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+        self._assert_loaded(list(load_archive(path, self.os, self.options)))
+        self._assert_loaded(list(load_archive(path, self.os, self.options, workers=2)))
+        with open(path, 'rb') as f:
+            self._assert_loaded(list(load_archive(f, self.os, self.options, format='tar')))
+
+    def test_zip(self):
+        path = self._path('backups.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('backups/', '')
+            for name, text in self.configs:
+                archive.writestr(name, text)
+        self._assert_loaded(list(load_archive(path, self.os, self.options)))
+
+    def test_gzip(self):
+        path = self._path('example1.rtr.conf.gz')
+        with gzip.open(path, 'wt') as f:
+            f.write(self.configs[0][1])
+        loaded = list(load_archive(path, self.os, self.options))
+        self._assert_loaded(loaded, [('example1.rtr.conf', self.configs[0][1])])
+
+    def test_concatenated(self):
+        path = self._path('backups.txt.gz')
+        with gzip.open(path, 'wt') as f:
+            f.write('preamble\n')
+            for name, text in self.configs:
+                f.write('### {}\n'.format(name))
+                f.write(text)
+        delimiter = '^### (.*\\S)'
+        self.assertEqual(
+            self.configs, list(iter_archive(path, delimiter=delimiter)))
+        self._assert_loaded(list(load_archive(
+            path, self.os, self.options, delimiter=delimiter, workers=2)))
+
+        with self.assertRaises(ValueError):
+            list(iter_archive(io.BytesIO(b''), delimiter=delimiter))
+        with self.assertRaises(ValueError):
+            list(iter_archive(path, format='concatenated'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import json
+import os
+import yaml
+
+from hier_config import HConfig
+from hier_config import binary
+
+
+class TestBinary(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_a = 'example1.rtr'
+        cls.os = 'ios'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        with open(os.path.join(files, 'test_options_ios.yml')) as f:
+            cls.options = yaml.safe_load(f.read())
+        with open(os.path.join(files, 'test_tags_ios.yml')) as f:
+            cls.tags = yaml.safe_load(f.read())
+        cls.running_cfg = os.path.join(files, 'running_config.conf')
+        cls.compiled_cfg = os.path.join(files, 'compiled_config.conf')
+
+    def _remediation(self):
+        running_config_hier = HConfig(self.host_a, self.os, self.options)
+        running_config_hier.load_from_file(self.running_cfg)
+        compiled_config_hier = HConfig(self.host_a, self.os, self.options)
+        compiled_config_hier.load_from_file(self.compiled_cfg)
+        remediation = running_config_hier.config_to_get_to(compiled_config_hier)
+        remediation.add_tags(self.tags)
+        return remediation
+
+    def test_round_trip(self):
+        hier_pre_dump = self._remediation()
+        acl = hier_pre_dump.add_child('ip access-list extended DUP')
+        acl.add_child('remark duplicate')
+        acl.add_child('remark duplicate', force_duplicate=True)
+        acl.order_weight = 300
+        acl.comments.add('ünïcode comment')
+
+        data = hier_pre_dump.dump_binary()
+        self.assertIsInstance(data, bytes)
+
+        hier_post_dump = HConfig(self.host_a, self.os, self.options)
+        hier_post_dump.load_from_binary(data)
+
+        self.assertEqual(hier_pre_dump, hier_post_dump)
+        self.assertEqual(hier_pre_dump.dump(), hier_post_dump.dump())
+        self.assertTrue(any(c.new_in_config for c in hier_post_dump.all_children()))
+        self.assertEqual(
+            2, len(hier_post_dump.get_child('equals', acl.text).children))
+        self.assertEqual(
+            300, hier_post_dump.get_child('equals', acl.text).order_weight)
+
+    def test_lineage_rules(self):
+        hier = self._remediation()
+        hier_post_dump = HConfig(self.host_a, self.os, self.options)
+        hier_post_dump.load_from_binary(hier.dump_binary(self.tags))
+        self.assertEqual(hier.dump(self.tags), hier_post_dump.dump())
+
+    def test_smaller_than_json(self):
+        hier = self._remediation()
+        self.assertLess(len(hier.dump_binary()), len(json.dumps(hier.dump())))
+
+    def test_empty(self):
+        hier = HConfig(self.host_a, self.os, self.options)
+        hier_post_dump = HConfig(self.host_a, self.os, self.options)
+        hier_post_dump.load_from_binary(hier.dump_binary())
+        self.assertFalse(hier_post_dump.children)
+
+    def test_bad_magic(self):
+        hier = HConfig(self.host_a, self.os, self.options)
+        with self.assertRaises(ValueError):
+            hier.load_from_binary(b'JUNK' + bytes(binary.HEADER.size))
+
+
+if __name__ == "__main__":
+    unittest.main()
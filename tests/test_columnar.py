@@ -0,0 +1,79 @@
+import unittest
+import os
+import yaml
+
+from hier_config import HConfig
+from hier_config.columnar import ColumnarHConfig
+
+
+class TestColumnar(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_a = 'example1.rtr'
+        cls.os = 'ios'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        with open(os.path.join(files, 'test_options_ios.yml')) as f:
+            cls.options = yaml.safe_load(f.read())
+        with open(os.path.join(files, 'test_tags_ios.yml')) as f:
+            cls.tags = yaml.safe_load(f.read())
+        cls.running_cfg = os.path.join(files, 'running_config.conf')
+        cls.compiled_cfg = os.path.join(files, 'compiled_config.conf')
+
+    def setUp(self):
+        running_config_hier = HConfig(self.host_a, self.os, self.options)
+        running_config_hier.load_from_file(self.running_cfg)
+        compiled_config_hier = HConfig(self.host_a, self.os, self.options)
+        compiled_config_hier.load_from_file(self.compiled_cfg)
+        self.hier = running_config_hier.config_to_get_to(compiled_config_hier)
+        self.hier.add_tags(self.tags)
+        self.hier.set_order_weight()
+        self.columnar = ColumnarHConfig.from_hconfig(self.hier)
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.hier), len(self.columnar))
+        hier = self.columnar.to_hconfig()
+        self.assertEqual(self.hier, hier)
+        self.assertEqual(self.hier.dump(), hier.dump())
+
+    def test_traversal(self):
+        self.assertEqual(
+            [c.cisco_style_text() for c in self.hier.all_children_sorted()],
+            [c.cisco_style_text() for c in self.columnar.all_children_sorted()])
+        self.assertEqual(
+            [list(c.path()) for c in self.hier.all_children()],
+            [list(c.path()) for c in self.columnar.all_children()])
+        self.assertEqual(
+            [c.text for c in self.hier.all_children_sorted_by_tags(['safe'], ['manual'])],
+            [c.text for c in self.columnar.all_children_sorted_by_tags(['safe'], ['manual'])])
+
+    def test_get_children(self):
+        interfaces = list(self.columnar.get_children('startswith', 'interface'))
+        self.assertEqual(
+            [c.text for c in self.hier.get_children('startswith', 'interface')],
+            [c.text for c in interfaces])
+        child = self.columnar.get_child_deep([
+            ('equals', 'interface Vlan4'), ('startswith', 'mtu')])
+        self.assertEqual('mtu 9000', child.text)
+        self.assertEqual('interface Vlan4', child.parent.text)
+        self.assertIsNone(self.columnar.get_child_deep([('equals', 'missing')]))
+
+    def test_lineage_test(self):
+        rule = {'lineage': [{'startswith': 'interface'},
+                            {'startswith': 'no shutdown'}]}
+        self.assertEqual(
+            [c.text for c in self.hier.all_children() if c.lineage_test(rule)],
+            [c.text for c in self.columnar.all_children() if c.lineage_test(rule)])
+
+    def test_many_tags(self):
+        hier = HConfig(self.host_a, self.os, self.options)
+        child = hier.add_child('interface Vlan2')
+        tags = {'tag{}'.format(i) for i in range(130)}
+        child.tags.update(tags)
+        columnar = ColumnarHConfig.from_hconfig(hier)
+        self.assertEqual(3, columnar.tag_width)
+        self.assertEqual(tags, columnar.node(0).tags)
+
+
+if __name__ == "__main__":
+    unittest.main()
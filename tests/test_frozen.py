@@ -0,0 +1,120 @@
+import unittest
+import copy
+import os
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+
+from hier_config import HConfig
+from hier_config.frozen import FrozenHConfig
+
+
+class TestFrozen(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_a = 'example1.rtr'
+        cls.os = 'ios'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        with open(os.path.join(files, 'test_options_ios.yml')) as f:
+            cls.options = yaml.safe_load(f.read())
+        with open(os.path.join(files, 'test_tags_ios.yml')) as f:
+            cls.tags = yaml.safe_load(f.read())
+        cls.running_cfg = os.path.join(files, 'running_config.conf')
+        cls.compiled_cfg = os.path.join(files, 'compiled_config.conf')
+
+    def _remediation(self):
+        running_config_hier = HConfig(self.host_a, self.os, self.options)
+        running_config_hier.load_from_file(self.running_cfg)
+        compiled_config_hier = HConfig(self.host_a, self.os, self.options)
+        compiled_config_hier.load_from_file(self.compiled_cfg)
+        remediation_config_hier = running_config_hier.config_to_get_to(
+            compiled_config_hier)
+        remediation_config_hier.set_order_weight()
+        remediation_config_hier.add_tags(self.tags)
+        return remediation_config_hier
+
+    def test_freeze(self):
+        hier = self._remediation()
+        frozen = hier.freeze()
+        self.assertIsInstance(frozen, FrozenHConfig)
+        self.assertEqual(
+            [c.cisco_style_text() for c in hier.all_children_sorted()],
+            [c.cisco_style_text() for c in frozen.all_children_sorted()])
+        self.assertEqual(
+            [(c.text, set(c.tags)) for c in hier.all_children()],
+            [(c.text, set(c.tags)) for c in frozen.all_children()])
+        self.assertEqual(
+            [c.text for c in hier.all_children_sorted_by_tags({'safe'}, {'manual'})],
+            [c.text for c in frozen.all_children_sorted_by_tags({'safe'}, {'manual'})])
+        self.assertEqual(len(list(hier.all_children())), len(frozen))
+
+        vlan3 = frozen.get_child('equals', 'vlan 3')
+        self.assertIs(vlan3, frozen.get_path(['vlan 3']))
+        self.assertIs(vlan3.get_child('startswith', 'name'),
+                      frozen.get_path(['vlan 3', 'name switch_mgmt_10.0.3.0/24']))
+        self.assertIs(vlan3.children[0], vlan3.get_path(['name switch_mgmt_10.0.3.0/24']))
+        self.assertIsNone(frozen.get_path(['vlan 3', 'x']))
+        self.assertEqual(['vlan 3', 'name switch_mgmt_10.0.3.0/24'],
+                         list(vlan3.children[0].path()))
+
+        self.assertTrue(vlan3.lineage_test({'lineage': [{'startswith': 'vlan'}]}))
+        for rule in self.tags:
+            self.assertEqual(
+                [c.lineage_test(rule) for c in hier.all_children()],
+                [c.lineage_test(rule) for c in frozen.all_children()])
+
+    def test_immutable(self):
+        hier = self._remediation()
+        frozen = hier.freeze()
+        child = frozen.children[0]
+        with self.assertRaises(AttributeError):
+            child.text = 'x'
+        with self.assertRaises(AttributeError):
+            frozen.children = ()
+        with self.assertRaises(TypeError):
+            frozen.children_dict['x'] = child
+        self.assertIsInstance(child.tags, frozenset)
+        self.assertIs(frozen, copy.deepcopy(frozen))
+
+        # the frozen copy does not follow later changes
+        hier.add_child('hostname example2.rtr')
+        self.assertNotIn('hostname example2.rtr', frozen)
+
+    def test_hash(self):
+        frozen_a = self._remediation().freeze()
+        frozen_b = self._remediation().freeze()
+        self.assertEqual(frozen_a, frozen_b)
+        self.assertEqual(hash(frozen_a), hash(frozen_b))
+        self.assertEqual(frozen_a.children[0], frozen_b.children[0])
+        self.assertEqual(1, len({frozen_a, frozen_b}))
+
+        hier = self._remediation()
+        hier.children[0].order_weight += 1
+        self.assertNotEqual(frozen_a, hier.freeze())
+        hier = self._remediation()
+        hier.children[0].append_tags('other')
+        self.assertNotEqual(frozen_a, hier.freeze())
+
+    def test_thaw(self):
+        hier = self._remediation()
+        thawed = hier.freeze().thaw()
+        self.assertEqual(hier, thawed)
+        self.assertEqual(hier.freeze(), thawed.freeze())
+
+    def test_concurrent_reads(self):
+        frozen = self._remediation().freeze()
+        paths = [tuple(c.path()) for c in frozen.all_children()]
+
+        def read(path):
+            node = frozen.get_path(path)
+            return (node.cisco_style_text(), tuple(node.path()),
+                    [c.text for c in node.all_children_sorted()])
+
+        expected = [read(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for _ in range(10):
+                self.assertEqual(expected, list(pool.map(read, paths)))
+
+
+if __name__ == "__main__":
+    unittest.main()
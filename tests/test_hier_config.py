@@ -1,8 +1,10 @@
 import unittest
+import asyncio
 import tempfile
 import os
 import yaml
 import types
+import io
 
 from hier_config import HConfig
 
@@ -72,6 +74,103 @@ class TestHConfig(unittest.TestCase):
         hier.load_from_string(config)
         self.assertEqual(2, len(list(hier.all_children())))
 
+    def test_aload(self):
+        async def stream(text):
+            for line in text.splitlines(True):
+                await asyncio.sleep(0)
+                yield line
+
+        with open(self.running_cfg) as f:
+            config = f.read()
+        hier = HConfig(self.host_a, self.os, self.options)
+        hier.load_from_string(config)
+
+        loop = asyncio.new_event_loop()
+        try:
+            streamed = loop.run_until_complete(
+                HConfig(self.host_a, self.os, self.options).aload(stream(config)))
+            self.assertEqual(
+                [c.cisco_style_text() for c in hier.all_children()],
+                [c.cisco_style_text() for c in streamed.all_children()])
+
+            running = 0
+            peak = 0
+
+            async def counted(text):
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                try:
+                    async for line in stream(text):
+                        yield line
+                finally:
+                    running -= 1
+
+            loaded = loop.run_until_complete(HConfig.aload_many(
+                [(HConfig(str(i), self.os, self.options),
+                  counted('hostname {}\n{}'.format(i, config))) for i in range(6)],
+                concurrency=2))
+        finally:
+            loop.close()
+        self.assertEqual([str(i) for i in range(6)], [h.hostname for h in loaded])
+        self.assertEqual('hostname 5', loaded[5].children[0].text)
+        self.assertEqual(2, peak)
+
+    def test_load_from_string_acl_processing(self):
+        hier = HConfig(self.host_a, self.os, self.options)
+        hier.load_from_string('\n'.join([
+            'ip access-list extended TEST',
+            ' remark first',
+            ' remark second',
+            ' permit ip any host 10.0.0.1',
+            ' remark third',
+            ' deny ip any any',
+            'ipv6 access-list TEST6',
+            ' sequence 20 permit ipv6 any any',
+        ]))
+        acl = hier.get_child('equals', 'ip access-list extended TEST')
+        self.assertEqual(
+            ['10 permit ip any host 10.0.0.1', '20 deny ip any any'],
+            [c.text for c in acl.children])
+        self.assertEqual(
+            ['10 permit ip any host 10.0.0.1', '20 deny ip any any'],
+            list(acl.children_dict))
+        acl6 = hier.get_child('equals', 'ipv6 access-list TEST6')
+        self.assertIsNotNone(acl6.get_child('equals', 'permit ipv6 any any'))
+
+    def test_load_from_string_multi_line_blocks(self):
+        hier = HConfig(self.host_a, self.os, self.options)
+        hier.load_from_string('\n'.join([
+            'banner exec ^C',
+            'hello',
+            '^C',
+            'banner login #',
+            'welcome ^C',
+            '#',
+            'hostname example1.rtr',
+        ]))
+        self.assertEqual(
+            ['banner exec ^C\nhello\n^C', 'banner login #\nwelcome ^C\n#',
+             'hostname example1.rtr'],
+            [c.text for c in hier.children])
+
+        options = dict(self.options, multi_line_blocks=[
+            {'start': '^certificate ', 'end': '^\\s*quit$'}])
+        hier = HConfig(self.host_a, self.os, options)
+        hier.load_from_string('\n'.join([
+            'crypto pki certificate chain TP-self-signed-1',
+            ' certificate self-signed 01',
+            '  3082022B 30820194',
+            '  A0030201 02020101',
+            '  \tquit',
+            'hostname example1.rtr',
+        ]))
+        chain = hier.get_child('startswith', 'crypto pki')
+        self.assertEqual(
+            ['certificate self-signed 01\n  3082022B 30820194\n  A0030201 02020101\n  \tquit'],
+            [c.text for c in chain.children])
+        self.assertEqual(2, len(hier.children))
+
     def test_dump_and_load_from_dump_and_compare(self):
         hier_pre_dump = HConfig(self.host_a, self.os, self.options)
         a1 = hier_pre_dump.add_child('a1')
@@ -89,6 +188,43 @@ class TestHConfig(unittest.TestCase):
 
         self.assertEqual(hier_pre_dump, hier_post_dump)
 
+    def test_export_by_tags(self):
+        running_config_hier = HConfig(self.host_a, self.os, self.options)
+        running_config_hier.load_from_file(self.running_cfg)
+        compiled_config_hier = HConfig(self.host_a, self.os, self.options)
+        compiled_config_hier.load_from_file(self.compiled_cfg)
+        remediation_config_hier = running_config_hier.config_to_get_to(
+            compiled_config_hier)
+        remediation_config_hier.add_tags(self.tags)
+
+        buckets = {
+            'safe': (['safe'], ['manual']),
+            'manual': (['manual', 'manaual'], []),
+            'none': (['missing'], []),
+            'untagged': None,
+        }
+        text = remediation_config_hier.export_by_tags(
+            buckets, style='with_comments')
+        dump = remediation_config_hier.export_by_tags(buckets, output='dump')
+        self.assertEqual(list(buckets), list(text))
+
+        for name, spec in buckets.items():
+            if spec is None:
+                children = list(
+                    remediation_config_hier.all_children_sorted_untagged())
+            else:
+                children = list(
+                    remediation_config_hier.all_children_sorted_by_tags(*spec))
+            self.assertEqual(
+                '\n'.join(c.cisco_style_text('with_comments') for c in children),
+                text[name])
+            self.assertEqual(
+                [remediation_config_hier._dump_item(c, c.depth()) for c in children],
+                dump[name])
+        self.assertTrue(text['safe'])
+        self.assertTrue(text['untagged'])
+        self.assertEqual('', text['none'])
+
     def test_add_tags(self):
         hier = HConfig(self.host_a, self.os, self.options)
         tag_rules = [{
@@ -155,7 +291,8 @@ class TestHConfig(unittest.TestCase):
     def test_move(self):
         hier1 = HConfig(self.host_a, self.os, self.options)
         interface1 = hier1.add_child('interface Vlan2')
-        interface1.add_child('192.168.0.1/30')
+        interface1.add_child('192.168.0.1/30').append_tags('b')
+        interface1.append_tags('a')
 
         self.assertEqual(2, len(list(hier1.all_children())))
 
@@ -167,6 +304,10 @@ class TestHConfig(unittest.TestCase):
 
         self.assertEqual(0, len(list(hier1.all_children())))
         self.assertEqual(2, len(list(hier2.all_children())))
+        self.assertIs(hier2, interface1.root)
+        self.assertEqual(
+            ['192.168.0.1/30'],
+            [c.text for c in hier2.all_children_sorted_by_tags(['b'], [])])
 
     def test_del_child_by_text(self):
         hier = HConfig(self.host_a, self.os, self.options)
@@ -199,7 +340,30 @@ class TestHConfig(unittest.TestCase):
         self.assertFalse(isinstance(interface, list))
 
     def test_add_deep_copy_of(self):
-        pass
+        options = dict(self.options, parent_allows_duplicate_child=[
+            {'lineage': [{'startswith': 'template'}]}])
+        hier = HConfig(self.host_a, self.os, options)
+        hier.load_from_string(
+            'interface Vlan2\n'
+            ' description a\n'
+            ' description a\n'
+            'template a\n'
+            ' access-session closed\n'
+            ' access-session closed\n')
+        self.assertEqual(["Found a duplicate section: ['interface Vlan2', 'description a']"],
+                         hier.logs)
+        hier.get_child('equals', 'interface Vlan2').append_tags('x')
+
+        copy = HConfig(self.host_a, self.os, options)
+        for child in hier.children:
+            copy.add_deep_copy_of(child)
+        self.assertEqual(
+            [c.cisco_style_text() for c in hier.all_children()],
+            [c.cisco_style_text() for c in copy.all_children()])
+        self.assertEqual({'x'}, copy.get_child('equals', 'interface Vlan2').tags)
+        template = copy.get_child('equals', 'template a')
+        self.assertEqual(2, len(template.children))
+        self.assertIs(template.children[0], template.get_child('equals', 'access-session closed'))
 
     def test_lineage(self):
         pass
@@ -221,11 +385,62 @@ class TestHConfig(unittest.TestCase):
         self.assertTrue(isinstance(ip_address.cisco_style_text(), str))
         self.assertFalse(isinstance(ip_address.cisco_style_text(), list))
 
+    def test_write_cisco_style_text(self):
+        running_config_hier = HConfig(self.host_a, self.os, self.options)
+        running_config_hier.load_from_file(self.running_cfg)
+        compiled_config_hier = HConfig(self.host_a, self.os, self.options)
+        compiled_config_hier.load_from_file(self.compiled_cfg)
+        remediation_config_hier = running_config_hier.config_to_get_to(
+            compiled_config_hier)
+        remediation_config_hier.add_tags(self.tags)
+
+        output = io.StringIO()
+        count = remediation_config_hier.write_cisco_style_text(
+            output, style='with_comments', buffer_lines=3)
+        expected = [c.cisco_style_text(style='with_comments')
+                    for c in remediation_config_hier.all_children_sorted()]
+        self.assertEqual(len(expected), count)
+        self.assertEqual('\n'.join(expected) + '\n', output.getvalue())
+
+        output = io.StringIO()
+        remediation_config_hier.write_cisco_style_text(
+            output, include_tags=['safe'], exclude_tags=['manual'])
+        expected = [c.cisco_style_text() for c in
+                    remediation_config_hier.all_children_sorted_by_tags(
+                        ['safe'], ['manual'])]
+        self.assertTrue(expected)
+        self.assertEqual('\n'.join(expected) + '\n', output.getvalue())
+
     def test_all_children_sorted_untagged(self):
-        pass
+        hier = HConfig(self.host_a, self.os, self.options)
+        interface = hier.add_child('interface Vlan2')
+        interface.add_child('no shutdown')
+        interface.append_tags('safe')
+        self.assertEqual(
+            ['no shutdown'],
+            [c.text for c in hier.all_children_sorted_untagged()])
 
     def test_all_children_sorted_by_tags(self):
-        pass
+        hier = HConfig(self.host_a, self.os, self.options)
+        vlan2 = hier.add_child('interface Vlan2')
+        vlan2.add_child('description safe').append_tags('safe')
+        vlan2.add_child('shutdown').append_tags(['safe', 'outage'])
+        vlan3 = hier.add_child('interface Vlan3')
+        vlan3.add_child('mtu 9000').append_tags('manual')
+        hier.add_child('hostname test')
+
+        for include_tags, exclude_tags in (
+                (['safe'], []), (['safe'], ['outage']), (['manual'], []),
+                (['safe', 'manual'], ['outage']), (['missing'], []), ([], [])):
+            expected = [
+                c for c in hier.all_children_sorted()
+                if c.line_inclusion_test(include_tags, exclude_tags)]
+            self.assertEqual(
+                expected,
+                list(hier.all_children_sorted_by_tags(include_tags, exclude_tags)))
+        self.assertEqual(
+            ['description safe', 'shutdown'],
+            [c.text for c in hier.all_children_sorted_by_tags(['safe'], [])])
 
     def test_all_children_sorted(self):
         hier = HConfig(self.host_a, self.os, self.options)
@@ -272,13 +487,59 @@ class TestHConfig(unittest.TestCase):
         pass
 
     def test_append_tags(self):
-        pass
+        hier = HConfig(self.host_a, self.os, self.options)
+        interface = hier.add_child('interface Vlan2')
+        interface.append_tags('a')
+        interface.append_tags(['b', 'c'])
+        interface.tags.add('d')
+        self.assertEqual({'a', 'b', 'c', 'd'}, interface.tags)
+        self.assertIn('a', interface.tags)
+        self.assertNotIn('e', interface.tags)
 
     def test_remove_tags(self):
-        pass
+        hier = HConfig(self.host_a, self.os, self.options)
+        interface = hier.add_child('interface Vlan2')
+        interface.tags = {'a', 'b', 'c'}
+        interface.remove_tags('a')
+        interface.tags.discard('b')
+        interface.remove_tags(['missing'])
+        self.assertEqual({'c'}, interface.tags)
 
     def test_with_tags(self):
-        pass
+        hier = HConfig(self.host_a, self.os, self.options)
+        vlan2 = hier.add_child('interface Vlan2')
+        vlan2.add_child('description safe').append_tags('safe')
+        vlan2.add_child('shutdown').append_tags('outage')
+        vlan2.append_tags(['safe', 'outage'])
+        acl = hier.add_child('ip access-list extended TEST')
+        acl.add_child('remark a')
+        acl.add_child('remark a', force_duplicate=True)
+        acl.deep_append_tags('safe')
+        hier.add_child('hostname test')
+
+        safe = hier.with_tags({'safe'})
+        self.assertEqual(
+            ['interface Vlan2', 'description safe',
+             'ip access-list extended TEST', 'remark a', 'remark a'],
+            [c.text for c in safe.all_children_sorted()])
+        self.assertEqual({'safe', 'outage'}, safe.get_child(
+            'equals', 'interface Vlan2').tags)
+        self.assertEqual(0, len(hier.with_tags({'missing'})))
+
+        other = HConfig(self.host_b, self.os, self.options)
+        other.add_child('hostname other').append_tags('other')
+        hier.with_tags(['outage'], new_instance=other)
+        self.assertEqual(
+            ['hostname other', 'interface Vlan2', 'shutdown'],
+            [c.text for c in other.all_children_sorted()])
+        self.assertEqual({'outage'}, other.get_child_deep([
+            ('equals', 'interface Vlan2'), ('equals', 'shutdown')]).tags)
+
+        view = hier.tagged_view({'safe'})
+        self.assertEqual(
+            [c.cisco_style_text() for c in safe.all_children_sorted()],
+            [c.cisco_style_text() for c in view.all_children_sorted()])
+        self.assertIs(vlan2, view.get_child('equals', 'interface Vlan2').node)
 
     def test_negate(self):
         hier = HConfig(self.host_a, self.os, self.options)
@@ -286,6 +547,37 @@ class TestHConfig(unittest.TestCase):
         interface.negate()
         self.assertEqual('no interface Vlan2', interface.text)
 
+    def test_negate_rules(self):
+        options = dict(self.options)
+        options['negation_negate_with'] = [{
+            'lineage': [{'startswith': 'interface'}, {'startswith': 'description'}],
+            'use': 'no description',
+        }]
+        options['negation_default_when'] = [{
+            'lineage': [{'startswith': 'interface'}, {'startswith': 'speed'}],
+        }, {
+            'lineage': [{'startswith': 'logging'}],
+            'match_leaf': True,
+        }]
+        hier = HConfig(self.host_a, self.os, options)
+        vlan2 = hier.add_child('interface Vlan2')
+        vlan3 = hier.add_child('interface Vlan3')
+        router = hier.add_child('router bgp 1')
+        description = vlan2.add_child('description a')
+        speed = vlan3.add_child('speed 1000')
+        mtu = vlan3.add_child('mtu 9000')
+        logging = router.add_child('logging')
+        vlan3.add_child('no speed 100').negate()
+
+        self.assertEqual('no description', description.negate().text)
+        self.assertEqual('default speed 1000', speed.negate().text)
+        self.assertEqual('no mtu 9000', mtu.negate().text)
+        self.assertEqual('default logging', logging.negate().text)
+        self.assertIs(description, vlan2.get_child('equals', 'no description'))
+        self.assertEqual(
+            {'default speed 1000', 'no mtu 9000', 'speed 100'},
+            set(vlan3.children_dict))
+
     def test_config_to_get_to(self):
         running_config_hier = HConfig(self.host_a, self.os, self.options)
         running_config_hier.add_child('interface Vlan2')
@@ -295,6 +587,66 @@ class TestHConfig(unittest.TestCase):
             compiled_config_hier)
         self.assertEqual(2, len(list(remediation_config_hier.all_children())))
 
+    def test_config_to_get_to_and_from(self):
+        running_config_hier = HConfig(self.host_a, self.os, self.options)
+        running_config_hier.load_from_file(self.running_cfg)
+        compiled_config_hier = HConfig(self.host_a, self.os, self.options)
+        compiled_config_hier.load_from_file(self.compiled_cfg)
+
+        def dump(hier):
+            return [(c.cisco_style_text(), sorted(c.comments), c.new_in_config)
+                    for c in hier.all_children()]
+
+        remediation, rollback = running_config_hier.config_to_get_to_and_from(
+            compiled_config_hier)
+        self.assertEqual(
+            dump(running_config_hier.config_to_get_to(compiled_config_hier)),
+            dump(remediation))
+        self.assertEqual(
+            dump(compiled_config_hier.config_to_get_to(running_config_hier)),
+            dump(rollback))
+        self.assertTrue(
+            running_config_hier.future(remediation).future(rollback).config_equals(
+                running_config_hier))
+
+    def test_future(self):
+        running_config_hier = HConfig(self.host_a, self.os, self.options)
+        running_config_hier.load_from_file(self.running_cfg)
+        compiled_config_hier = HConfig(self.host_a, self.os, self.options)
+        compiled_config_hier.load_from_file(self.compiled_cfg)
+        running_text = running_config_hier.config_fingerprint()
+
+        remediation_config_hier = running_config_hier.config_to_get_to(
+            compiled_config_hier)
+        future_config_hier = running_config_hier.future(remediation_config_hier)
+        self.assertTrue(future_config_hier.config_equals(compiled_config_hier))
+        self.assertEqual(running_text, running_config_hier.config_fingerprint())
+
+        self.assertFalse(running_config_hier.config_equals(compiled_config_hier))
+        running_config_hier.apply(remediation_config_hier)
+        self.assertTrue(running_config_hier.config_equals(compiled_config_hier))
+
+    def test_future_idempotent_siblings(self):
+        # description and ip address match the same idempotent_commands rule,
+        # but a new description only overwrites the old one
+        running_config_hier = HConfig(self.host_a, self.os, self.options)
+        running_config_hier.load_from_string(
+            'interface Vlan2\n'
+            ' description old\n'
+            ' ip address 10.0.0.1 255.255.255.0\n')
+        compiled_config_hier = HConfig(self.host_a, self.os, self.options)
+        compiled_config_hier.load_from_string(
+            'interface Vlan2\n'
+            ' description new\n'
+            ' ip address 10.0.0.1 255.255.255.0\n')
+
+        future_config_hier = running_config_hier.future(
+            running_config_hier.config_to_get_to(compiled_config_hier))
+        self.assertEqual(
+            ['interface Vlan2', '  ip address 10.0.0.1 255.255.255.0', '  description new'],
+            [c.cisco_style_text() for c in future_config_hier.all_children_sorted()])
+        self.assertTrue(future_config_hier.config_equals(compiled_config_hier))
+
     def test_is_idempotent_command(self):
         pass
 
@@ -311,7 +663,14 @@ class TestHConfig(unittest.TestCase):
         pass
 
     def test_line_inclusion_test(self):
-        pass
+        hier = HConfig(self.host_a, self.os, self.options)
+        interface = hier.add_child('interface Vlan2')
+        interface.append_tags(['a', 'b'])
+        self.assertTrue(interface.line_inclusion_test(['a'], []))
+        self.assertTrue(interface.line_inclusion_test(['a', 'x'], ['y']))
+        self.assertFalse(interface.line_inclusion_test(['a'], ['b']))
+        self.assertFalse(interface.line_inclusion_test(['x'], []))
+        self.assertFalse(interface.line_inclusion_test([], []))
 
     def test_lineage_test(self):
         pass
@@ -0,0 +1,130 @@
+import unittest
+import os
+import threading
+import yaml
+
+from hier_config import HConfig
+from hier_config.hc_child import HConfigChild
+from hier_config.instrumentation import Stats, RuleProfiler
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_a = 'example1.rtr'
+        cls.os = 'ios'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        with open(os.path.join(files, 'test_options_ios.yml')) as f:
+            cls.options = yaml.safe_load(f.read())
+        with open(os.path.join(files, 'test_tags_ios.yml')) as f:
+            cls.tags = yaml.safe_load(f.read())
+        cls.running_cfg = os.path.join(files, 'running_config.conf')
+        cls.compiled_cfg = os.path.join(files, 'compiled_config.conf')
+
+    def test_stages(self):
+        calls = []
+        with Stats(callback=lambda stage, measurements: calls.append(stage)) as stats:
+            running_config_hier = HConfig(self.host_a, self.os, self.options)
+            running_config_hier.load_from_file(self.running_cfg)
+            compiled_config_hier = HConfig(self.host_a, self.os, self.options)
+            compiled_config_hier.load_from_file(self.compiled_cfg)
+            remediation_config_hier = running_config_hier.config_to_get_to(
+                compiled_config_hier)
+            remediation_config_hier.set_order_weight()
+            remediation_config_hier.add_tags(self.tags)
+
+        stages = stats.as_dict()
+        self.assertEqual(
+            {'parse', 'acl_post_processing', 'config_to_get_to',
+             'set_order_weight', 'add_tags'},
+            set(stages))
+        self.assertEqual(1, calls.count('config_to_get_to'))
+
+        parse = stages['parse']
+        self.assertEqual(2, parse['calls'])
+        self.assertEqual(
+            len(list(running_config_hier.all_children()))
+            + len(list(compiled_config_hier.all_children())),
+            parse['nodes'])
+        self.assertEqual(parse['nodes'], parse['allocations'])
+
+        remediation_lines = len(list(remediation_config_hier.all_children()))
+        self.assertEqual(remediation_lines, stages['config_to_get_to']['nodes'])
+        order_weight = stages['set_order_weight']
+        self.assertEqual(
+            len(self.options['ordering']) * remediation_lines,
+            order_weight['rule_evaluations'])
+        self.assertEqual(
+            {'ordering[{}]'.format(i): remediation_lines
+             for i in range(len(self.options['ordering']))},
+            order_weight['rules'])
+        self.assertIn('tag_rules[0]', stages['add_tags']['rules'])
+
+    def test_rule_profiler(self):
+        options = dict(self.options)
+        options['negation_negate_with'] = [{
+            'lineage': [{'startswith': 'interface'}, {'startswith': 'mtu'}],
+            'use': 'no mtu',
+        }]
+        running_config_hier = HConfig(self.host_a, self.os, options)
+        running_config_hier.load_from_file(self.running_cfg)
+        compiled_config_hier = HConfig(self.host_a, self.os, options)
+        compiled_config_hier.load_from_file(self.compiled_cfg)
+
+        with RuleProfiler(options, tag_rules=self.tags) as profiler:
+            remediation_config_hier = running_config_hier.config_to_get_to(
+                compiled_config_hier)
+            remediation_config_hier.set_order_weight()
+            remediation_config_hier.add_tags(self.tags)
+            compiled_config_hier.config_to_get_to(running_config_hier)
+
+        remediation_lines = len(list(remediation_config_hier.all_children()))
+        profile = profiler.as_dict()
+        self.assertEqual(remediation_lines, profile['ordering[1]']['evaluations'])
+        self.assertEqual(2, profile['ordering[1]']['matches'])
+        self.assertEqual(remediation_lines, profile['tag_rules[3]']['evaluations'])
+        self.assertTrue(profile['negation_negate_with[0]']['matches'])
+        self.assertNotIn('per_line_sub[0]', profile)
+
+        ranked = profiler.ranked('evaluations')
+        self.assertEqual(
+            sorted((row['evaluations'] for row in ranked), reverse=True),
+            [row['evaluations'] for row in ranked])
+        dead_rules = profiler.dead_rules()
+        self.assertIn('ordering[0]', dead_rules)
+        self.assertIn('sectional_exiting[0]', dead_rules)
+        self.assertNotIn('ordering[1]', dead_rules)
+
+    def test_cached_order_weights(self):
+        hier = HConfig(self.host_a, self.os, self.options)
+        hier.load_from_file(self.running_cfg)
+        hier.set_order_weight()
+
+        with RuleProfiler(hier.options) as profiler:
+            hier.set_order_weight()
+        lines = len(list(hier.all_children()))
+        profile = profiler.as_dict()
+        self.assertEqual(lines, profile['ordering[0]']['evaluations'])
+        self.assertEqual(lines, profile['ordering[1]']['evaluations'])
+
+    def test_disabled(self):
+        def load():
+            hier = HConfig(self.host_a, self.os, self.options)
+            hier.load_from_file(self.running_cfg)
+
+        original = HConfigChild.lineage_test
+        with Stats() as stats:
+            self.assertIs(original, HConfigChild.lineage_test)
+            # other threads are not measured
+            thread = threading.Thread(target=load)
+            thread.start()
+            thread.join()
+        self.assertEqual({}, stats.as_dict())
+
+        load()
+        self.assertEqual({}, stats.as_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import unittest
+import os
+import pickle
+from unittest import mock
+import yaml
+
+from hier_config import HConfig
+from hier_config.options import Options, Rule
+
+
+class TestOptions(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_a = 'example1.rtr'
+        cls.os = 'ios'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        cls.options_file = os.path.join(files, 'test_options_ios.yml')
+        with open(cls.options_file) as f:
+            cls.options_dict = yaml.safe_load(f.read())
+        with open(os.path.join(files, 'test_tags_ios.yml')) as f:
+            cls.tags = yaml.safe_load(f.read())
+        cls.running_cfg = os.path.join(files, 'running_config.conf')
+        cls.compiled_cfg = os.path.join(files, 'compiled_config.conf')
+
+    def test_immutable(self):
+        options = Options(self.options_dict)
+        with self.assertRaises(TypeError):
+            options['ordering'] = []
+        with self.assertRaises(TypeError):
+            options['ordering'][0]['order'] = 1
+        self.assertIsInstance(options['ordering'], tuple)
+        self.assertIsInstance(options['ordering'][0], Rule)
+        self.assertEqual((), Options({})['negation_negate_with'])
+
+    def test_shared(self):
+        options = Options(self.options_dict)
+        hier_a = HConfig(self.host_a, self.os, options)
+        hier_b = HConfig(self.host_a, self.os, options)
+        self.assertIs(options, hier_a.options)
+        self.assertIs(options, hier_b.options)
+        self.assertIs(options, hier_a.add_child('interface Vlan2').options)
+
+    def test_coerce(self):
+        options = dict(self.options_dict)
+        compiled = Options.coerce(options)
+        self.assertIs(compiled, HConfig(self.host_a, self.os, options).options)
+        self.assertIs(compiled, Options.coerce(compiled))
+
+        options['ordering'] = []
+        changed = Options.coerce(options)
+        self.assertIsNot(compiled, changed)
+        self.assertEqual((), changed['ordering'])
+
+    def test_fingerprint(self):
+        options = Options(self.options_dict)
+        self.assertEqual(options.fingerprint, Options.from_file(self.options_file).fingerprint)
+        self.assertEqual(options, Options(options.to_dict()))
+        self.assertEqual(
+            self.options_dict,
+            {k: v for k, v in options.to_dict().items() if k in self.options_dict})
+
+        changed = dict(self.options_dict, ordering=[])
+        self.assertNotEqual(options.fingerprint, Options(changed).fingerprint)
+
+        unpickled = pickle.loads(pickle.dumps(options))
+        self.assertEqual(options.fingerprint, unpickled.fingerprint)
+        self.assertIsInstance(unpickled['ordering'][0], Rule)
+
+    def test_validation(self):
+        for options in (
+                {'ordering': [{'lineage': [{'startswith': 'interface'}]}]},
+                {'sectional_exiting': [{'lineage': [{'startswith': 'router bgp'}]}]},
+                {'idempotent_commands': [{'startswith': 'interface'}]},
+                {'idempotent_commands': [{'lineage': [{'re_search': '('}]}]},
+                {'idempotent_commands': [{'lineage': [{'startswith_': 'x'}]}]},
+                {'idempotent_commands': {'lineage': []}},
+                {'per_line_sub': [{'search': '^end$'}]},
+                {'indent_adjust': [{'start_expression': '[', 'end_expression': 'x'}]}):
+            with self.assertRaises(ValueError):
+                Options(options)
+
+    def test_lineage_test(self):
+        hier = HConfig(self.host_a, self.os, self.options_dict)
+        interface = hier.add_child('interface Vlan2')
+        interface.new_in_config = True
+        children = [
+            interface,
+            interface.add_child('description switch-mgmt 10.0.2.0/24'),
+            interface.add_child('no ip address'),
+            interface.add_child('standby 1 ip 10.0.2.1'),
+        ]
+        rules = [
+            {'lineage': [{'startswith': 'interface'}]},
+            {'lineage': [{'startswith': ['x', 'interface']}, {'equals': ['ip address', 'no shutdown']}]},
+            {'lineage': [{'anything': None}, {'contains': ['10.0.2', 'y']}]},
+            {'lineage': [{'re_search': 'Vlan\\d', 'new_in_config': True},
+                         {'endswith': '/24', 'negative_intersection_tags': 'safe'}]},
+            {'lineage': [{'startswith': 'interface', 'new_in_config': False}]},
+            {'lineage': [{'new_in_config': True}]},
+            {'lineage': [{'startswith': 'standby 1 ip'}], 'match_leaf': True},
+        ]
+        for rule in rules:
+            for child in children:
+                for strip_negation in (False, True):
+                    self.assertEqual(
+                        child.lineage_test(rule, strip_negation),
+                        child.lineage_test(Rule(rule), strip_negation),
+                        (rule, child.text, strip_negation))
+
+    def test_ordering_candidates(self):
+        options = Options(dict(self.options_dict, ordering=[
+            {'lineage': [{'startswith': 'interface'}, {'startswith': 'ip'}], 'order': 300},
+            {'lineage': [{'startswith': 'interface'}, {'startswith': 'ip address'}], 'order': 400},
+            {'lineage': [{'startswith': 'shutdown'}], 'match_leaf': True, 'order': 600},
+            {'lineage': [{'startswith': 'interface', 'new_in_config': True}], 'order': 200},
+        ]))
+        rules = options['ordering']
+        self.assertEqual(
+            ([(rules[2], False), (rules[1], False), (rules[0], False)], True),
+            options.ordering_candidates(('interface Vlan2',)))
+        self.assertEqual(
+            ([(rules[3], True), (rules[2], False)], False),
+            options.ordering_candidates(()))
+
+        def weights(hier):
+            return [(child.text, child.order_weight) for child in hier.all_children()]
+
+        for _ in range(2):
+            hier = HConfig(self.host_a, self.os, options)
+            hier.load_from_string(
+                'interface Vlan2\n'
+                ' ip address 10.0.2.1 255.255.255.0\n'
+                ' ip helper-address 10.0.0.1\n'
+                ' shutdown\n'
+                'interface Vlan3\n'
+                'shutdown\n')
+            hier.get_child('equals', 'interface Vlan3').new_in_config = True
+            hier.set_order_weight()
+            self.assertEqual([
+                ('interface Vlan2', 500),
+                ('ip address 10.0.2.1 255.255.255.0', 400),
+                ('ip helper-address 10.0.0.1', 300),
+                ('shutdown', 600),
+                ('interface Vlan3', 200),
+                ('shutdown', 600),
+            ], weights(hier))
+        self.assertEqual(600, options.order_weights[('interface Vlan2', 'shutdown')])
+        self.assertNotIn(('interface Vlan3',), options.order_weights)
+
+    def test_candidate_caches_bounded(self):
+        options = Options(self.options_dict)
+        with mock.patch('hier_config.options.CANDIDATE_CACHE_SIZE', 2):
+            for i in range(5):
+                path = ('interface Vlan{}'.format(i),)
+                options.negation_candidates(path)
+                options.ordering_candidates(path)
+        self.assertLessEqual(len(options._negation_candidates), 2)
+        self.assertLessEqual(len(options._ordering_candidates), 2)
+
+    def test_remediation(self):
+        def remediation(options):
+            running_config_hier = HConfig(self.host_a, self.os, options)
+            running_config_hier.load_from_file(self.running_cfg)
+            compiled_config_hier = HConfig(self.host_a, self.os, options)
+            compiled_config_hier.load_from_file(self.compiled_cfg)
+            remediation_config_hier = running_config_hier.config_to_get_to(
+                compiled_config_hier)
+            remediation_config_hier.set_order_weight()
+            remediation_config_hier.add_tags(self.tags)
+            return [(child.cisco_style_text(), sorted(child.tags))
+                    for child in remediation_config_hier.all_children_sorted()]
+
+        self.assertEqual(
+            remediation(self.options_dict), remediation(Options(self.options_dict)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import os
+import shutil
+import tempfile
+import yaml
+
+from hier_config import HConfig
+from hier_config.parse_cache import ParseCache
+
+
+class TestParseCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_a = 'example1.rtr'
+        cls.os = 'ios'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        with open(os.path.join(files, 'test_options_ios.yml')) as f:
+            cls.options = yaml.safe_load(f.read())
+        cls.running_cfg = os.path.join(files, 'running_config.conf')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ParseCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hit_matches_parse(self):
+        uncached = HConfig(self.host_a, self.os, self.options)
+        uncached.load_from_file(self.running_cfg)
+
+        first = HConfig(self.host_a, self.os, self.options)
+        first.load_from_file(self.running_cfg, cache=self.cache)
+        second = HConfig(self.host_a, self.os, self.options)
+        second.load_from_file(self.running_cfg, cache=self.cache)
+
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+        self.assertEqual(uncached.dump(), first.dump())
+        self.assertEqual(uncached.dump(), second.dump())
+
+    def test_key_includes_parse_options(self):
+        options = dict(self.options)
+        options['per_line_sub'] = []
+        config = 'interface Vlan2\n ip address 1.1.1.1 255.255.255.0'
+        self.assertNotEqual(
+            self.cache.key(config, self.os, self.options),
+            self.cache.key(config, self.os, options))
+        self.assertNotEqual(
+            self.cache.key(config, self.os, self.options),
+            self.cache.key(config, 'iosxr', self.options))
+        self.assertNotEqual(
+            self.cache.key(config, self.os, self.options),
+            self.cache.key(config + '\n shutdown', self.os, self.options))
+        options = dict(self.options)
+        options['ordering'] = []
+        self.assertEqual(
+            self.cache.key(config, self.os, self.options),
+            self.cache.key(config, self.os, options))
+
+    def test_duplicate_children_options(self):
+        config = 'template a\n access-session closed\n access-session closed\n'
+        options = dict(self.options, parent_allows_duplicate_child=[
+            {'lineage': [{'startswith': 'template'}]}])
+
+        for _ in range(2):
+            merged = HConfig(self.host_a, self.os, self.options)
+            merged.load_from_string(config, cache=self.cache)
+            duplicated = HConfig(self.host_a, self.os, options)
+            duplicated.load_from_string(config, cache=self.cache)
+            self.assertEqual(1, len(merged.children[0].children))
+            self.assertEqual(2, len(duplicated.children[0].children))
+        self.assertEqual((2, 2), (self.cache.hits, self.cache.misses))
+
+    def test_multi_line_blocks_options(self):
+        config = (
+            'crypto pki certificate chain TP-self-signed-1\n'
+            ' certificate self-signed 01\n'
+            '  3082022B 30820194\n'
+            '  quit\n')
+        options = dict(self.options, multi_line_blocks=[
+            {'start': '^certificate ', 'end': '^\\s*quit$'}])
+
+        for _ in range(2):
+            lines = HConfig(self.host_a, self.os, self.options)
+            lines.load_from_string(config, cache=self.cache)
+            block = HConfig(self.host_a, self.os, options)
+            block.load_from_string(config, cache=self.cache)
+            self.assertEqual(3, len(list(lines.children[0].all_children())))
+            self.assertEqual(
+                ['certificate self-signed 01\n  3082022B 30820194\n  quit'],
+                [c.text for c in block.children[0].all_children()])
+        self.assertEqual((2, 2), (self.cache.hits, self.cache.misses))
+
+    def test_lru_eviction(self):
+        self.cache.put('a', b'a' * 100)
+        self.cache.put('b', b'b' * 100)
+        os.utime(os.path.join(self.directory, 'a.hcfg'), (1, 1))
+        os.utime(os.path.join(self.directory, 'b.hcfg'), (2, 2))
+        self.cache.get('a')
+        self.cache.max_bytes = 250
+        self.cache.put('c', b'c' * 100)
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+
+if __name__ == "__main__":
+    unittest.main()
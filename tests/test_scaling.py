@@ -0,0 +1,284 @@
+import unittest
+import gc
+import os
+import time
+from unittest import mock
+import yaml
+
+from hier_config import HConfig
+from hier_config.hc_child import HConfigChild
+from hier_config.instrumentation import Stats
+
+
+class _ScalingTests(object):
+    """
+    The hot operations, each run through assert_linear() at a small and a
+    large input size
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_a = 'example1.rtr'
+        cls.os = 'ios'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        with open(os.path.join(files, 'test_options_ios.yml')) as f:
+            cls.options = yaml.safe_load(f.read())
+        with open(os.path.join(files, 'test_tags_ios.yml')) as f:
+            cls.tags = yaml.safe_load(f.read())
+
+    def _hier(self, options=None):
+        return HConfig(self.host_a, self.os, options or self.options)
+
+    def _config_text(self, size, changed=0):
+        """ A configuration of about size lines, changed picks different lines """
+
+        lines = []
+        for i in range(size // 8):
+            lines.extend([
+                'interface Vlan{}'.format(i),
+                ' description vlan {}'.format(i + changed),
+                ' ip address 10.{}.{}.1 255.255.255.0'.format(i >> 8 & 255, i & 255),
+                ' mtu {}'.format(9000 - changed),
+            ])
+            lines.append('vlan {}'.format(i))
+            lines.append(' name vlan{}'.format(i if changed else i + 1))
+            lines.append('ip route 10.{}.{}.0 255.255.255.0 Null0 {}'.format(
+                i >> 8 & 255, i & 255, changed))
+            lines.append('logging host 10.0.{}.{}'.format(i >> 8 & 255, i & 255))
+        lines.append('ip access-list extended TEST')
+        lines.extend(' permit tcp host 10.0.{}.{} any'.format(
+            i >> 8 & 255, i & 255) for i in range(size // 4))
+        return '\n'.join(lines)
+
+    def _loaded(self, size, changed=0, options=None):
+        hier = self._hier(options)
+        hier.load_from_string(self._config_text(size, changed))
+        return hier
+
+    def _remediation(self, size):
+        return self._loaded(size).config_to_get_to(self._loaded(size, 1))
+
+    def test_add_child_unique(self):
+        def run(args):
+            hier, size = args
+            for i in range(size):
+                hier.add_child('line {}'.format(i))
+        self.assert_linear(lambda size: (self._hier(), size), run)
+
+    def test_add_child_duplicates(self):
+        def run(args):
+            hier, size = args
+            for i in range(size):
+                hier.add_child('line {}'.format(i % 10), force_duplicate=True)
+        self.assert_linear(lambda size: (self._hier(), size), run)
+
+    def test_del_child(self):
+        def setup(size):
+            hier = self._hier()
+            for i in range(size):
+                hier.add_child('line {}'.format(i))
+            return hier
+
+        def run(hier):
+            for child in reversed(list(hier.children)):
+                hier.del_child(child)
+        self.assert_linear(setup, run)
+
+    def test_set_text(self):
+        def setup(size):
+            hier = self._hier()
+            for i in range(size):
+                hier.add_child('line {}'.format(i))
+            return hier
+
+        def run(hier):
+            for child in hier.children:
+                child.negate()
+        self.assert_linear(setup, run)
+
+    def test_load_from_string(self):
+        self.assert_linear(
+            self._config_text,
+            lambda text: self._hier().load_from_string(text))
+
+    def test_config_to_get_to(self):
+        self.assert_linear(
+            lambda size: (self._loaded(size), self._loaded(size, 1)),
+            lambda args: args[0].config_to_get_to(args[1]))
+
+    def test_config_to_get_to_negations(self):
+        self.assert_linear(
+            lambda size: (self._loaded(size), self._hier()),
+            lambda args: args[0].config_to_get_to(args[1]))
+
+    def test_config_to_get_to_and_from(self):
+        self.assert_linear(
+            lambda size: (self._loaded(size), self._loaded(size, 1)),
+            lambda args: args[0].config_to_get_to_and_from(args[1]))
+
+    def test_future(self):
+        def setup(size):
+            running = self._loaded(size)
+            return running, running.config_to_get_to(self._loaded(size, 1))
+        self.assert_linear(setup, lambda args: args[0].future(args[1]))
+
+    def test_add_tags(self):
+        self.assert_linear(
+            self._remediation, lambda hier: hier.add_tags(self.tags))
+
+    def test_set_order_weight(self):
+        self.assert_linear(
+            self._remediation, lambda hier: hier.set_order_weight())
+
+    def test_add_sectional_exiting(self):
+        self.assert_linear(
+            self._remediation, lambda hier: hier.add_sectional_exiting())
+
+    def test_all_children_sorted_by_tags(self):
+        def setup(size):
+            remediation = self._remediation(size)
+            remediation.add_tags(self.tags)
+            return remediation
+        self.assert_linear(
+            setup,
+            lambda hier: list(hier.all_children_sorted_by_tags({'safe'}, set())))
+
+    def test_dump(self):
+        self.assert_linear(self._loaded, lambda hier: hier.dump())
+
+    def test_load_from_dump(self):
+        self.assert_linear(
+            lambda size: self._loaded(size).dump(),
+            lambda dump: self._hier().load_from_dump(dump))
+
+    def test_binary(self):
+        self.assert_linear(
+            lambda size: self._loaded(size).dump_binary(),
+            lambda data: self._hier().load_from_binary(data))
+
+    def test_merge(self):
+        self.assert_linear(
+            lambda size: (self._loaded(size), self._loaded(size, 1)),
+            lambda args: self._hier().merge(args[0]) or self._hier().merge(args[1]))
+
+    def test_with_tags(self):
+        def setup(size):
+            remediation = self._remediation(size)
+            remediation.add_tags(self.tags)
+            return remediation
+        self.assert_linear(setup, lambda hier: hier.with_tags({'safe'}))
+
+
+@unittest.skipUnless(
+    os.environ.get('HIER_CONFIG_SCALING_TESTS'),
+    'set HIER_CONFIG_SCALING_TESTS=1 to run the timing based scaling tests')
+class TestScaling(_ScalingTests, unittest.TestCase):
+    """
+    Run the hot operations at a small and a large input size and check
+    that the time grows close to linearly. A quadratic operation grows by
+    the square of the size factor, so this does not depend on how fast the
+    machine is.
+
+    The tests compare wall clock times, which other load on a shared
+    machine can skew, so they only run when the HIER_CONFIG_SCALING_TESTS
+    environment variable is set. TestScalingCounts always runs.
+
+    """
+
+    small = 1000
+    factor = 4
+    # linear growth is factor, quadratic growth is factor ** 2
+    max_growth = factor * 2.5
+    repeat = 3
+
+    def _time(self, setup, run, size):
+        best = None
+        for _ in range(self.repeat):
+            argument = setup(size)
+            gc.collect()
+            # the cyclic garbage collector runs longer as the heap grows
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                run(argument)
+                seconds = time.perf_counter() - start
+            finally:
+                gc.enable()
+            best = seconds if best is None else min(best, seconds)
+        return best
+
+    def assert_linear(self, setup, run):
+        """
+        Assert that run(setup(size)) grows close to linearly with size.
+        Only run() is timed.
+
+        """
+
+        small = self._time(setup, run, self.small)
+        large = self._time(setup, run, self.small * self.factor)
+        growth = large / max(small, 1e-6)
+        self.assertLess(
+            growth, self.max_growth,
+            'x{} input took x{:.1f} time ({:.4f}s to {:.4f}s)'.format(
+                self.factor, growth, small, large))
+
+
+class TestScalingCounts(_ScalingTests, unittest.TestCase):
+    """
+    Run the hot operations at a small and a large input size and check
+    that the work they do grows close to linearly. The work is counted:
+    HConfigChild objects created, children indexed by
+    rebuild_children_dict(), and the lineage rule tests and regex calls
+    counted by Stats in the instrumented stages. The counts are the same
+    on every machine, so these tests always run.
+
+    """
+
+    small = 400
+    factor = 4
+    # linear growth is factor, quadratic growth is factor ** 2
+    max_growth = factor * 1.5
+
+    def _count(self, setup, run, size):
+        argument = setup(size)
+        counts = dict.fromkeys(
+            ('allocations', 'children_dict', 'rule_evaluations', 'regex_calls'), 0)
+        init = HConfigChild.__init__
+        rebuild_children_dict = HConfigChild.rebuild_children_dict
+
+        def counted_init(child, *args, **kwargs):
+            counts['allocations'] += 1
+            init(child, *args, **kwargs)
+
+        def counted_rebuild(child):
+            counts['children_dict'] += len(child.children)
+            rebuild_children_dict(child)
+
+        with mock.patch.object(HConfigChild, '__init__', counted_init), \
+                mock.patch.object(HConfigChild, 'rebuild_children_dict', counted_rebuild), \
+                Stats() as stats:
+            run(argument)
+        for record in stats.as_dict().values():
+            counts['rule_evaluations'] += record['rule_evaluations']
+            counts['regex_calls'] += record['regex_calls']
+        return counts
+
+    def assert_linear(self, setup, run):
+        """
+        Assert that the work counted in run(setup(size)) grows close to
+        linearly with size
+
+        """
+
+        small = self._count(setup, run, self.small)
+        large = self._count(setup, run, self.small * self.factor)
+        for counter, count in small.items():
+            self.assertLessEqual(
+                large[counter], max(count, 1) * self.max_growth,
+                'x{} input took {} to {} {}'.format(
+                    self.factor, count, large[counter], counter))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import tempfile
+import yaml
+
+from hier_config import HConfig
+from hier_config.snapshot import open_snapshot, write_snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_a = 'example1.rtr'
+        cls.os = 'ios'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        with open(os.path.join(files, 'test_options_ios.yml')) as f:
+            cls.options = yaml.safe_load(f.read())
+        cls.running_cfg = os.path.join(files, 'running_config.conf')
+
+    def setUp(self):
+        self.hier = HConfig(self.host_a, self.os, self.options)
+        self.hier.load_from_file(self.running_cfg)
+        self.hier.get_child('equals', 'interface Vlan3').tags.add('test')
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        write_snapshot(self.hier, self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_section_texts(self):
+        with open_snapshot(self.path, self.host_a, self.os, self.options) as lazy:
+            self.assertEqual(
+                [c.text for c in self.hier.children], lazy.section_texts())
+            self.assertFalse(lazy.materialized)
+
+    def test_lazy_get_child_deep(self):
+        with open_snapshot(self.path, self.host_a, self.os, self.options) as lazy:
+            child = lazy.get_child_deep([
+                ('equals', 'interface Vlan3'),
+                ('equals', 'ip access-group TEST in')])
+            self.assertIsNotNone(child)
+            self.assertEqual(2, child.depth())
+            vlan3 = child.parent
+            self.assertEqual({'test'}, vlan3.tags)
+            self.assertTrue(vlan3.materialized)
+            self.assertFalse(
+                lazy.get_child('equals', 'interface Vlan2').materialized)
+
+    def test_equal_when_fully_materialized(self):
+        with open_snapshot(self.path, self.host_a, self.os, self.options) as lazy:
+            self.assertEqual(self.hier, lazy)
+            self.assertEqual(self.hier.dump(), lazy.dump())
+
+    def test_closed(self):
+        lazy = open_snapshot(self.path, self.host_a, self.os, self.options)
+        vlan2 = lazy.get_child('equals', 'interface Vlan2')
+        lazy.close()
+        with self.assertRaises(ValueError):
+            vlan2.children
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import mmap
+import os
+import tempfile
+from unittest import mock
+import yaml
+
+from hier_config import HConfig
+from hier_config.parse_cache import ParseCache
+
+
+class TestSource(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_a = 'example1.rtr'
+        cls.os = 'ios'
+        files = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+        with open(os.path.join(files, 'test_options_ios.yml')) as f:
+            cls.options = yaml.safe_load(f.read())
+        cls.running_cfg = os.path.join(files, 'running_config.conf')
+        cls.config = '\n'.join([
+            'hostname example1.rtr',
+            'banner motd ^',
+            'Authorized access only',
+            '^',
+            'interface Vlan2',
+            '  ip  address 10.0.2.1 255.255.255.0',
+            ' shutdown',
+            'interface Vlan3',
+            ' shutdown',
+        ])
+
+    def test_load_from_string(self):
+        hier = HConfig(self.host_a, self.os, self.options)
+        hier.load_from_string(self.config, spans=True)
+        lines = self.config.splitlines()
+
+        spans = [(c.text, c.source_span.line, c.source_span.text()) for c in hier.all_children()]
+        self.assertEqual(('hostname example1.rtr', 1, lines[0]), spans[0])
+        self.assertEqual(
+            ('banner motd ^\nAuthorized access only\n^', 2, '\n'.join(lines[1:4])), spans[1])
+        self.assertEqual(('ip address 10.0.2.1 255.255.255.0', 6, lines[5]), spans[3])
+        self.assertEqual(('shutdown', 9, lines[8]), spans[-1])
+        span = hier.get_child_deep([('equals', 'interface Vlan2'), ('equals', 'shutdown')]).source_span
+        self.assertEqual(' shutdown', self.config[span.start:span.end])
+
+        hier = HConfig(self.host_a, self.os, self.options)
+        hier.load_from_string(self.config)
+        self.assertIsNone(hier.children[0].source_span)
+
+    def test_load_from_buffer(self):
+        with open(self.running_cfg) as f:
+            config = f.read()
+        expected = HConfig(self.host_a, self.os, self.options)
+        expected.load_from_string(config, spans=True)
+
+        mapped = HConfig(self.host_a, self.os, self.options)
+        mapped.load_from_file(self.running_cfg, spans=True, mapped=True)
+        self.assertEqual(
+            [(c.cisco_style_text(), c.source_span.line, c.source_span.text())
+             for c in expected.all_children()],
+            [(c.cisco_style_text(), c.source_span.line, c.source_span.text())
+             for c in mapped.all_children()])
+
+        buffered = HConfig(self.host_a, self.os, self.options)
+        buffered.load_from_buffer(memoryview(self.config.replace('\n', '\r\n').encode()), spans=True)
+        hier = HConfig(self.host_a, self.os, self.options)
+        hier.load_from_string(self.config)
+        self.assertEqual(
+            [c.cisco_style_text() for c in hier.all_children()],
+            [c.cisco_style_text() for c in buffered.all_children()])
+        self.assertEqual('  ip  address 10.0.2.1 255.255.255.0',
+                         buffered.children[2].children[0].source_span.text())
+
+        # identical lines share one string
+        shutdowns = [c for c in buffered.all_children() if c.text == 'shutdown']
+        self.assertEqual(2, len(shutdowns))
+        self.assertIs(shutdowns[0].text, shutdowns[1].text)
+
+    def test_load_from_file_mapped(self):
+        expected = HConfig(self.host_a, self.os, self.options)
+        expected.load_from_file(self.running_cfg)
+
+        mappings = []
+        mmap_type = mmap.mmap
+
+        def mapping(*args, **kwargs):
+            mappings.append(mmap_type(*args, **kwargs))
+            return mappings[-1]
+
+        for spans in (False, True):
+            hier = HConfig(self.host_a, self.os, self.options)
+            with mock.patch('mmap.mmap', mapping):
+                hier.load_from_file(self.running_cfg, spans=spans, mapped=True)
+            self.assertEqual(
+                [c.cisco_style_text() for c in expected.all_children()],
+                [c.cisco_style_text() for c in hier.all_children()])
+        # without spans nothing references the mapping after parsing
+        self.assertTrue(mappings[0].closed)
+        self.assertFalse(mappings[1].closed)
+        self.assertTrue(hier.children[0].source_span.text())
+
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                hier.load_from_file(self.running_cfg, cache=ParseCache(directory), mapped=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,10 +6,33 @@ import unittest
 def all_tests():
     from test_hier_config import TestHConfig
     from test_text_match import TestTextMatch
+    from test_binary import TestBinary
+    from test_snapshot import TestSnapshot
+    from test_parse_cache import TestParseCache
+    from test_columnar import TestColumnar
+    from test_acl_diff import TestAclDiff
+    from test_instrumentation import TestInstrumentation
+    from test_scaling import TestScaling, TestScalingCounts
+    from test_options import TestOptions
+    from test_frozen import TestFrozen
+    from test_archive import TestArchive
+    from test_source import TestSource
 
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(TestHConfig))
     suite.addTest(unittest.makeSuite(TestTextMatch))
+    suite.addTest(unittest.makeSuite(TestBinary))
+    suite.addTest(unittest.makeSuite(TestSnapshot))
+    suite.addTest(unittest.makeSuite(TestParseCache))
+    suite.addTest(unittest.makeSuite(TestColumnar))
+    suite.addTest(unittest.makeSuite(TestAclDiff))
+    suite.addTest(unittest.makeSuite(TestInstrumentation))
+    suite.addTest(unittest.makeSuite(TestScaling))
+    suite.addTest(unittest.makeSuite(TestScalingCounts))
+    suite.addTest(unittest.makeSuite(TestOptions))
+    suite.addTest(unittest.makeSuite(TestFrozen))
+    suite.addTest(unittest.makeSuite(TestArchive))
+    suite.addTest(unittest.makeSuite(TestSource))
 
     return suite
 